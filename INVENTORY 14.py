@@ -1,27 +1,32 @@
 import os
 import re
+import sys
+import time
+import queue
+import hashlib
+import random
 import sqlite3
+import argparse
+import subprocess
+import tempfile
+import threading
 import datetime as dt
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from dataclasses import dataclass
-from typing import Optional, Tuple, List, Any
-from matplotlib.ticker import FuncFormatter
-
+from typing import Optional, Tuple, List, Any, TYPE_CHECKING
 
+# Only Tk and sqlite3 load at startup. pandas, matplotlib, reportlab, openpyxl,
+# tkcalendar, PIL and smtplib are imported inside the functions that use them,
+# so the login window does not wait on them (see --bench-startup).
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk, ImageEnhance
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, Table, TableStyle, SimpleDocTemplate, Spacer
-
-import pandas as pd
-from matplotlib import pyplot as plt
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+
+if TYPE_CHECKING:
+    from reportlab.graphics.shapes import Drawing
 
 APP_TITLE = "Inventory Management System"
 
@@ -40,20 +45,193 @@ FONT_XL = ("Segoe UI", 18, "bold")
 FONT_MD = ("Segoe UI", 12)
 
 DB_PATH = "inventory14.db"
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # logo.png / logo2.png live next to this file
+IMAGE_CACHE_DIR = os.path.join(APP_DIR, "image_cache")  # pre-scaled login artwork, rebuilt when a source changes
+DB_PRAGMAS = {"temp_store": "MEMORY"}  # applied to every pooled connection
+
+# Storage profiles: PRAGMA sets chosen at startup (settings.storage_profile,
+# overridable with the INVENTORY_DB_PROFILE environment variable).
+STORAGE_PROFILES = {
+    # WAL lets report readers run while a checkout is writing
+    "balanced": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -20000,
+                 "mmap_size": 268435456, "temp_store": "MEMORY", "busy_timeout": 5000},
+    # WAL, but fsync on every commit (safer on machines prone to power loss)
+    "durable": {"journal_mode": "WAL", "synchronous": "FULL", "cache_size": -8000,
+                "mmap_size": 0, "temp_store": "MEMORY", "busy_timeout": 10000},
+    # original behaviour: rollback journal, SQLite defaults
+    "legacy": {"journal_mode": "DELETE", "synchronous": "FULL", "cache_size": -2000,
+               "mmap_size": 0, "temp_store": "DEFAULT", "busy_timeout": 5000},
+}
+DEFAULT_STORAGE_PROFILE = "balanced"
+
+
+# ---------- Database Connections ----------
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections, one per thread.
+    connection() hands back the calling thread's connection, opening it and
+    applying the PRAGMA profile on first use. transaction() wraps it in a
+    commit / rollback block.
+    """
+
+    def __init__(self, path: str, pragmas: Optional[dict] = None):
+        self.path = path
+        self.pragmas = dict(pragmas or {})
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: List[sqlite3.Connection] = []
+        self._generation = 0  # bumped when the PRAGMA profile changes
+        self._epoch = 0  # bumped by close_all()
+
+    def connection(self) -> sqlite3.Connection:
+        local = self._local
+        con = getattr(local, "con", None)
+        if con is None or local.epoch != self._epoch:
+            con = sqlite3.connect(self.path, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            with self._lock:
+                self._open.append(con)
+            local.con, local.epoch, local.generation = con, self._epoch, None
+        if local.generation != self._generation:
+            for name, value in self.pragmas.items():
+                con.execute(f"PRAGMA {name}={value}")
+            local.generation = self._generation
+        return con
+
+    def configure(self, **pragmas):
+        """Update the PRAGMA profile; each connection re-applies it on next use."""
+        with self._lock:
+            self.pragmas.update(pragmas)
+            self._generation += 1
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """
+        Yield the thread's connection inside BEGIN ... COMMIT, rolling back on error.
+        Nested use runs in a SAVEPOINT: an error undoes only the inner block, and
+        nothing is committed until the outermost block finishes.
+        """
+        con = self.connection()
+        if con.in_transaction:
+            con.execute("SAVEPOINT nested")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK TO nested")
+                con.execute("RELEASE nested")
+                raise
+            con.execute("RELEASE nested")
+            return
+        con.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield con
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+
+    def close_all(self):
+        with self._lock:
+            cons, self._open = self._open, []
+            self._epoch += 1
+        for con in cons:
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+
+
+POOL = ConnectionPool(DB_PATH, DB_PRAGMAS)
 
 
 # ---------- Helpers ----------
 
 def db() -> sqlite3.Connection:
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    return con
+    """Pooled connection for the current thread. Do not close it."""
+    return POOL.connection()
+
+
+def transaction(immediate: bool = False):
+    return POOL.transaction(immediate)
+
+
+def db_change_token() -> tuple:
+    """
+    Changes whenever anything is committed to the database: total_changes
+    counts this thread's own writes, PRAGMA data_version moves when any other
+    connection (worker threads, other terminals) commits.
+    """
+    con = db()
+    return id(con), con.total_changes, con.execute("PRAGMA data_version").fetchone()[0]
+
+
+def change_count(name: str) -> int:
+    """
+    Committed changes to `name` ("products": the catalog fields, not stock)
+    made through any connection or terminal; bumped by triggers in
+    change_counters. In-memory caches remember the count they were built at.
+    """
+    row = db().execute("SELECT value FROM change_counters WHERE name=?", (name,)).fetchone()
+    return row["value"] if row else 0
+
+
+def get_setting(key: str, default: Optional[str] = None) -> Optional[str]:
+    row = db().execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+    return row["value"] if row else default
+
+
+def set_setting(key: str, value: str):
+    with transaction() as con:
+        con.execute("INSERT OR REPLACE INTO settings(key, value) VALUES(?, ?)", (key, str(value)))
+
+
+def apply_storage_profile(name: str) -> str:
+    """
+    Apply a STORAGE_PROFILES entry to the pool and record it in settings. An
+    unknown name falls back to DEFAULT_STORAGE_PROFILE and is kept in
+    settings["storage_profile_fallback"] (cleared once a valid name is used).
+    """
+    rejected = None
+    if name not in STORAGE_PROFILES:
+        rejected, name = name, DEFAULT_STORAGE_PROFILE
+    POOL.configure(**STORAGE_PROFILES[name])
+    db()  # journal_mode is persistent; switch it now, before any writer starts
+    with transaction() as con:
+        con.execute("INSERT OR REPLACE INTO settings(key, value) VALUES('storage_profile', ?)", (name,))
+        if rejected is None:
+            con.execute("DELETE FROM settings WHERE key='storage_profile_fallback'")
+        else:
+            con.execute("INSERT OR REPLACE INTO settings(key, value) VALUES('storage_profile_fallback', ?)",
+                        (str(rejected),))
+    return name
 
 
 def init_db():
     con = db()
     cur = con.cursor()
 
+    # Settings (key/value) + storage profile
+    cur.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+    apply_storage_profile(os.environ.get("INVENTORY_DB_PROFILE")
+                          or get_setting("storage_profile", DEFAULT_STORAGE_PROFILE))
+
+    create_schema(cur)
+
+    # Seed admin if missing
+    cur.execute("SELECT 1 FROM users WHERE username=?", ("admin",))
+    if cur.fetchone() is None:
+        cur.execute("INSERT INTO users(username,password,role,is_online,last_login) VALUES(?,?,?,?,?)",
+                    ("admin", "admin123", "Admin", 0, None))
+    con.commit()
+
+    run_migrations(con)
+    ensure_search_index()
+
+
+def create_schema(cur: sqlite3.Cursor):
+    """Base tables. Later changes go through MIGRATIONS."""
+
     # Users
     cur.execute("""
                 CREATE TABLE IF NOT EXISTS users
@@ -231,161 +409,529 @@ def init_db():
                     );
                 """)
 
-    # Sales
-    cur.execute("""
-                CREATE TABLE IF NOT EXISTS sales
-                (
-                    sale_id
-                    INTEGER
-                    PRIMARY
-                    KEY
-                    AUTOINCREMENT,
-                    product_id
-                    TEXT
-                    NOT
-                    NULL,
-                    product_name
-                    TEXT
-                    NOT
-                    NULL,
-                    category
-                    TEXT,
-                    quantity
-                    INTEGER
-                    NOT
-                    NULL,
-                    mrp
-                    REAL
-                    NOT
-                    NULL,
-                    total_price
-                    REAL
-                    NOT
-                    NULL, -- qty * mrp (before discount)
-                    discount_type
-                    TEXT, -- "Flat" or "Percent"
-                    discount_value
-                    REAL, -- discount value (₹ or %)
-                    effective_total
-                    REAL
-                    NOT
-                    NULL, -- final price after discount
-                    date
-                    TEXT
-                    NOT
-                    NULL, -- sale date (YYYY-MM-DD)
-                    sold_by
-                    TEXT, -- employee username
-                    customer_name
-                    TEXT,
-                    customer_phone
-                    TEXT
-                );
+    # ♻️ Returns
+    create_returns(cur)
 
 
-                """)
-    # ♻️ Returns
-    cur.execute("""
-                   CREATE TABLE IF NOT EXISTS returns
-                   (
-                       return_id
-                       INTEGER
-                       PRIMARY
-                       KEY
-                       AUTOINCREMENT,
-                       sale_id
-                       INTEGER,
-                       product_id
-                       TEXT,
-                       quantity
-                       INTEGER,
-                       refund_amount
-                       REAL,
-                       date
-                       TEXT,
-                       reason
-                       TEXT,
-                       FOREIGN
-                       KEY
+def create_returns(cur: sqlite3.Cursor, name: str = "returns"):
+    """The returns table; sale_id points at sale_lines (sales is a view since migration 3)."""
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS {name}
                    (
-                       sale_id
-                   ) REFERENCES sales
+                       return_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+                       sale_id       INTEGER REFERENCES sale_lines (sale_id),
+                       product_id    TEXT REFERENCES products (product_id),
+                       quantity      INTEGER,
+                       refund_amount REAL,
+                       date          TEXT,
+                       reason        TEXT
+                   )""")
+
+
+def create_legacy_sales(cur: sqlite3.Cursor):
+    """The flat one-row-per-line sales table of builds before migration 3 (benchmarks, upgrade tests)."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS sales
                    (
-                       sale_id
-                   ),
-                       FOREIGN KEY
+                       sale_id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                       product_id      TEXT NOT NULL,
+                       product_name    TEXT NOT NULL,
+                       category        TEXT,
+                       quantity        INTEGER NOT NULL,
+                       mrp             REAL NOT NULL,
+                       total_price     REAL NOT NULL, -- qty * mrp (before discount)
+                       discount_type   TEXT,          -- "Flat" or "Percent"
+                       discount_value  REAL,          -- discount value (₹ or %)
+                       effective_total REAL NOT NULL, -- final price after discount
+                       date            TEXT NOT NULL, -- sale date (YYYY-MM-DD)
+                       sold_by         TEXT,          -- employee username
+                       customer_name   TEXT,
+                       customer_phone  TEXT
+                   )""")
+
+
+# ---------- Schema Migrations ----------
+# Each step runs once, in its own transaction; PRAGMA user_version records
+# the last step applied. Steps must be idempotent (IF NOT EXISTS) so a
+# database touched by an older build can be migrated safely.
+
+def _migrate_report_indexes(con: sqlite3.Connection):
+    # report date filters, per-product history, refund lookups, supplier joins, low stock
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sales'").fetchone():
+        # databases from before migration 3; a new database never has a sales table
+        con.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_sales_product_date ON sales(product_id, date)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_returns_sale_product ON returns(sale_id, product_id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_products_supplier ON products(supplier_id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_products_stock ON products(quantity, reorder_level)")
+
+
+# table -> id column handed out by padded_id()
+ID_SEQUENCES = {"employees": "emp_id", "suppliers": "supplier_id",
+                "products": "product_id", "customers": "customer_id"}
+
+
+def _migrate_id_sequences(con: sqlite3.Connection):
+    con.execute("""CREATE TABLE IF NOT EXISTS id_sequences
                    (
-                       product_id
-                   ) REFERENCES products
+                       name  TEXT PRIMARY KEY,
+                       value INTEGER NOT NULL
+                   )""")
+    for table, col in ID_SEQUENCES.items():
+        # one last scan to seed the counter, then keep it >= any hand-typed ID
+        con.execute(f"""INSERT OR IGNORE INTO id_sequences(name, value)
+                        SELECT ?, IFNULL(MAX(CAST({col} AS INTEGER)), 0) FROM {table}""", (table,))
+        con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_id_seq
+                        AFTER INSERT ON {table}
+                        BEGIN
+                            UPDATE id_sequences
+                            SET value = MAX(value, CAST(NEW.{col} AS INTEGER))
+                            WHERE name = '{table}';
+                        END""")
+
+
+def _migrate_invoices(con: sqlite3.Connection):
+    # One header row per checkout; lines keep their old sale_id (returns point at it).
+    # `sales` becomes a read-only view with the old column set.
+    con.execute("""CREATE TABLE IF NOT EXISTS invoices
                    (
-                       product_id
-                   )
-                       )
-                   """)
-    cur.execute("""
-                   CREATE TABLE IF NOT EXISTS returns
-                   (
-                       return_id
-                       INTEGER
-                       PRIMARY
-                       KEY
-                       AUTOINCREMENT,
-                       sale_id
-                       INTEGER,
-                       product_id
-                       TEXT,
-                       quantity
-                       INTEGER,
-                       refund_amount
-                       REAL,
-                       date
-                       TEXT,
-                       reason
-                       TEXT,
-                       FOREIGN
-                       KEY
+                       invoice_no     TEXT PRIMARY KEY,
+                       date           TEXT NOT NULL, -- sale date (YYYY-MM-DD)
+                       sold_by        TEXT,          -- employee username
+                       customer_id    TEXT,
+                       customer_name  TEXT,
+                       customer_phone TEXT,
+                       subtotal       REAL NOT NULL DEFAULT 0, -- sum of qty * mrp
+                       grand_total    REAL NOT NULL DEFAULT 0  -- sum of effective_total
+                   )""")
+    con.execute("""CREATE TABLE IF NOT EXISTS sale_lines
                    (
-                       sale_id
-                   ) REFERENCES sales
-                   (
-                       sale_id
-                   ),
-                       FOREIGN KEY
+                       sale_id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                       invoice_no      TEXT NOT NULL REFERENCES invoices (invoice_no),
+                       product_id      TEXT NOT NULL,
+                       product_name    TEXT NOT NULL,
+                       category        TEXT,
+                       quantity        INTEGER NOT NULL,
+                       mrp             REAL NOT NULL,
+                       total_price     REAL NOT NULL, -- qty * mrp (before discount)
+                       discount_type   TEXT,          -- "Flat" or "Percent"
+                       discount_value  REAL,
+                       effective_total REAL NOT NULL  -- final price after discount
+                   )""")
+
+    is_table = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sales'").fetchone()
+    if is_table:
+        # The old checkout wrote one row per cart line with the header copied in and
+        # never stored the invoice number. Nothing in a row tells two back-to-back
+        # sales to one customer from one checkout (date has no time), so every old
+        # row becomes its own LEGACY-<sale_id> invoice. Headers go in before their
+        # lines so the REFERENCES invoices holds.
+        con.execute("""INSERT INTO invoices(invoice_no, date, sold_by, customer_name, customer_phone,
+                                            subtotal, grand_total)
+                       SELECT printf('LEGACY-%06d', sale_id), date, sold_by, customer_name, customer_phone,
+                              IFNULL(total_price, 0), IFNULL(effective_total, 0)
+                       FROM sales""")
+        con.execute("""INSERT INTO sale_lines(sale_id, invoice_no, product_id, product_name, category, quantity,
+                                              mrp, total_price, discount_type, discount_value, effective_total)
+                       SELECT sale_id, printf('LEGACY-%06d', sale_id), product_id, product_name, category, quantity,
+                              mrp, total_price, discount_type, discount_value, effective_total
+                       FROM sales""")
+        con.execute("DROP TABLE sales")  # also drops migration 1's sales indexes; see _sale_indexes()
+
+    con.execute("""CREATE VIEW IF NOT EXISTS sales AS
+                   SELECT l.sale_id, l.product_id, l.product_name, l.category, l.quantity, l.mrp,
+                          l.total_price, l.discount_type, l.discount_value, l.effective_total,
+                          i.date, i.sold_by, i.customer_name, i.customer_phone, l.invoice_no
+                   FROM sale_lines l
+                            JOIN invoices i ON i.invoice_no = l.invoice_no""")
+    _sale_indexes(con)
+
+
+def _sale_indexes(con: sqlite3.Connection):
+    # What idx_sales_date / idx_sales_product_date did for the old table, for
+    # queries on the sales view: date ranges scan invoices(date, invoice_no)
+    # without touching the table, per-product history starts from
+    # sale_lines(product_id, invoice_no), then each side joins by invoice_no.
+    con.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date_no ON invoices(date, invoice_no)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_invoice ON sale_lines(invoice_no)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_product_invoice ON sale_lines(product_id, invoice_no)")
+    con.execute("DROP INDEX IF EXISTS idx_invoices_date")       # prefixes of the two above
+    con.execute("DROP INDEX IF EXISTS idx_sale_lines_product")
+
+
+# table -> (id column, columns the section search boxes match)
+SEARCH_INDEXES = {
+    "products": ("product_id", ("name", "category")),
+    "customers": ("customer_id", ("name", "phone")),
+    "employees": ("emp_id", ("emp_id", "name", "phone", "email")),
+    "suppliers": ("supplier_id", ("name", "company", "phone")),
+}
+
+
+def _migrate_search_index(con: sqlite3.Connection):
+    # Without FTS5 / trigram (SQLite < 3.34) nothing is created and
+    # search_filter() keeps using LIKE; ensure_search_index() retries at startup.
+    _build_search_index(con)
+
+
+def _build_search_index(con: sqlite3.Connection) -> bool:
+    # <table>_fts: external-content FTS5 with the trigram tokenizer (substring
+    # matches, like the old LIKE '%q%'), keyed on the base table's rowid and
+    # kept in sync by triggers. Those rowids are implicit (the tables have TEXT
+    # keys), so VACUUM may renumber them: see vacuum_database().
+    try:
+        con.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        con.execute("DROP TABLE temp.fts_probe")
+    except sqlite3.OperationalError:
+        return False
+    for table, (_id_col, cols) in SEARCH_INDEXES.items():
+        col_list = ", ".join(cols)
+        new_vals = ", ".join(f"new.{c}" for c in cols)
+        old_vals = ", ".join(f"old.{c}" for c in cols)
+        con.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts
+                        USING fts5({col_list}, content='{table}', content_rowid='rowid', tokenize='trigram')""")
+        con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_ai AFTER INSERT ON {table}
+                        BEGIN
+                            INSERT INTO {table}_fts(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+                        END""")
+        con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_ad AFTER DELETE ON {table}
+                        BEGIN
+                            INSERT INTO {table}_fts({table}_fts, rowid, {col_list})
+                            VALUES ('delete', old.rowid, {old_vals});
+                        END""")
+        # only when a searched column changes, so stock updates at checkout stay cheap
+        con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_au AFTER UPDATE OF {col_list} ON {table}
+                        BEGIN
+                            INSERT INTO {table}_fts({table}_fts, rowid, {col_list})
+                            VALUES ('delete', old.rowid, {old_vals});
+                            INSERT INTO {table}_fts(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+                        END""")
+        con.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+    return True
+
+
+# Adds (sign "+", row NEW) or removes (sign "-", row OLD) one sale_lines row;
+# {cost} is the line's unit cost. "WHERE true" stops SQLite reading ON
+# CONFLICT as part of the SELECT.
+_SALES_DAILY_UPSERT = """INSERT INTO sales_daily(date, product_id, product_name, qty, revenue, cost)
+                         SELECT (SELECT date FROM invoices WHERE invoice_no = {row}.invoice_no),
+                                {row}.product_id, {row}.product_name,
+                                {sign}{row}.quantity, {sign}{row}.effective_total,
+                                {sign}{row}.quantity * IFNULL({cost}, 0)
+                         WHERE true
+                         ON CONFLICT(date, product_id) DO UPDATE
+                             SET product_name = excluded.product_name,
+                                 qty          = qty + excluded.qty,
+                                 revenue      = revenue + excluded.revenue,
+                                 cost         = cost + excluded.cost;"""
+
+_PRODUCT_COST = "(SELECT unit_price FROM products WHERE product_id = {row}.product_id)"
+
+
+def _migrate_sales_daily(con: sqlite3.Connection):
+    # Per (day, product) totals the report charts read instead of re-aggregating
+    # sale_lines. Sales count on the invoice date, refunds on the refund date.
+    # Triggers keep it current for every writer (checkout_cart, both refund
+    # windows); cost is the product's unit_price when the line is written.
+    con.execute("""CREATE TABLE IF NOT EXISTS sales_daily
                    (
-                       product_id
-                   ) REFERENCES products
+                       date          TEXT NOT NULL,
+                       product_id    TEXT NOT NULL,
+                       product_name  TEXT,                    -- name on the latest line
+                       qty           INTEGER NOT NULL DEFAULT 0,
+                       revenue       REAL    NOT NULL DEFAULT 0, -- sum of effective_total
+                       cost          REAL    NOT NULL DEFAULT 0, -- sum of qty * unit cost
+                       refund_qty    INTEGER NOT NULL DEFAULT 0,
+                       refund_amount REAL    NOT NULL DEFAULT 0,
+                       PRIMARY KEY (date, product_id)
+                   ) WITHOUT ROWID""")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sales_daily_product ON sales_daily(product_id, date)")
+    con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_sale_lines_daily_ai AFTER INSERT ON sale_lines
+                    BEGIN
+                        {_SALES_DAILY_UPSERT.format(sign="+", row="NEW", cost=_PRODUCT_COST.format(row="NEW"))}
+                    END""")
+    con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_sale_lines_daily_ad AFTER DELETE ON sale_lines
+                    BEGIN
+                        {_SALES_DAILY_UPSERT.format(sign="-", row="OLD", cost=_PRODUCT_COST.format(row="OLD"))}
+                    END""")
+    con.execute("""CREATE TRIGGER IF NOT EXISTS trg_returns_daily_ai AFTER INSERT ON returns
+                   BEGIN
+                       INSERT INTO sales_daily(date, product_id, product_name, refund_qty, refund_amount)
+                       SELECT NEW.date, NEW.product_id,
+                              (SELECT product_name FROM sale_lines WHERE sale_id = NEW.sale_id),
+                              NEW.quantity, NEW.refund_amount
+                       WHERE NEW.date IS NOT NULL AND NEW.product_id IS NOT NULL
+                       ON CONFLICT(date, product_id) DO UPDATE
+                           SET refund_qty    = refund_qty + excluded.refund_qty,
+                               refund_amount = refund_amount + excluded.refund_amount;
+                   END""")
+
+    # one pass over the existing history
+    _rebuild_sales_daily(con, cost="p.unit_price")
+
+
+def _rebuild_sales_daily(con: sqlite3.Connection, cost: str):
+    # {cost}: SQL for a line's unit cost (l = sale_lines, p = products)
+    con.execute("DELETE FROM sales_daily")
+    con.execute(f"""INSERT INTO sales_daily(date, product_id, product_name, qty, revenue, cost)
+                    SELECT i.date, l.product_id, MAX(l.product_name), SUM(l.quantity), SUM(l.effective_total),
+                           SUM(l.quantity * IFNULL({cost}, 0))
+                    FROM sale_lines l
+                             JOIN invoices i ON i.invoice_no = l.invoice_no
+                             LEFT JOIN products p ON p.product_id = l.product_id
+                    GROUP BY i.date, l.product_id""")
+    con.execute("""INSERT INTO sales_daily(date, product_id, product_name, refund_qty, refund_amount)
+                   SELECT r.date, r.product_id, MAX(l.product_name), SUM(r.quantity), SUM(r.refund_amount)
+                   FROM returns r
+                            LEFT JOIN sale_lines l ON l.sale_id = r.sale_id
+                   WHERE r.date IS NOT NULL AND r.product_id IS NOT NULL
+                   GROUP BY r.date, r.product_id
+                   ON CONFLICT(date, product_id) DO UPDATE
+                       SET refund_qty    = excluded.refund_qty,
+                           refund_amount = excluded.refund_amount""")
+
+
+def _migrate_cost_at_sale(con: sqlite3.Connection):
+    # Profit used today's products.unit_price, so a price change rewrote every
+    # past margin. Lines now carry the unit cost and GST % at checkout; old
+    # lines are backfilled from the current price (the best value left).
+    cols = {r["name"] for r in con.execute("PRAGMA table_info(sale_lines)")}
+    if "unit_cost" not in cols:
+        con.execute("ALTER TABLE sale_lines ADD COLUMN unit_cost REAL")  # products.unit_price at checkout
+    if "gst" not in cols:
+        con.execute("ALTER TABLE sale_lines ADD COLUMN gst REAL")        # products.gst (%) at checkout
+    con.execute("""UPDATE sale_lines
+                   SET unit_cost = IFNULL(unit_cost, (SELECT unit_price FROM products p
+                                                      WHERE p.product_id = sale_lines.product_id)),
+                       gst       = IFNULL(gst, (SELECT gst FROM products p
+                                                WHERE p.product_id = sale_lines.product_id))
+                   WHERE unit_cost IS NULL OR gst IS NULL""")
+
+    con.execute("DROP VIEW IF EXISTS sales")
+    con.execute("""CREATE VIEW sales AS
+                   SELECT l.sale_id, l.product_id, l.product_name, l.category, l.quantity, l.mrp,
+                          l.total_price, l.discount_type, l.discount_value, l.effective_total,
+                          i.date, i.sold_by, i.customer_name, i.customer_phone, l.invoice_no,
+                          l.unit_cost, l.gst
+                   FROM sale_lines l
+                            JOIN invoices i ON i.invoice_no = l.invoice_no""")
+
+    # the rollup takes cost from the line itself from now on; rebuild it too,
+    # since rows added after migration 5 used unit_price at insert time, which
+    # a price edit since then has moved away from the backfilled unit_cost
+    for name, sign, row in (("trg_sale_lines_daily_ai", "+", "NEW"), ("trg_sale_lines_daily_ad", "-", "OLD")):
+        con.execute(f"DROP TRIGGER IF EXISTS {name}")
+        con.execute(f"""CREATE TRIGGER {name} AFTER {'INSERT' if row == 'NEW' else 'DELETE'} ON sale_lines
+                        BEGIN
+                            {_SALES_DAILY_UPSERT.format(sign=sign, row=row, cost=f"{row}.unit_cost")}
+                        END""")
+    _rebuild_sales_daily(con, cost="l.unit_cost")
+
+
+def _migrate_sort_indexes(con: sqlite3.Connection):
+    # Products / Customers page on (CAST(id AS INTEGER), id) so "0010" sorts after
+    # "0009" and "100" after "99"; the same expressions here let each page seek
+    con.execute("CREATE INDEX IF NOT EXISTS idx_products_sort ON products(CAST(product_id AS INTEGER), product_id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_customers_sort ON customers(CAST(customer_id AS INTEGER), customer_id)")
+
+
+# name -> (table, columns whose updates count as a change); see change_count()
+CHANGE_COUNTERS = {"products": ("products", ("product_id", "name", "category", "mrp"))}
+
+
+def _migrate_change_counters(con: sqlite3.Connection):
+    # Lets in-memory caches (ProductIndex) notice catalog edits made by other
+    # terminals; stock updates do not count, so checkouts never invalidate.
+    con.execute("""CREATE TABLE IF NOT EXISTS change_counters
                    (
-                       product_id
-                   )
-                       )
-                   """)
+                       name  TEXT PRIMARY KEY,
+                       value INTEGER NOT NULL DEFAULT 0
+                   )""")
+    for name, (table, cols) in CHANGE_COUNTERS.items():
+        con.execute("INSERT OR IGNORE INTO change_counters(name, value) VALUES (?, 0)", (name,))
+        for suffix, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", f"UPDATE OF {', '.join(cols)}")):
+            con.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{name}_count_{suffix} AFTER {event} ON {table}
+                            BEGIN
+                                UPDATE change_counters SET value = value + 1 WHERE name = '{name}';
+                            END""")
+
+
+def _migrate_returns_fk(con: sqlite3.Connection):
+    # returns.sale_id was declared REFERENCES sales, which migration 3 turned
+    # into a view, so with foreign_keys on every write to returns failed with
+    # "foreign key mismatch". SQLite cannot change a constraint in place:
+    # rebuild the table (create, copy, drop, rename) pointing at sale_lines and
+    # put back its indexes and triggers (idx_returns_sale_product, the rollup's).
+    if any(r["table"] == "sale_lines" for r in con.execute("PRAGMA foreign_key_list(returns)")):
+        return  # created by create_returns() already
+    extras = [r["sql"] for r in con.execute("""SELECT sql FROM sqlite_master
+                                               WHERE tbl_name = 'returns' AND type IN ('index', 'trigger')
+                                                 AND sql IS NOT NULL""")]
+    seq = con.execute("SELECT seq FROM sqlite_sequence WHERE name='returns'").fetchone()
+    create_returns(con.cursor(), "returns_new")
+    con.execute("""INSERT INTO returns_new(return_id, sale_id, product_id, quantity, refund_amount, date, reason)
+                   SELECT return_id, sale_id, product_id, quantity, refund_amount, date, reason
+                   FROM returns""")
+    con.execute("DROP TABLE returns")
+    con.execute("ALTER TABLE returns_new RENAME TO returns")
+    if seq:  # ids of deleted returns are not handed out again
+        con.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name='returns'", (seq[0],))
+    for sql in extras:
+        con.execute(sql)
+
+
+MIGRATIONS = [
+    (1, "secondary indexes for sales / returns / products", _migrate_report_indexes),
+    (2, "id_sequences allocator for padded IDs", _migrate_id_sequences),
+    (3, "invoices header + sale_lines, sales becomes a view", _migrate_invoices),
+    (4, "FTS5 trigram search index for products / customers / employees / suppliers", _migrate_search_index),
+    (5, "sales_daily rollup (date, product) maintained by triggers", _migrate_sales_daily),
+    (6, "unit cost / GST captured on sale_lines at checkout", _migrate_cost_at_sale),
+    (7, "change_counters bumped by catalog triggers", _migrate_change_counters),
+    (8, "covering indexes behind the sales view", _sale_indexes),
+    (9, "expression indexes for the numeric ID sort", _migrate_sort_indexes),
+    (10, "returns.sale_id references sale_lines instead of the sales view", _migrate_returns_fk),
+]
+
+
+def run_migrations(con: sqlite3.Connection):
+    current = con.execute("PRAGMA user_version").fetchone()[0]
+    if current >= MIGRATIONS[-1][0]:
+        return
+    # Schema rewrites (sales: table -> view, the returns rebuild) need foreign
+    # keys off, as SQLite's ALTER TABLE procedure says; it can only be switched
+    # outside a transaction.
+    foreign_keys = con.execute("PRAGMA foreign_keys").fetchone()[0]
+    con.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for version, _title, step in MIGRATIONS:
+            if version <= current:
+                continue
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                step(con)
+                con.execute(f"PRAGMA user_version={version}")
+            except BaseException:
+                con.rollback()
+                raise
+            con.commit()
+    finally:
+        con.execute(f"PRAGMA foreign_keys={foreign_keys}")
 
-    # Seed admin if missing
-    cur.execute("SELECT 1 FROM users WHERE username=?", ("admin",))
-    if cur.fetchone() is None:
-        cur.execute("INSERT INTO users(username,password,role,is_online,last_login) VALUES(?,?,?,?,?)",
-                    ("admin", "admin123", "Admin", 0, None))
-    con.commit()
-    con.close()
+
+# ---------- Search ----------
+
+_search_index_ready: dict = {}
+
+
+def has_search_index(table: str) -> bool:
+    if table not in _search_index_ready:
+        _search_index_ready[table] = db().execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f"{table}_fts",)).fetchone() is not None
+    return _search_index_ready[table]
+
+
+def ensure_search_index():
+    """
+    Build any missing <table>_fts index (migration 4 ran on an SQLite without
+    FTS5 trigram, and it has since been upgraded). The outcome is kept in
+    settings["search_index"]: "fts5", or "like" plus the reason.
+    """
+    if not all(has_search_index(t) for t in SEARCH_INDEXES):
+        with transaction(immediate=True) as con:
+            _build_search_index(con)
+        _search_index_ready.clear()
+    if all(has_search_index(t) for t in SEARCH_INDEXES):
+        state = "fts5"
+    else:
+        state = f"like (SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer)"
+    if get_setting("search_index") != state:
+        set_setting("search_index", state)
+
+
+def vacuum_database():
+    """
+    VACUUM, then rebuild the search indexes: VACUUM may renumber the implicit
+    rowids of the TEXT-keyed tables, and <table>_fts rows point at those rowids.
+    """
+    con = db()
+    con.execute("VACUUM")
+    with transaction() as con:
+        for table in SEARCH_INDEXES:
+            if has_search_index(table):
+                con.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def fts_phrase(q: str) -> Optional[str]:
+    """q as an FTS5 phrase (substring match under trigram), or None if shorter than one trigram."""
+    q = q.strip()
+    if len(q) < 3:
+        return None
+    return '"' + q.replace('"', '""') + '"'
+
+
+def search_filter(table: str, q: str, alias: str = "",
+                  also: Optional[Tuple[str, tuple]] = None) -> Tuple[str, tuple]:
+    """
+    WHERE fragment + params for rows of `table` whose SEARCH_INDEXES columns
+    contain q (case-insensitive). Uses <table>_fts when it exists and q is at
+    least 3 characters, otherwise the old LIKE '%q%' scan.
+    also: (SELECT of more matching rowids, params), e.g. rows matched through
+    a joined table. It joins the FTS lookup as a UNION ALL (IN ignores the
+    duplicates) so the query is still driven from the index; an OR next to it
+    made SQLite walk the whole table checking each row.
+    """
+    q = q.strip()
+    if not q:
+        return "1=1", ()
+    prefix = f"{alias}." if alias else ""
+    phrase = fts_phrase(q)
+    if phrase and has_search_index(table):
+        rowids, params = f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?", (phrase,)
+        if also:
+            rowids, params = f"{rowids} UNION ALL {also[0]}", params + also[1]
+        return f"{prefix}rowid IN ({rowids})", params
+    cols = SEARCH_INDEXES[table][1]
+    where, params = " OR ".join(f"{prefix}{c} LIKE ?" for c in cols), (f"%{q}%",) * len(cols)
+    if also:
+        where, params = f"{where} OR {prefix}rowid IN ({also[0]})", params + also[1]
+    return f"({where})", params
+
+
+SEARCH_RANK_CANDIDATES = 500  # matches scored per query; broad terms ("oil") rank the first 500 only
+
+
+def fts_search(table: str, q: str, limit: int = 50) -> List[sqlite3.Row]:
+    """
+    Best matches first: rows of `table` ranked by bm25 over the trigram index.
+    Only SEARCH_RANK_CANDIDATES matches are scored, so a term hitting most of
+    the table costs the same as a selective one. Falls back to an unranked
+    LIKE scan for short queries / no FTS5.
+    """
+    phrase = fts_phrase(q)
+    if phrase and has_search_index(table):
+        return db().execute(f"""SELECT t.* FROM (SELECT rowid, rank FROM {table}_fts
+                                                 WHERE {table}_fts MATCH ? LIMIT ?) f
+                                JOIN {table} t ON t.rowid = f.rowid
+                                ORDER BY f.rank LIMIT ?""", (phrase, SEARCH_RANK_CANDIDATES, limit)).fetchall()
+    where, params = search_filter(table, q)
+    return db().execute(f"SELECT * FROM {table} WHERE {where} LIMIT ?", params + (limit,)).fetchall()
 
 
 def padded_id(prefix_table: str, id_col: str, width: int = 3) -> str:
     """
-    Generate next numeric string ID (e.g., 001, 002).
+    Allocate next numeric string ID (e.g., 001, 002) from id_sequences.
     prefix_table: table name
-    id_col: id column
+    id_col: id column (used to seed a sequence the first time it is seen)
+    The counter is bumped under BEGIN IMMEDIATE, so two terminals never get
+    the same ID; an ID that is allocated but never saved is simply skipped.
     """
-    con = db()
-    cur = con.cursor()
-    cur.execute(f"SELECT {id_col} FROM {prefix_table}")
-    ids = []
-    for row in cur.fetchall():
-        try:
-            ids.append(int(str(row[0]).lstrip("0") or "0"))
-        except Exception:
-            pass
-    nxt = (max(ids) + 1) if ids else 1
-    con.close()
+    with transaction(immediate=True) as con:
+        row = con.execute("SELECT value FROM id_sequences WHERE name=?", (prefix_table,)).fetchone()
+        if row is None:
+            con.execute(f"""INSERT INTO id_sequences(name, value)
+                            SELECT ?, IFNULL(MAX(CAST({id_col} AS INTEGER)), 0) FROM {prefix_table}""",
+                        (prefix_table,))
+        con.execute("UPDATE id_sequences SET value = value + 1 WHERE name=?", (prefix_table,))
+        nxt = con.execute("SELECT value FROM id_sequences WHERE name=?", (prefix_table,)).fetchone()[0]
     return str(nxt).zfill(width)
 
 
@@ -406,109 +952,125 @@ def now_str() -> str:
     return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def employee_default_password(emp_name: str) -> str:
-    token = re.sub(r"\s+", "", emp_name).lower()[:3]
-    if len(token) < 3:
-        token = (token + "xxx")[:3]
-    return f"{token}123"
+# KPI period -> label shown in the Reports period selector
+KPI_PERIODS = {"today": "Today", "month": "This Month", "quarter": "This Quarter", "ytd": "Year to Date"}
+
 
+def period_bounds(period: str, today: Optional[dt.date] = None) -> Tuple[str, str]:
+    """
+    [start, end) ISO dates of a KPI period, for `date >= ? AND date < ?`.
+    Plain range bounds let SQLite seek the date index; strftime() on the
+    column could not, and '%m' alone also matched the same month of every year.
+    """
+    d = today or dt.date.today()
+    if period == "today":
+        start = d
+    elif period == "month":
+        start = d.replace(day=1)
+    elif period == "quarter":
+        start = d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+    elif period == "ytd":
+        start = d.replace(month=1, day=1)
+    else:
+        raise ValueError(f"unknown KPI period: {period}")
+    return start.isoformat(), (d + dt.timedelta(days=1)).isoformat()
 
-# ---------- PDF: Invoice ----------
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+_HOME_KPI_CACHE: dict = {}  # "kpis" / "users" -> (db_change_token, today, value)
 
 
-def generate_invoice_pdf(filename, company_name, company_address, invoice_no, invoice_date,
-                         customer_name, customer_phone, items, discount_type, discount_value,
-                         gst_percent, subtotal, grand_total):
+def home_kpis(with_users: bool = False) -> dict:
     """
-    Generate invoice PDF with full breakdown.
-    items = list of (name, category, qty, mrp, line_total)
+    Dashboard Home cards in one query: employees, products, suppliers,
+    inventory value, today's sales, low-stock count (and the online-users
+    rows for Admin). Cached until db_change_token() or the date changes,
+    so going back to Home without any write in between reads nothing.
     """
+    token, today = db_change_token(), today_str()
+    hit = _HOME_KPI_CACHE.get("kpis")
+    if hit is None or hit[:2] != (token, today):
+        row = db().execute("""SELECT (SELECT COUNT(*) FROM employees),
+                                     (SELECT COUNT(*) FROM products),
+                                     (SELECT COUNT(*) FROM suppliers),
+                                     (SELECT IFNULL(SUM(quantity * mrp), 0) FROM products),
+                                     (SELECT IFNULL(SUM(revenue), 0) FROM sales_daily WHERE date = ?),
+                                     (SELECT COUNT(*) FROM products WHERE quantity < reorder_level)""",
+                           (today,)).fetchone()
+        hit = _HOME_KPI_CACHE["kpis"] = (token, today, dict(zip(
+            ("employees", "products", "suppliers", "inventory_value", "todays_sales", "low_stock"), row)))
+    kpis = dict(hit[2])
+    if with_users:
+        users = _HOME_KPI_CACHE.get("users")
+        if users is None or users[0] != token:
+            rows = db().execute("SELECT username, role, is_online, IFNULL(last_login,'') last_login "
+                                "FROM users ORDER BY role DESC, username").fetchall()
+            users = _HOME_KPI_CACHE["users"] = (token, today, [tuple(r) for r in rows])
+        kpis["users"] = users[2]
+    return kpis
+
+
+def sales_kpis(period: str) -> Tuple[float, float]:
+    """(revenue, profit) of a KPI period, read from the sales_daily rollup."""
+    start, end = period_bounds(period)
+    row = db().execute("""SELECT IFNULL(SUM(revenue), 0), IFNULL(SUM(revenue - cost), 0)
+                          FROM sales_daily
+                          WHERE date >= ? AND date < ?""", (start, end)).fetchone()
+    return row[0], row[1]
 
-    doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=20)
-    story = []
-    styles = getSampleStyleSheet()
-
-    # Header
-    story.append(Paragraph(f"<b>{company_name}</b>", styles["Title"]))
-    story.append(Paragraph(company_address.replace("\n", "<br/>"), styles["Normal"]))
-    story.append(Spacer(1, 12))
 
-    # Invoice meta
-    story.append(Paragraph(f"<b>Invoice No:</b> {invoice_no}", styles["Normal"]))
-    story.append(Paragraph(f"<b>Date:</b> {invoice_date}", styles["Normal"]))
-    story.append(Paragraph(f"<b>Customer:</b> {customer_name}", styles["Normal"]))
-    story.append(Paragraph(f"<b>Phone:</b> {customer_phone}", styles["Normal"]))
-    story.append(Spacer(1, 12))
+def employee_default_password(emp_name: str) -> str:
+    token = re.sub(r"\s+", "", emp_name).lower()[:3]
+    if len(token) < 3:
+        token = (token + "xxx")[:3]
+    return f"{token}123"
 
-    # Table header
-    data = [["Product", "Category", "Qty", "MRP", "Line Total (₹)"]]
-    for n, c, q, m, t in items:
-        data.append([n, c, q, f"{m:.2f}", f"{t:.2f}"])
 
-    table = Table(data, colWidths=[180, 100, 60, 80, 100])
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(table)
-    story.append(Spacer(1, 12))
-
-    # Totals breakdown
-    totals_data = []
-    totals_data.append(["Subtotal", f"₹ {subtotal:.2f}"])
-    if discount_type == "Flat":
-        totals_data.append([f"Discount (Flat ₹{discount_value:.2f})", f"- ₹ {discount_value:.2f}"])
-    else:
-        totals_data.append([f"Discount ({discount_value:.2f}%)", f"- ₹ {(subtotal * discount_value / 100):.2f}"])
-    after_disc = subtotal - (discount_value if discount_type == "Flat" else subtotal * discount_value / 100)
-    gst_amt = after_disc * (gst_percent / 100)
-    totals_data.append([f"GST ({gst_percent:.1f}%)", f"+ ₹ {gst_amt:.2f}"])
-    totals_data.append(["", ""])
-    totals_data.append(["Grand Total", f"₹ {grand_total:.2f}"])
-
-    totals_table = Table(totals_data, colWidths=[300, 200])
-    totals_table.setStyle(TableStyle([
-        ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-        ("FONTNAME", (0, 0), (-1, -2), "Helvetica"),
-        ("FONTNAME", (-1, -1), (-1, -1), "Helvetica-Bold"),
-        ("TEXTCOLOR", (-1, -1), (-1, -1), colors.green),
-        ("FONTSIZE", (-1, -1), (-1, -1), 14),
-    ]))
-    story.append(totals_table)
+# ---------- Excel / PDF generic exports ----------
 
-    doc.build(story)
+# "118.00", "12.50%", "18%" as tables format money and percentages; whole
+# numbers without "%" (IDs, phones, quantities) do not match
+_DECIMAL_TEXT = re.compile(r"-?\d+\.\d+|-?\d+(\.\d+)?%")
 
 
-# ---------- Excel / PDF generic exports ----------
+def export_treeview_to_excel(tree: ttk.Treeview, filename: str, sheet_name: str = "Data"):
+    """
+    Write every row of `tree` (headings, rows, export timestamp) to `filename`.
+    Rows stream from table_rows() - a VirtualTable reads its query with
+    fetchmany() - into a write-only workbook, so memory stays flat however
+    many rows there are. Money and percentages the table shows as text are
+    written as numbers; IDs and phone numbers stay text.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+
+    def cell(value):
+        if not (isinstance(value, str) and _DECIMAL_TEXT.fullmatch(value)):
+            return value
+        if value.endswith("%"):
+            c = WriteOnlyCell(ws, float(value[:-1]) / 100)
+            c.number_format = "0.00%" if "." in value else "0%"  # as many decimals as the table showed
+        else:
+            c = WriteOnlyCell(ws, float(value))
+            c.number_format = "0.00"
+        return c
 
-def export_treeview_to_excel(tree: ttk.Treeview, suggested_name: str):
-    save_path = filedialog.asksaveasfilename(defaultextension=".xlsx", initialfile=suggested_name,
-                                             filetypes=[("Excel Workbook", "*.xlsx")])
-    if not save_path:
-        return
-    cols = tree["columns"]
-    data = []
-    for child in tree.get_children():
-        vals = tree.item(child, "values")
-        data.append(list(vals))
-    df = pd.DataFrame(data, columns=cols)
-    try:
-        with pd.ExcelWriter(save_path, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Data")
-        messagebox.showinfo("Export", f"Excel exported:\n{save_path}")
-    except Exception as e:
-        messagebox.showerror("Export Error", str(e))
+    ws.append([tree.heading(col)["text"] for col in tree["columns"]])
+    for vals in table_rows(tree):
+        ws.append([cell(v) for v in vals])
+    ws.append([])
+    ws.append([f"Exported On: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+    wb.save(filename)
 
 
 def export_treeview_to_pdf(tree: ttk.Treeview, suggested_name: str, title: str):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+
     save_path = filedialog.asksaveasfilename(defaultextension=".pdf", initialfile=suggested_name,
                                              filetypes=[("PDF", "*.pdf")])
     if not save_path:
@@ -516,9 +1078,7 @@ def export_treeview_to_pdf(tree: ttk.Treeview, suggested_name: str, title: str):
 
     cols = tree["columns"]
     data = [list(cols)]
-    for child in tree.get_children():
-        vals = tree.item(child, "values")
-        data.append(list(vals))
+    data.extend(list(vals) for vals in table_rows(tree))
 
     doc = SimpleDocTemplate(save_path, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24)
     styles = getSampleStyleSheet()
@@ -537,6 +1097,308 @@ def export_treeview_to_pdf(tree: ttk.Treeview, suggested_name: str, title: str):
     messagebox.showinfo("Export", f"PDF exported:\n{save_path}")
 
 
+# ---------- Background Work ----------
+
+class UiExecutor:
+    """
+    Runs slow calls (PDF rendering, heavy queries) on worker threads and hands
+    the results back to the Tk thread. Workers never touch widgets: finished
+    futures are queued and drained from root.after(), so on_done / on_error
+    always run on the mainloop.
+    """
+
+    def __init__(self, root: tk.Tk, max_workers: int = 1, poll_ms: int = 50, name: str = "ui-worker"):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._done: "queue.Queue" = queue.Queue()
+        self._pending = 0
+        self._polling = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, fn, *args, on_done=None, on_error=None, **kwargs):
+        fut = self._pool.submit(fn, *args, **kwargs)
+        self._pending += 1
+        fut.add_done_callback(lambda f: self._done.put((f, on_done, on_error)))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return fut
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    item = self._done.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                self._deliver(*item)
+        finally:
+            # reschedule even if a callback blew up, or the queue stalls for good
+            self._polling = False
+            if self._pending > 0:
+                try:
+                    self.root.after(self.poll_ms, self._poll)
+                    self._polling = True
+                except tk.TclError:
+                    pass  # root destroyed
+
+    def _deliver(self, fut, on_done, on_error):
+        if fut.cancelled():
+            return
+        err = fut.exception()
+        try:
+            if err is None:
+                if on_done: on_done(fut.result())
+            elif on_error:
+                on_error(err)
+            else:
+                self.root.report_callback_exception(type(err), err, err.__traceback__)
+        except tk.TclError:
+            pass  # target widget was destroyed while the task ran
+        except Exception:
+            self.root.report_callback_exception(*sys.exc_info())
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class QueryLoader:
+    """
+    Loads the data of one view (a section table, a report window) off the Tk
+    thread. load(query, apply, *args) runs query(*args) on the app's query
+    worker and apply(result) back on the mainloop. A newer load() interrupts
+    the running query (sqlite3 Connection.interrupt()) and drops its result,
+    as does destroying the widget, so only the latest request ever reaches the
+    widgets. While a load is outstanding the widget shows a busy cursor and
+    `status` (if given) reads "Loading…". A failed query is reported in
+    `status`, or in an error box when there is none.
+    """
+
+    def __init__(self, widget: tk.Misc, status: Optional[tk.StringVar] = None,
+                 executor: Optional[UiExecutor] = None):
+        self.widget, self.status = widget, status
+        self.executor = executor or widget.nametowidget(".").query_worker
+        self._gen = 0
+        self._running: Optional[Tuple[int, sqlite3.Connection]] = None
+        self._lock = threading.Lock()
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+
+    def load(self, query, apply, *args):
+        self.cancel()
+        gen = self._gen
+        self._busy(True)
+        self.executor.submit(self._run, gen, query, args,
+                             on_done=lambda value: self._done(gen, apply, value),
+                             on_error=lambda err: self._failed(gen, err))
+
+    def cancel(self):
+        self._gen += 1
+        with self._lock:
+            if self._running is not None:
+                self._running[1].interrupt()
+
+    def _run(self, gen: int, query, args):
+        # worker thread
+        if gen != self._gen:
+            return None  # superseded while queued
+        with self._lock:
+            self._running = (gen, db())
+        try:
+            return query(*args)
+        finally:
+            with self._lock:
+                self._running = None
+
+    def _done(self, gen: int, apply, value):
+        if gen != self._gen:
+            return
+        self._busy(False)
+        apply(value)
+
+    def _failed(self, gen: int, err: BaseException):
+        if gen != self._gen:
+            return  # superseded (usually interrupted by the newer load)
+        self._busy(False)
+        if self.status is not None:
+            self.status.set(f"Could not load: {err}")
+        else:
+            messagebox.showerror("Error", f"Could not load data:\n{err}", parent=self.widget)
+
+    def _busy(self, on: bool):
+        if self.status is not None:
+            self.status.set("Loading…" if on else "")
+        try:
+            self.widget.configure(cursor="watch" if on else "")
+        except tk.TclError:
+            pass
+
+    def _on_destroy(self, event):
+        if event.widget is self.widget:
+            self._gen += 1
+            with self._lock:
+                if self._running is not None:
+                    self._running[1].interrupt()
+
+
+class LiveSearch:
+    """
+    Search-as-you-type for a section search box. Each edit of `var` restarts a
+    delay_ms debounce; when it fires, query(text) runs through a QueryLoader
+    on the app's search worker and apply(result) gets the result on the Tk
+    thread. An edit made while a query is running interrupts it and results
+    of superseded queries are dropped, so a fast typist never queues one full
+    scan per keystroke. refresh() reloads at once (after a save / delete).
+    """
+
+    def __init__(self, widget: tk.Misc, var: tk.StringVar, query, apply, delay_ms: int = 250,
+                 executor: Optional[UiExecutor] = None, status: Optional[tk.StringVar] = None):
+        self.widget, self.var, self.query, self.apply = widget, var, query, apply
+        self.delay_ms = delay_ms
+        self.loader = QueryLoader(widget, status, executor or widget.winfo_toplevel().search_worker)
+        self._after_id = None
+        var.trace_add("write", lambda *_: self.schedule())
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+
+    def schedule(self):
+        self.cancel()
+        self._after_id = self.widget.after(self.delay_ms, self.refresh)
+
+    def refresh(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = None
+        self.loader.load(self.query, self.apply, self.var.get())
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self.loader.cancel()
+
+    def _on_destroy(self, event):
+        if event.widget is self.widget and self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+            self._after_id = None
+
+
+class InvoiceRenderQueue:
+    """
+    Invoice PDFs are rendered one at a time on a worker thread; progress is
+    published through status (a StringVar the dashboard header shows).
+    """
+
+    def __init__(self, root: tk.Tk):
+        self.root = root
+        self.status = tk.StringVar(master=root, value="")
+        self._exec = UiExecutor(root, max_workers=1, name="invoice-pdf")
+
+    @property
+    def pending(self) -> int:
+        return self._exec.pending
+
+    def submit(self, filename: str, invoice_no: str, *args):
+        self._exec.submit(render_invoice_pdf, filename, invoice_no, *args, qr_mode=invoice_qr_mode(),
+                          on_done=lambda _: self._finished(invoice_no, filename),
+                          on_error=lambda e: self._failed(invoice_no, e))
+        self._show_pending()
+
+    def _show_pending(self):
+        n = self._exec.pending
+        if n:
+            self.status.set(f"Rendering {n} invoice(s)…")
+
+    def _finished(self, invoice_no: str, filename: str):
+        # the executor has already counted this one as done
+        if self._exec.pending > 0:
+            self.status.set(f"Rendering {self._exec.pending} invoice(s)…")
+        else:
+            self.status.set(f"Invoice {invoice_no} saved: {os.path.basename(filename)}")
+
+    def _failed(self, invoice_no: str, err: BaseException):
+        self.status.set(f"Invoice {invoice_no} failed")
+        messagebox.showerror("Invoice", f"Could not write invoice {invoice_no}:\n{err}")
+
+    def shutdown(self, wait: bool = True):
+        self._exec.shutdown(wait=wait)
+
+
+# ---------- Image Assets ----------
+
+def scaled_image_file(path: str, size: Tuple[int, int], cache_dir: Optional[str] = None) -> str:
+    """
+    PNG of `path` resized to `size`, decoded and scaled once and kept in
+    cache_dir. The file name carries the source mtime and the target size,
+    so editing the source or asking for another size misses the cache.
+    PIL is only imported on a miss.
+    """
+    cache_dir = cache_dir or IMAGE_CACHE_DIR
+    st = os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    tag = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    prefix = f"{stem}_{tag}_{size[0]}x{size[1]}_"
+    cached = os.path.join(cache_dir, f"{prefix}{st.st_mtime_ns}.png")
+    if os.path.exists(cached):
+        return cached
+
+    from PIL import Image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(path) as img:
+        scaled = img.resize(size)
+    fd, tmp = tempfile.mkstemp(suffix=".png", dir=cache_dir)
+    os.close(fd)
+    try:
+        scaled.save(tmp, "PNG")
+        os.replace(tmp, cached)  # readers never see a half-written file
+    except BaseException:
+        os.remove(tmp)
+        raise
+    for name in os.listdir(cache_dir):  # scaled copies of older versions of the source
+        if name.startswith(prefix) and os.path.join(cache_dir, name) != cached:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    return cached
+
+
+class ImageAssets:
+    """
+    PhotoImages for fixed artwork, built once per Tk root and handed out
+    again on every later request (LoginFrame is rebuilt on each logout).
+    Keyed by source mtime too, so a replaced logo shows on the next login.
+    """
+
+    def __init__(self, root: tk.Misc, cache_dir: Optional[str] = None):
+        self.root = root
+        self.cache_dir = cache_dir or IMAGE_CACHE_DIR
+        self._photos = {}
+
+    def photo(self, path: str, size: Tuple[int, int]) -> tk.PhotoImage:
+        key = (os.path.abspath(path), tuple(size), os.stat(path).st_mtime_ns)
+        img = self._photos.get(key)
+        if img is None:
+            try:
+                img = tk.PhotoImage(master=self.root, file=scaled_image_file(path, size, self.cache_dir))
+            except (OSError, tk.TclError):
+                # cache dir not writable (or Tk without PNG): scale in memory as before
+                from PIL import Image, ImageTk
+                with Image.open(path) as src:
+                    img = ImageTk.PhotoImage(src.resize(size), master=self.root)
+            for old in [k for k in self._photos if k[:2] == key[:2]]:
+                del self._photos[old]
+            self._photos[key] = img
+        return img
+
+
 # ---------- Main App ----------
 
 class InventoryApp(tk.Tk):
@@ -548,6 +1410,11 @@ class InventoryApp(tk.Tk):
         self.minsize(1100, 720)
 
         self.current_user = None  # (username, role)
+        self.closing = False
+        self.invoices = InvoiceRenderQueue(self)
+        self.search_worker = UiExecutor(self, max_workers=1, name="search")
+        self.query_worker = UiExecutor(self, max_workers=2, name="query")  # section refreshes and reports
+        self.images = ImageAssets(self)  # login artwork, kept across logout cycles
 
         self.container = tk.Frame(self, bg=THEME["bg"])
         self.container.pack(fill="both", expand=True)
@@ -565,11 +1432,8 @@ class InventoryApp(tk.Tk):
     def logout(self):
         # mark offline
         if self.current_user:
-            con = db()
-            cur = con.cursor()
-            cur.execute("UPDATE users SET is_online=0 WHERE username=?", (self.current_user[0],))
-            con.commit()
-            con.close()
+            with transaction() as con:
+                con.execute("UPDATE users SET is_online=0 WHERE username=?", (self.current_user[0],))
 
         for w in self.container.winfo_children():
             w.destroy()
@@ -578,21 +1442,32 @@ class InventoryApp(tk.Tk):
         self.login_frame.pack(fill="both", expand=True)
 
     def on_close(self):
+        if self.closing:
+            return  # already waiting for invoices to finish
+        self.closing = True
         try:
             if self.current_user:
-                con = db()
-                cur = con.cursor()
-                cur.execute("UPDATE users SET is_online=0 WHERE username=?", (self.current_user[0],))
-                con.commit()
-                con.close()
+                with transaction() as con:
+                    con.execute("UPDATE users SET is_online=0 WHERE username=?", (self.current_user[0],))
         except:
             pass
+        self._close_when_idle()
+
+    def _close_when_idle(self):
+        n = self.invoices.pending
+        if n:
+            # let queued invoices finish writing; the mainloop keeps running meanwhile
+            self.invoices.status.set(f"Closing after {n} invoice(s)…")
+            self.after(100, self._close_when_idle)
+            return
+        self.search_worker.shutdown(wait=False)
+        self.query_worker.shutdown(wait=False)
+        self.invoices.shutdown(wait=False)
+        POOL.close_all()
         self.destroy()
 
 
 
-from PIL import Image, ImageTk   # <-- for loading logo images
-
 class LoginFrame(tk.Frame):
     def __init__(self, parent, app: InventoryApp):
         super().__init__(parent, bg=THEME["bg"])
@@ -605,9 +1480,7 @@ class LoginFrame(tk.Frame):
 
         # Left column → logo2.png
         try:
-            logo2_img = Image.open("logo2.png")  # keep logo2.png in same folder
-            logo2_img = logo2_img.resize((550, 650))  # adjust size if needed
-            self.logo2 = ImageTk.PhotoImage(logo2_img)
+            self.logo2 = app.images.photo(os.path.join(APP_DIR, "logo2.png"), (550, 650))
             tk.Label(main_frame, image=self.logo2, bg=THEME["bg"]).grid(
                 row=0, column=0, padx=(0, 40), pady=10, sticky="n"
             )
@@ -620,9 +1493,7 @@ class LoginFrame(tk.Frame):
 
         # --- Logo above title ---
         try:
-            logo_img = Image.open("logo.png")
-            logo_img = logo_img.resize((180, 180))
-            self.logo = ImageTk.PhotoImage(logo_img)
+            self.logo = app.images.photo(os.path.join(APP_DIR, "logo.png"), (180, 180))
             tk.Label(wrapper, image=self.logo, bg=THEME["bg"]).grid(row=0, column=0, columnspan=2, pady=(0, 10))
         except Exception as e:
             print("Logo not found:", e)
@@ -681,7 +1552,6 @@ class LoginFrame(tk.Frame):
         cur = con.cursor()
         cur.execute("SELECT username FROM users ORDER BY username")
         users = [r[0] for r in cur.fetchall()]
-        con.close()
         self.username_cmb["values"] = users
         if users:
             self.username_cmb.current(0)
@@ -699,24 +1569,76 @@ class LoginFrame(tk.Frame):
         row = cur.fetchone()
         if not row or row["password"] != password:
             messagebox.showerror("Login", "Invalid credentials.")
-            con.close()
             return
 
         # mark online + last_login
-        cur.execute("UPDATE users SET is_online=1, last_login=? WHERE username=?", (now_str(), username))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            con.execute("UPDATE users SET is_online=1, last_login=? WHERE username=?", (now_str(), username))
 
         self.app.current_user = (row["username"], row["role"])
         self.app.show_dashboard()
 
 # ---------- Dashboard & Sections ----------
+
+def daily_sales_series(days: int = 14) -> Tuple[List[str], List[float]]:
+    """(dates, revenue) for the last `days` days, oldest first, 0.0 on days without sales."""
+    today = dt.date.today()
+    dates = [(today - dt.timedelta(days=days - 1 - i)).isoformat() for i in range(days)]
+    by_date = dict(db().execute("SELECT date, SUM(revenue) FROM sales_daily WHERE date >= ? AND date <= ? "
+                                "GROUP BY date", (dates[0], dates[-1])).fetchall())
+    return dates, [by_date.get(d) or 0.0 for d in dates]
+
+
+class SalesSparkline:
+    """
+    Last-14-days revenue line on Dashboard Home. One FigureCanvasTkAgg lives
+    for the whole session (child of the Dashboard's main area, re-packed on
+    each Home visit). The series is re-read only after a database write or a
+    date change, and the canvas is redrawn only when the day totals differ.
+    """
+    DAYS = 14
+
+    def __init__(self, master):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.fig = Figure(figsize=(7, 1.8), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, master)
+        self.widget = self.canvas.get_tk_widget()
+        self._token = None
+        self._series = None
+
+    def refresh(self):
+        token = (db_change_token(), today_str())
+        if token == self._token:
+            return
+        self._token = token
+        series = daily_sales_series(self.DAYS)
+        if series == self._series:
+            return
+        self._series = series
+        dates, totals = series
+        ax = self.ax
+        ax.clear()
+        ax.plot(range(len(dates)), totals, marker="o", markersize=3, linewidth=1.5, color=THEME["primary"])
+        ax.fill_between(range(len(dates)), totals, alpha=0.15, color=THEME["primary"])
+        ax.set_xticks([0, len(dates) - 1], [dates[0][5:], dates[-1][5:]])
+        ax.tick_params(labelsize=8)
+        ax.set_title(f"Sales – Last {self.DAYS} Days  (today ₹{totals[-1]:,.2f})", fontsize=9)
+        for side in ("top", "right"):
+            ax.spines[side].set_visible(False)
+        self.fig.tight_layout()
+        self.canvas.draw_idle()
+
+
 class Dashboard(tk.Frame):
     def __init__(self, parent, app: InventoryApp):
             super().__init__(parent, bg=THEME["bg"])
 
             self.app = app
             self.current_section_frame: Optional[tk.Frame] = None
+            self.sparkline: Optional[SalesSparkline] = None  # created on the first Home visit
 
             # Header
             header = tk.Frame(self, bg=THEME["dark"], height=60)
@@ -729,6 +1651,8 @@ class Dashboard(tk.Frame):
 
             user_txt = f"{self.app.current_user[0]} ({self.app.current_user[1]})"
             tk.Label(header, text=user_txt, font=FONT_LG, fg="white", bg=THEME["dark"]).pack(side="right", padx=16)
+            tk.Label(header, textvariable=self.app.invoices.status, font=FONT_MD, fg="white",
+                     bg=THEME["dark"]).pack(side="right", padx=16)
 
             logout_btn = tk.Button(header, text="Logout", font=FONT_MD, bg=THEME["danger"], fg="white",
                                    command=self.app.logout, cursor="hand2")
@@ -765,6 +1689,8 @@ class Dashboard(tk.Frame):
             self.after(1000, self.update_header_clock)
 
     def clear_main(self):
+            if self.sparkline is not None:
+                self.sparkline.widget.pack_forget()
             if self.current_section_frame:
                 self.current_section_frame.destroy()
             self.current_section_frame = tk.Frame(self.main, bg=THEME["bg"])
@@ -787,34 +1713,17 @@ class Dashboard(tk.Frame):
             tk.Label(card, text=value, font=("Segoe UI", 22, "bold"), fg="white", bg=bgc).pack(anchor="w", padx=12,
                                                                                                pady=(0, 12))
 
-        con = db()
-        cur = con.cursor()
-        cur.execute("SELECT COUNT(*) FROM employees");
-        total_emps = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM products");
-        total_products = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM suppliers");
-        total_suppliers = cur.fetchone()[0]
-        cur.execute("SELECT IFNULL(SUM(quantity*mrp),0) FROM products");
-        total_inventory_price = cur.fetchone()[0] or 0.0
-
-        # Today's sales
-        cur.execute("SELECT IFNULL(SUM(effective_total),0) FROM sales WHERE date=?", (today_str(),))
-        todays_sales = cur.fetchone()[0] or 0.0
-
-        # Low stock
-        cur.execute("SELECT COUNT(*) FROM products WHERE quantity < reorder_level")
-        low_stock_count = cur.fetchone()[0]
-        con.close()
-
-        kpi("Total Employees", total_emps, "#2196F3")  # blue
-        kpi("Total Products", total_products, "#E53935")  # red
-        kpi("Total Suppliers", total_suppliers, "#43A047")  # green
-        kpi("Today’s Sales", f"₹{todays_sales:.2f}", "#FBC02D")  # yellow
-        kpi("Low Stock Count", low_stock_count, THEME["accent"])
+        is_admin = self.app.current_user[1] == "Admin"
+        kpis = home_kpis(with_users=is_admin)
+
+        kpi("Total Employees", kpis["employees"], "#2196F3")  # blue
+        kpi("Total Products", kpis["products"], "#E53935")  # red
+        kpi("Total Suppliers", kpis["suppliers"], "#43A047")  # green
+        kpi("Today’s Sales", f"₹{kpis['todays_sales']:.2f}", "#FBC02D")  # yellow
+        kpi("Low Stock Count", kpis["low_stock"], THEME["accent"])
 
         # Admin can see online status
-        if self.app.current_user[1] == "Admin":
+        if is_admin:
             online_frame = tk.LabelFrame(f, text="Online Status (Admin)", bg=THEME["bg"], font=FONT_LG,
                                          fg=THEME["dark"])
             online_frame.pack(fill="x", padx=16, pady=8)
@@ -824,52 +1733,8 @@ class Dashboard(tk.Frame):
                 tv.heading(c, text=c.title())
                 tv.column(c, width=160)
             tv.pack(fill="x", padx=8, pady=8)
-            con = db()
-            cur = con.cursor()
-            cur.execute(
-                "SELECT username, role, is_online, IFNULL(last_login,'') last_login FROM users ORDER BY role DESC, username")
-            for r in cur.fetchall():
-                tv.insert("", "end",
-                          values=(r["username"], r["role"], "Online" if r["is_online"] else "Offline", r["last_login"]))
-            con.close()
-
-        # Sales Graph (daily last 14 days)
-        def show_graph():
-            con = db()
-            cur = con.cursor()
-            cur.execute("""
-                        SELECT date, IFNULL(SUM (effective_total), 0) AS total
-                        FROM sales
-                        WHERE date >= ?
-                        GROUP BY date
-                        ORDER BY date
-                        """, ((dt.date.today() - dt.timedelta(days=13)).isoformat(),))
-            data = cur.fetchall()
-            con.close()
-            dates = []
-            totals = []
-            # ensure all dates present
-            for i in range(14):
-                d = (dt.date.today() - dt.timedelta(days=13 - i)).isoformat()
-                dates.append(d)
-                total = 0.0
-                for r in data:
-                    if r["date"] == d:
-                        total = r["total"]
-                        break
-                totals.append(total)
-            plt.figure()
-            plt.plot(dates, totals, marker="o")
-            plt.title("Sales – Last 14 Days")
-            plt.xlabel("Date");
-            plt.ylabel("Revenue")
-            plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            plt.show()
-
-        btn = tk.Button(f, text="Show Sales Graph", font=FONT_LG, bg=THEME["primary"], fg="white",
-                        cursor="hand2", command=show_graph)
-        btn.pack(pady=8)
+            for username, role, is_online, last_login in kpis["users"]:
+                tv.insert("", "end", values=(username, role, "Online" if is_online else "Offline", last_login))
 
         # 🔔 NEW ALERTS BUTTON
         alerts_btn = tk.Button(f, text="Alerts (Low Stock)", font=FONT_LG,
@@ -877,6 +1742,12 @@ class Dashboard(tk.Frame):
                                cursor="hand2", command=self.show_alerts)
         alerts_btn.pack(pady=8)
 
+        # Sales sparkline (daily last 14 days), kept between visits
+        if self.sparkline is None:
+            self.sparkline = SalesSparkline(self.main)
+        self.sparkline.widget.pack(in_=self.main, fill="x", padx=16, pady=8)
+        self.sparkline.refresh()
+
     def show_alerts(self):
         win = tk.Toplevel(self)
         win.title("Low Stock Alerts")
@@ -898,8 +1769,7 @@ class Dashboard(tk.Frame):
         cur.execute("""SELECT name, quantity, reorder_level
                        FROM products
                        WHERE quantity < reorder_level""")
-        rows = cur.fetchall();
-        con.close()
+        rows = cur.fetchall()
 
         for r in rows:
             tv.insert("", "end", values=(r["name"], r["quantity"], r["reorder_level"]))
@@ -955,6 +1825,201 @@ def insert_rows_striped(tv: ttk.Treeview, rows: List[Tuple[Any, ...]]):
         tv.insert("", "end", values=row, tags=("even" if i % 2 == 0 else "odd",))
 
 
+EXPORT_CHUNK_ROWS = 1000  # rows per fetchmany() when a whole result is streamed (exports)
+
+
+class QuerySource:
+    """
+    Keyset-paged SELECT for VirtualTable. `sql` has no ORDER BY; `key` names
+    output columns that are unique together and define the order (descending
+    when desc=True). Pages are fetched as
+        SELECT * FROM (sql) WHERE (key) > (last key) ORDER BY key LIMIT n
+    so page N costs the same as page 1. `fmt` turns a Row into display values.
+    """
+
+    def __init__(self, sql: str, params: tuple = (), key: Tuple[str, ...] = ("rowid",),
+                 desc: bool = False, fmt=tuple):
+        self.sql, self.params, self.key, self.desc, self.fmt = sql, tuple(params), tuple(key), desc, fmt
+        cols = ", ".join(f'"{k}"' for k in self.key)
+        self._cols = f"({cols})"
+        self._order = lambda d: ", ".join(f'"{k}" {"DESC" if d else "ASC"}' for k in self.key)
+
+    def _fetch(self, where: str, params: tuple, desc: bool, limit: Optional[int]):
+        q = f"SELECT * FROM ({self.sql}) {where} ORDER BY {self._order(desc)}"
+        if limit is not None:
+            q += " LIMIT ?"
+            params = params + (limit,)
+        cur = db().execute(q, self.params + params)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            for r in rows:
+                yield tuple(r[k] for k in self.key), self.fmt(r)
+
+    def first(self, n: int):
+        return list(self._fetch("", (), self.desc, n))
+
+    def _seek(self, key: tuple, op: str) -> Tuple[str, tuple]:
+        # the extra bound on the leading column lets SQLite range-scan its index
+        marks = ", ".join("?" * len(key))
+        return (f'WHERE "{self.key[0]}" {op}= ? AND {self._cols} {op} ({marks})',
+                (key[0],) + tuple(key))
+
+    def after(self, key: tuple, n: int):
+        where, params = self._seek(key, "<" if self.desc else ">")
+        return list(self._fetch(where, params, self.desc, n))
+
+    def before(self, key: tuple, n: int):
+        where, params = self._seek(key, ">" if self.desc else "<")
+        rows = list(self._fetch(where, params, not self.desc, n))
+        rows.reverse()
+        return rows
+
+    def iter_all(self):
+        return (values for _key, values in self._fetch("", (), self.desc, None))
+
+
+class ListSource:
+    """Rows already in memory (e.g. computed report lines); key is the list index."""
+
+    def __init__(self, rows: List[Tuple[Any, ...]]):
+        self.rows = rows
+
+    def first(self, n: int):
+        return [((i,), r) for i, r in enumerate(self.rows[:n])]
+
+    def after(self, key: tuple, n: int):
+        i = key[0] + 1
+        return [((j,), r) for j, r in enumerate(self.rows[i:i + n], start=i)]
+
+    def before(self, key: tuple, n: int):
+        i = max(0, key[0] - n)
+        return [((j,), r) for j, r in enumerate(self.rows[i:key[0]], start=i)]
+
+    def iter_all(self):
+        return iter(self.rows)
+
+
+class VirtualTable:
+    """
+    Keeps only a window of rows (max_pages * page_size) in a Treeview and
+    pages more in from the source as the user scrolls near either edge, so
+    filling the view costs one page no matter how many rows match.
+    The Treeview keeps its own columns/headings/stripes; rows() streams the
+    whole result for exports (see table_rows).
+    """
+
+    def __init__(self, tree: ttk.Treeview, page_size: int = 200, max_pages: int = 3,
+                 scrollbar: Optional[ttk.Scrollbar] = None):
+        self.tree = tree
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.scrollbar = scrollbar
+        self.source = None
+        self._items: deque = deque()  # (iid, key), same order as the tree
+        self._top_seq = 0             # absolute row number of the first loaded row (for stripes)
+        self.at_start = self.at_end = True
+        self._loading = False
+        tree.virtual = self
+        tree.configure(yscrollcommand=self._on_scroll)
+        if scrollbar is not None:
+            scrollbar.configure(command=tree.yview)
+
+    def set_query(self, sql: str, params: tuple = (), key: Tuple[str, ...] = ("rowid",),
+                  desc: bool = False, fmt=tuple):
+        self.set_source(QuerySource(sql, params, key, desc, fmt))
+
+    def set_rows(self, rows: List[Tuple[Any, ...]]):
+        self.set_source(ListSource(rows))
+
+    def load_source(self, source, loader: "QueryLoader"):
+        """set_source() with the first page fetched through `loader`, off the Tk thread."""
+        loader.load(source.first, lambda page: self.set_source(source, page), self.page_size)
+
+    def set_source(self, source, first_page: Optional[list] = None):
+        """Show `source` from the top; first_page may be fetched beforehand (e.g. on a worker)."""
+        self.source = source
+        self.tree.delete(*self.tree.get_children())
+        self._items.clear()
+        self._top_seq = 0
+        rows = first_page if first_page is not None else source.first(self.page_size)
+        self.at_start, self.at_end = True, len(rows) < self.page_size
+        self._insert(rows, at_top=False)
+        self.tree.yview_moveto(0)
+
+    def rows(self):
+        return self.source.iter_all() if self.source is not None else iter(())
+
+    def _tag(self, seq: int) -> tuple:
+        return ("even" if seq % 2 == 0 else "odd",)
+
+    def _insert(self, rows, at_top: bool):
+        if at_top:
+            for key, values in reversed(rows):
+                self._top_seq -= 1
+                iid = self.tree.insert("", 0, values=values, tags=self._tag(self._top_seq))
+                self._items.appendleft((iid, key))
+        else:
+            seq = self._top_seq + len(self._items)
+            for key, values in rows:
+                iid = self.tree.insert("", "end", values=values, tags=self._tag(seq))
+                self._items.append((iid, key))
+                seq += 1
+
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if self._loading or self.source is None:
+            return
+        first, last = float(first), float(last)
+        if last >= 0.9 and not self.at_end:
+            self._loading = True
+            self.tree.after_idle(self._load_next)
+        elif first <= 0.1 and not self.at_start:
+            self._loading = True
+            self.tree.after_idle(self._load_prev)
+
+    def _load_next(self):
+        try:
+            rows = self.source.after(self._items[-1][1], self.page_size)
+            self.at_end = len(rows) < self.page_size
+            self._insert(rows, at_top=False)
+            drop = len(self._items) - self.max_rows
+            if drop > 0:
+                self.tree.delete(*[self._items.popleft()[0] for _ in range(drop)])
+                self._top_seq += drop
+                self.at_start = False
+                self.tree.yview_scroll(-drop, "units")  # keep the same rows on screen
+        except (tk.TclError, IndexError):
+            pass
+        finally:
+            self._loading = False
+
+    def _load_prev(self):
+        try:
+            rows = self.source.before(self._items[0][1], self.page_size)
+            self.at_start = len(rows) < self.page_size
+            self._insert(rows, at_top=True)
+            self.tree.yview_scroll(len(rows), "units")
+            drop = len(self._items) - self.max_rows
+            if drop > 0:
+                self.tree.delete(*[self._items.pop()[0] for _ in range(drop)])
+                self.at_end = False
+        except (tk.TclError, IndexError):
+            pass
+        finally:
+            self._loading = False
+
+
+def table_rows(tree: ttk.Treeview):
+    """Every row of a table for exports, including rows a VirtualTable has not loaded."""
+    vt = getattr(tree, "virtual", None)
+    if vt is not None:
+        return vt.rows()
+    return (tree.item(child, "values") for child in tree.get_children())
+
+
 # ---------- Employees ----------
 
 class SectionEmployees(tk.Frame):
@@ -1017,27 +2082,27 @@ class SectionEmployees(tk.Frame):
         tk.Button(form, text="Create/Sync User Login", font=FONT_MD, bg=THEME["accent"],
                   command=self.create_user_for_employee).grid(row=3, column=4, pady=8)
 
+        self.live = LiveSearch(self, self.q, self.search_rows, lambda rows: insert_rows_striped(self.tv, rows))
         self.refresh()
 
     def auto_id(self):
         self.emp_id.set(padded_id("employees", "emp_id"))
 
     def refresh(self):
-        q = f"%{self.q.get().strip()}%"
+        self.live.refresh()
+
+    @staticmethod
+    def search_rows(text: str) -> List[tuple]:
+        where, params = search_filter("employees", text)
         con = db()
         cur = con.cursor()
-        cur.execute("""
+        cur.execute(f"""
                     SELECT emp_id, name, phone, email, role, join_date
                     FROM employees
-                    WHERE emp_id LIKE ?
-                       OR name LIKE ?
-                       OR phone LIKE ?
-                       OR email LIKE ?
+                    WHERE {where}
                     ORDER BY CAST(emp_id AS INTEGER)
-                    """, (q, q, q, q))
-        rows = [(r["emp_id"], r["name"], r["phone"], r["email"], r["role"], r["join_date"]) for r in cur.fetchall()]
-        con.close()
-        insert_rows_striped(self.tv, rows)
+                    """, params)
+        return [(r["emp_id"], r["name"], r["phone"], r["email"], r["role"], r["join_date"]) for r in cur.fetchall()]
 
     def save(self):
         emp_id = self.emp_id.get().strip()
@@ -1072,25 +2137,22 @@ class SectionEmployees(tk.Frame):
             messagebox.showerror("Validation", "Role must be Admin or Employee.")
             return
 
-        con = db()
-        cur = con.cursor()
-        # upsert
-        try:
-            cur.execute("INSERT INTO employees(emp_id,name,phone,email,role,join_date) VALUES(?,?,?,?,?,?)",
-                        (emp_id, name, phone, email, role, jdate))
-            con.commit()
-        except sqlite3.IntegrityError:
-            # update existing
-            cur.execute("""UPDATE employees
-                           SET name=?,
-                               phone=?,
-                               email=?,
-                               role=?,
-                               join_date=?
-                           WHERE emp_id = ?""",
-                        (name, phone, email, role, jdate, emp_id))
-            con.commit()
-        con.close()
+        with transaction() as con:
+            cur = con.cursor()
+            # upsert
+            try:
+                cur.execute("INSERT INTO employees(emp_id,name,phone,email,role,join_date) VALUES(?,?,?,?,?,?)",
+                            (emp_id, name, phone, email, role, jdate))
+            except sqlite3.IntegrityError:
+                # update existing
+                cur.execute("""UPDATE employees
+                               SET name=?,
+                                   phone=?,
+                                   email=?,
+                                   role=?,
+                                   join_date=?
+                               WHERE emp_id = ?""",
+                            (name, phone, email, role, jdate, emp_id))
         messagebox.showinfo("Saved", "Employee saved.")
         self.refresh()
 
@@ -1102,11 +2164,8 @@ class SectionEmployees(tk.Frame):
         emp_id = self.tv.item(sel[0], "values")[0]
         if not messagebox.askyesno("Confirm", f"Delete employee {emp_id}?"):
             return
-        con = db()
-        cur = con.cursor()
-        cur.execute("DELETE FROM employees WHERE emp_id=?", (emp_id,))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            con.execute("DELETE FROM employees WHERE emp_id=?", (emp_id,))
         self.refresh()
 
     def load_selected(self):
@@ -1130,15 +2189,13 @@ class SectionEmployees(tk.Frame):
             return
         username = re.sub(r"\s+", "", name).lower()
         password = employee_default_password(name)
-        con = db()
-        cur = con.cursor()
-        try:
-            cur.execute("INSERT INTO users(username,password,role,is_online,last_login) VALUES(?,?,?,?,?)",
-                        (username, password, role, 0, None))
-        except sqlite3.IntegrityError:
-            cur.execute("UPDATE users SET password=?, role=? WHERE username=?", (password, role, username))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            cur = con.cursor()
+            try:
+                cur.execute("INSERT INTO users(username,password,role,is_online,last_login) VALUES(?,?,?,?,?)",
+                            (username, password, role, 0, None))
+            except sqlite3.IntegrityError:
+                cur.execute("UPDATE users SET password=?, role=? WHERE username=?", (password, role, username))
         messagebox.showinfo("User", f"User created/updated.\nUsername: {username}\nPassword: {password}")
 
 
@@ -1198,27 +2255,28 @@ class SectionSuppliers(tk.Frame):
                                                                                                                pady=8)
         tk.Button(form, text="Load Selected", font=FONT_MD, command=self.load_selected).grid(row=3, column=3, pady=8)
 
+        self.live = LiveSearch(self, self.q, self.search_rows, lambda rows: insert_rows_striped(self.tv, rows))
         self.refresh()
 
     def auto_id(self):
         self.supplier_id.set(padded_id("suppliers", "supplier_id"))
 
     def refresh(self):
-        q = f"%{self.q.get().strip()}%"
+        self.live.refresh()
+
+    @staticmethod
+    def search_rows(text: str) -> List[tuple]:
+        where, params = search_filter("suppliers", text)
         con = db()
         cur = con.cursor()
-        cur.execute("""
+        cur.execute(f"""
                     SELECT supplier_id, name, company, phone, email, address
                     FROM suppliers
-                    WHERE name LIKE ?
-                       OR phone LIKE ?
-                       OR company LIKE ?
+                    WHERE {where}
                     ORDER BY CAST(supplier_id AS INTEGER)
-                    """, (q, q, q))
-        rows = [(r["supplier_id"], r["name"], r["company"], r["phone"], r["email"], r["address"]) for r in
+                    """, params)
+        return [(r["supplier_id"], r["name"], r["company"], r["phone"], r["email"], r["address"]) for r in
                 cur.fetchall()]
-        con.close()
-        insert_rows_striped(self.tv, rows)
 
     def save(self):
         sid = self.supplier_id.get().strip()
@@ -1232,23 +2290,20 @@ class SectionSuppliers(tk.Frame):
         if not validate_phone(phone): messagebox.showerror("Validation", "Phone invalid/duplicate."); return
         if not validate_email(email): messagebox.showerror("Validation",
                                                            "Email must be @gmail.com or @yahoo.com."); return
-        con = db()
-        cur = con.cursor()
-        try:
-            cur.execute("INSERT INTO suppliers(supplier_id,name,company,phone,email,address) VALUES(?,?,?,?,?,?)",
-                        (sid, name, company, phone, email, address))
-            con.commit()
-        except sqlite3.IntegrityError:
-            cur.execute("""UPDATE suppliers
-                           SET name=?,
-                               company=?,
-                               phone=?,
-                               email=?,
-                               address=?
-                           WHERE supplier_id = ?""",
-                        (name, company, phone, email, address, sid))
-            con.commit()
-        con.close()
+        with transaction() as con:
+            cur = con.cursor()
+            try:
+                cur.execute("INSERT INTO suppliers(supplier_id,name,company,phone,email,address) VALUES(?,?,?,?,?,?)",
+                            (sid, name, company, phone, email, address))
+            except sqlite3.IntegrityError:
+                cur.execute("""UPDATE suppliers
+                               SET name=?,
+                                   company=?,
+                                   phone=?,
+                                   email=?,
+                                   address=?
+                               WHERE supplier_id = ?""",
+                            (name, company, phone, email, address, sid))
         messagebox.showinfo("Saved", "Supplier saved.")
         self.refresh()
 
@@ -1260,11 +2315,8 @@ class SectionSuppliers(tk.Frame):
         sid = self.tv.item(sel[0], "values")[0]
         if not messagebox.askyesno("Confirm", f"Delete supplier {sid}?"):
             return
-        con = db()
-        cur = con.cursor()
-        cur.execute("DELETE FROM suppliers WHERE supplier_id=?", (sid,))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            con.execute("DELETE FROM suppliers WHERE supplier_id=?", (sid,))
         self.refresh()
 
     def load_selected(self):
@@ -1320,6 +2372,7 @@ class SectionProducts(tk.Frame):
             self.tv.column(c, width=w, anchor="center")
         self.tv.pack(fill="both", expand=True, padx=12, pady=8)
         setup_treeview_striped(self.tv)
+        self.table = VirtualTable(self.tv)
 
         # ================= FORM =================
         form = tk.LabelFrame(self, text="Add / Edit Product",
@@ -1397,19 +2450,17 @@ class SectionProducts(tk.Frame):
 
         # --- Load initial data ---
         self.load_suppliers()
+        self.live = LiveSearch(self, self.q, self.search_page, lambda page: self.table.set_source(*page))
+        self.total_loader = QueryLoader(self.total_lbl)
         self.refresh()
 
 
     # ================= DB MIGRATION =================
     def ensure_gst_column(self):
-        con = db()
-        cur = con.cursor()
-        cur.execute("PRAGMA table_info(products)")
-        cols = [row[1] for row in cur.fetchall()]
-        if "gst" not in cols:
-            cur.execute("ALTER TABLE products ADD COLUMN gst REAL DEFAULT 18")
-            con.commit()
-        con.close()
+        with transaction() as con:
+            cols = [row[1] for row in con.execute("PRAGMA table_info(products)")]
+            if "gst" not in cols:
+                con.execute("ALTER TABLE products ADD COLUMN gst REAL DEFAULT 18")
 
     # ================= SUPPLIERS =================
     def load_suppliers(self):
@@ -1417,7 +2468,6 @@ class SectionProducts(tk.Frame):
         cur = con.cursor()
         cur.execute("SELECT supplier_id, company FROM suppliers ORDER BY company")
         self.suppliers = cur.fetchall()
-        con.close()
         self.supplier_cmb["values"] = [f"{r['supplier_id']} - {r['company']}" for r in self.suppliers]
 
     def auto_id(self):
@@ -1425,11 +2475,21 @@ class SectionProducts(tk.Frame):
 
     # ================= REFRESH =================
     def refresh(self):
-        q = f"%{self.q.get().strip()}%"
-        con = db()
-        cur = con.cursor()
-        cur.execute("""
-                    SELECT p.product_id,
+        self.live.refresh()
+        self.total_loader.load(
+            lambda: db().execute("SELECT IFNULL(SUM(quantity*unit_price),0) FROM products").fetchone()[0] or 0.0,
+            lambda total_val: self.total_lbl.config(text=f"Total Inventory Price: ₹{total_val:.2f}"))
+
+    @staticmethod
+    def search_source(text: str) -> QuerySource:
+        q = text.strip()
+        # supplier company still matches; suppliers is small, LIKE is fine
+        by_company = ("SELECT rowid FROM products WHERE supplier_id IN "
+                      "(SELECT supplier_id FROM suppliers WHERE company LIKE ?)", (f"%{q}%",))
+        where, params = search_filter("products", q, "p", also=by_company)
+        return QuerySource(f"""
+                    SELECT CAST(p.product_id AS INTEGER) AS sort_id,
+                           p.product_id,
                            p.name,
                            p.category,
                            p.supplier_id,
@@ -1442,19 +2502,15 @@ class SectionProducts(tk.Frame):
                            CASE WHEN p.quantity < p.reorder_level THEN 'YES' ELSE 'NO' END AS low_stock
                     FROM products p
                              JOIN suppliers s ON s.supplier_id = p.supplier_id
-                    WHERE p.name LIKE ?
-                       OR p.category LIKE ?
-                       OR s.company LIKE ?
-                    ORDER BY CAST(p.product_id AS INTEGER)
-                    """, (q, q, q))
-        rows = [(r["product_id"], r["name"], r["category"], r["supplier_id"], r["company"],
-                 r["quantity"], f"{r['unit_price']:.2f}", f"{r['gst']:.0f}%", f"{r['mrp']:.2f}",
-                 r["reorder_level"], r["low_stock"]) for r in cur.fetchall()]
-        cur.execute("SELECT IFNULL(SUM(quantity*unit_price),0) FROM products")
-        total_val = cur.fetchone()[0] or 0.0
-        con.close()
-        insert_rows_striped(self.tv, rows)
-        self.total_lbl.config(text=f"Total Inventory Price: ₹{total_val:.2f}")
+                    WHERE {where}
+                    """, params, key=("sort_id", "product_id"),
+            fmt=lambda r: (r["product_id"], r["name"], r["category"], r["supplier_id"], r["company"],
+                           r["quantity"], f"{r['unit_price']:.2f}", f"{r['gst']:.0f}%", f"{r['mrp']:.2f}",
+                           r["reorder_level"], r["low_stock"]))
+
+    def search_page(self, text: str):
+        src = self.search_source(text)
+        return src, src.first(self.table.page_size)
 
     # ================= SAVE =================
     def save(self):
@@ -1493,28 +2549,25 @@ class SectionProducts(tk.Frame):
             messagebox.showerror("Validation", "Negative values not allowed.")
             return
 
-        con = db()
-        cur = con.cursor()
-        try:
-            cur.execute("""INSERT INTO products(product_id, name, category, supplier_id,
-                                                quantity, unit_price, gst, mrp, reorder_level)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (pid, name, cat, supplier_id, qty, unit_price, gst, mrp, rl))
-            con.commit()
-        except sqlite3.IntegrityError:
-            cur.execute("""UPDATE products
-                           SET name=?,
-                               category=?,
-                               supplier_id=?,
-                               quantity=?,
-                               unit_price=?,
-                               gst=?,
-                               mrp=?,
-                               reorder_level=?
-                           WHERE product_id = ?""",
-                        (name, cat, supplier_id, qty, unit_price, gst, mrp, rl, pid))
-            con.commit()
-        con.close()
+        with transaction() as con:
+            cur = con.cursor()
+            try:
+                cur.execute("""INSERT INTO products(product_id, name, category, supplier_id,
+                                                    quantity, unit_price, gst, mrp, reorder_level)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                            (pid, name, cat, supplier_id, qty, unit_price, gst, mrp, rl))
+            except sqlite3.IntegrityError:
+                cur.execute("""UPDATE products
+                               SET name=?,
+                                   category=?,
+                                   supplier_id=?,
+                                   quantity=?,
+                                   unit_price=?,
+                                   gst=?,
+                                   mrp=?,
+                                   reorder_level=?
+                               WHERE product_id = ?""",
+                            (name, cat, supplier_id, qty, unit_price, gst, mrp, rl, pid))
         messagebox.showinfo("Saved", "Product saved.")
         self.refresh()
 
@@ -1527,11 +2580,8 @@ class SectionProducts(tk.Frame):
         pid = self.tv.item(sel[0], "values")[0]
         if not messagebox.askyesno("Confirm", f"Delete product {pid}?"):
             return
-        con = db()
-        cur = con.cursor()
-        cur.execute("DELETE FROM products WHERE product_id=?", (pid,))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            con.execute("DELETE FROM products WHERE product_id=?", (pid,))
         self.refresh()
 
     # ================= LOAD SELECTED =================
@@ -1560,8 +2610,8 @@ class SectionProducts(tk.Frame):
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.append([self.tv.heading(c)["text"] for c in self.tv["columns"]])
-        for row_id in self.tv.get_children():
-            row = list(self.tv.item(row_id)["values"])
+        for values in table_rows(self.tv):
+            row = list(values)
             gst_index = list(self.tv["columns"]).index("gst")
             row[gst_index] = row[gst_index].replace("%", "")
             ws.append(row)
@@ -1579,8 +2629,8 @@ class SectionProducts(tk.Frame):
         style = getSampleStyleSheet()
 
         data = [[self.tv.heading(c)["text"] for c in self.tv["columns"]]]
-        for row_id in self.tv.get_children():
-            row = list(self.tv.item(row_id)["values"])
+        for values in table_rows(self.tv):
+            row = list(values)
             gst_index = list(self.tv["columns"]).index("gst")
             row[gst_index] = row[gst_index].replace("%", "")
             data.append(row)
@@ -1632,6 +2682,7 @@ class SectionCustomers(tk.Frame):
             self.tv.column(c, width=w, anchor="center")
         self.tv.pack(fill="both", expand=True, padx=12, pady=8)
         setup_treeview_striped(self.tv)
+        self.table = VirtualTable(self.tv)
 
         # ---------------- Form ----------------
         form = tk.LabelFrame(self, text="Add / Edit Customer", bg=THEME["bg"],
@@ -1663,6 +2714,7 @@ class SectionCustomers(tk.Frame):
         tk.Button(form, text="Load Selected", font=FONT_MD,
                   command=self.load_selected).grid(row=3, column=3, pady=8)
 
+        self.live = LiveSearch(self, self.q, self.search_page, lambda page: self.table.set_source(*page))
         self.refresh()
 
     # ---------------- BASIC FUNCTIONS ----------------
@@ -1670,19 +2722,21 @@ class SectionCustomers(tk.Frame):
         self.customer_id.set(padded_id("customers", "customer_id"))
 
     def refresh(self):
-        q = f"%{self.q.get().strip()}%"
-        con = db()
-        cur = con.cursor()
-        cur.execute("""
-                    SELECT customer_id, name, phone, email
+        self.live.refresh()
+
+    @staticmethod
+    def search_source(text: str) -> QuerySource:
+        where, params = search_filter("customers", text)
+        return QuerySource(f"""
+                    SELECT CAST(customer_id AS INTEGER) AS sort_id, customer_id, name, phone, email
                     FROM customers
-                    WHERE name LIKE ?
-                       OR phone LIKE ?
-                    ORDER BY CAST(customer_id AS INTEGER)
-                    """, (q, q))
-        rows = [(r["customer_id"], r["name"], r["phone"], r["email"]) for r in cur.fetchall()]
-        con.close()
-        insert_rows_striped(self.tv, rows)
+                    WHERE {where}
+                    """, params, key=("sort_id", "customer_id"),
+            fmt=lambda r: (r["customer_id"], r["name"], r["phone"], r["email"]))
+
+    def search_page(self, text: str):
+        src = self.search_source(text)
+        return src, src.first(self.table.page_size)
 
     def save(self):
         cid = self.customer_id.get().strip()
@@ -1708,19 +2762,16 @@ class SectionCustomers(tk.Frame):
             return
 
         # ---------------- Insert / Update ----------------
-        con = db()
-        cur = con.cursor()
-        try:
-            cur.execute("INSERT INTO customers(customer_id,name,phone,email) VALUES(?,?,?,?)",
-                        (cid, name, phone, email))
-            con.commit()
-        except sqlite3.IntegrityError:
-            cur.execute("""UPDATE customers
-                           SET name=?, phone=?, email=?
-                           WHERE customer_id = ?""",
-                        (name, phone, email, cid))
-            con.commit()
-        con.close()
+        with transaction() as con:
+            cur = con.cursor()
+            try:
+                cur.execute("INSERT INTO customers(customer_id,name,phone,email) VALUES(?,?,?,?)",
+                            (cid, name, phone, email))
+            except sqlite3.IntegrityError:
+                cur.execute("""UPDATE customers
+                               SET name=?, phone=?, email=?
+                               WHERE customer_id = ?""",
+                            (name, phone, email, cid))
         messagebox.showinfo("Saved", "Customer saved.")
         self.refresh()
 
@@ -1732,11 +2783,8 @@ class SectionCustomers(tk.Frame):
         cid = self.tv.item(sel[0], "values")[0]
         if not messagebox.askyesno("Confirm", f"Delete customer {cid}?"):
             return
-        con = db()
-        cur = con.cursor()
-        cur.execute("DELETE FROM customers WHERE customer_id=?", (cid,))
-        con.commit()
-        con.close()
+        with transaction() as con:
+            con.execute("DELETE FROM customers WHERE customer_id=?", (cid,))
         self.refresh()
 
     def load_selected(self):
@@ -1785,14 +2833,14 @@ class SectionCustomers(tk.Frame):
             cur = con.cursor()
             cur.execute("SELECT email, phone FROM customers")
             customers = cur.fetchall()
-            con.close()
 
             recipients_mail = [c["email"] for c in customers if c["email"]]
             recipients_sms = [c["phone"] for c in customers if c["phone"]]
 
             if mode in ("email", "both") and recipients_mail:
-                self.send_bulk_mail(subject or "Notification", message,
-                                    
+                self.send_bulk_mail(subject or "Notification", message, get_setting("smtp_email", ""),
+                                    get_setting("smtp_password", ""), recipients_mail)
+
             if mode in ("sms", "both") and recipients_sms:
                 self.send_bulk_sms(message, recipients_sms)
 
@@ -1800,6 +2848,14 @@ class SectionCustomers(tk.Frame):
                   font=FONT_MD, command=send_action).pack(pady=15)
 
     def send_bulk_mail(self, subject, body, sender_email, sender_password, recipients):
+        if not (sender_email and sender_password):
+            messagebox.showerror("Bulk Mail", "No sender account is set up. Add smtp_email and smtp_password "
+                                              "to the settings table (see README) and send again.")
+            return
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
         try:
             server = smtplib.SMTP("smtp.gmail.com", 587)
             server.starttls()
@@ -1813,27 +2869,456 @@ class SectionCustomers(tk.Frame):
                 msg.attach(MIMEText(body, "plain"))
                 server.sendmail(sender_email, email, msg.as_string())
 
-            server.quit()
-            messagebox.showinfo("Bulk Mail", "✅ Bulk mail sent successfully!")
+            server.quit()
+            messagebox.showinfo("Bulk Mail", "✅ Bulk mail sent successfully!")
+
+        except Exception as e:
+            messagebox.showerror("Error", f"❌ Failed to send mail:\n{e}")
+
+
+# ---------- Sales Invoice PDF ----------
+
+INVOICE_QR_MODES = ("compact", "full")
+INVOICE_QR_FULL_MAX_CHARS = 1200  # longer "full" payloads fall back to compact (QR capacity)
+INVOICE_QR_CACHE_SIZE = 256       # rendered QR drawings kept per process; 0 disables the cache
+
+
+def invoice_qr_mode() -> str:
+    """QR payload mode from settings (invoice_qr_mode), 'compact' unless set to 'full'."""
+    mode = get_setting("invoice_qr_mode", "compact")
+    return mode if mode in INVOICE_QR_MODES else "compact"
+
+
+def invoice_qr_digest(invoice_no, invoice_date, items, grand_total) -> str:
+    """First 12 hex chars of a SHA-256 over the invoice's canonical content."""
+    h = hashlib.sha256(f"{invoice_no}|{invoice_date}|{InvoiceTemplate._money(grand_total):.2f}".encode("utf-8"))
+    for n, _c, q, _m, _t, _v, f in items:
+        h.update(f"\n{n}|{q}|{InvoiceTemplate._money(f):.2f}".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def invoice_qr_payload(invoice_no, invoice_date, customer_name, customer_phone, items,
+                       subtotal, grand_total, mode: str = "compact") -> str:
+    """
+    compact: "LE1|<invoice_no>|<date>|<grand_total>|<digest>", a small fixed-size
+             QR whatever the cart size; verify_invoice_qr() checks it against the DB.
+    full:    the original human-readable dump of every line.
+    """
+    if mode == "full":
+        text = (
+            f"Invoice No: {invoice_no}\n"
+            f"Date: {invoice_date}\n"
+            f"Customer: {customer_name}\n"
+            f"Phone: {customer_phone}\n"
+            "\n--- Items ---\n" +
+            "\n".join([f"{n} ({c}) x{q} @₹{InvoiceTemplate._money(m):.2f} - {d_type} {d_val} = "
+                       f"₹{InvoiceTemplate._money(f):.2f}"
+                       for n, c, q, m, d_type, d_val, f in items]) +
+            f"\n\nSubtotal: ₹{subtotal:.2f}\nGrand Total: ₹{grand_total:.2f}"
+        )
+        if len(text) <= INVOICE_QR_FULL_MAX_CHARS:
+            return text
+    digest = invoice_qr_digest(invoice_no, invoice_date, items, grand_total)
+    return f"LE1|{invoice_no}|{invoice_date}|{InvoiceTemplate._money(grand_total):.2f}|{digest}"
+
+
+def verify_invoice_qr(payload: str) -> bool:
+    """True when a compact payload matches the stored invoice header and lines."""
+    parts = payload.strip().split("|")
+    if len(parts) != 5 or parts[0] != "LE1":
+        return False
+    header, lines = fetch_invoice(parts[1])
+    if header is None:
+        return False
+    items = [(l["product_name"], l["category"], l["quantity"], l["mrp"], l["discount_type"],
+              l["discount_value"], l["effective_total"]) for l in lines]
+    expected = invoice_qr_payload(header["invoice_no"], header["date"], header["customer_name"],
+                                  header["customer_phone"], items, header["subtotal"] or 0.0,
+                                  header["grand_total"], "compact")
+    return payload.strip() == expected
+
+
+@lru_cache(maxsize=INVOICE_QR_CACHE_SIZE)
+def invoice_qr_drawing(payload: str, size: int = 120) -> "Drawing":
+    """
+    Encoded QR as a Drawing, cached by payload so reprints skip encoding.
+    Drawings are only read when a page is rendered, so sharing them is safe.
+    """
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.graphics.barcode import qr
+
+    # draw() the widget once and keep the shapes; adding the widget itself would
+    # encode the QR again for getBounds() and again when the page is rendered
+    qr_shapes = qr.QrCodeWidget(payload).draw()
+    bounds = qr_shapes.getBounds()
+    w, h = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    d = Drawing(size, size, transform=[size / w, 0, 0, size / h, 0, 0])
+    d.add(qr_shapes)
+    return d
+
+
+class InvoiceTemplate:
+    """
+    Everything about the sales invoice that does not depend on the sale:
+    style sheet, company header flowables, table styles and column widths.
+    Build it once with InvoiceTemplate.cached() (one per thread, so worker
+    threads and reprint processes never share flowables mid-build).
+    """
+    COMPANY = "LALBAGH ENTERPRISE"
+    ADDRESS = ("77, OMRAHGANG, LALBAGH, MURSHIDABAD, WEST BENGAL "
+               "Email: lalbaghenterprise@gmail.com | Phone:78945612300")
+    COLUMNS = ["Product", "Category", "Qty", "MRP", "Discount", "Final Total (₹)"]
+    COL_WIDTHS = [150, 100, 50, 70, 100, 100]
+    TOTALS_COL_WIDTHS = [300, 200]
+    MARGINS = dict(rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=20)
+    QR_SIZE = 120
+
+    _local = threading.local()
+
+    def __init__(self):
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import TableStyle, Paragraph, Spacer
+
+        self.styles = getSampleStyleSheet()
+        self.header = [
+            Paragraph(f"<b>{self.COMPANY}</b>", self.styles["Title"]),
+            Paragraph(self.ADDRESS, self.styles["Normal"]),
+            Spacer(1, 12),
+        ]
+        self.items_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ])
+        self.totals_style = TableStyle([
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("FONTNAME", (-1, -1), (-1, -1), "Helvetica-Bold"),
+            ("TEXTCOLOR", (-1, -1), (-1, -1), colors.green),
+            ("FONTSIZE", (-1, -1), (-1, -1), 14),
+        ])
+
+    @classmethod
+    def cached(cls) -> "InvoiceTemplate":
+        tpl = getattr(cls._local, "template", None)
+        if tpl is None:
+            tpl = cls._local.template = cls()
+        return tpl
+
+    @staticmethod
+    def _money(val) -> float:
+        try:
+            return float(val)
+        except Exception:
+            return 0.0
+
+    def rows(self, items) -> List[list]:
+        out = []
+        for n, c, q, m, d_type, d_val, f in items:
+            discount_txt = f"{d_type} {d_val}" if d_val else "-"
+            out.append([n, c, q, f"{self._money(m):.2f}", discount_txt, f"{self._money(f):.2f}"])
+        return out
+
+    def qr_drawing(self, invoice_no, invoice_date, customer_name, customer_phone, items,
+                   subtotal, grand_total, qr_mode: str = "compact") -> "Drawing":
+        return invoice_qr_drawing(invoice_qr_payload(invoice_no, invoice_date, customer_name, customer_phone,
+                                                     items, subtotal, grand_total, qr_mode), self.QR_SIZE)
+
+    def render(self, filename, invoice_no, invoice_date, customer_name, customer_phone, items,
+               subtotal, grand_total, qr_mode: str = "compact"):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+        doc = SimpleDocTemplate(filename, pagesize=A4, **self.MARGINS)
+        normal = self.styles["Normal"]
+        story = list(self.header)
+
+        # Invoice meta
+        story.append(Paragraph(f"<b>Invoice No:</b> {invoice_no}", normal))
+        story.append(Paragraph(f"<b>Date:</b> {invoice_date}", normal))
+        story.append(Paragraph(f"<b>Customer:</b> {customer_name}", normal))
+        story.append(Paragraph(f"<b>Phone:</b> {customer_phone}", normal))
+        story.append(Spacer(1, 12))
+
+        table = Table([self.COLUMNS] + self.rows(items), colWidths=self.COL_WIDTHS)
+        table.setStyle(self.items_style)
+        story.append(table)
+        story.append(Spacer(1, 12))
+
+        totals_table = Table([["Subtotal", f"₹ {subtotal:.2f}"],
+                              ["Grand Total", f"₹ {grand_total:.2f}"]], colWidths=self.TOTALS_COL_WIDTHS)
+        totals_table.setStyle(self.totals_style)
+        story.append(totals_table)
+
+        story.append(Spacer(1, 16))
+        story.append(self.qr_drawing(invoice_no, invoice_date, customer_name, customer_phone, items,
+                                     subtotal, grand_total, qr_mode))
+        doc.build(story)
+
+
+def render_invoice_pdf(filename, invoice_no, invoice_date,
+                       customer_name, customer_phone, items,
+                       subtotal, grand_total, qr_mode: str = "compact"):
+    """
+    Build the sales invoice PDF (header, items, totals, QR).
+    items = list of (name, category, qty, mrp, discount_type, discount_value, final_total)
+    Touches no Tk state or DB, so it can run on a worker thread or process;
+    callers resolve qr_mode (invoice_qr_mode()) up front.
+    """
+    InvoiceTemplate.cached().render(filename, invoice_no, invoice_date, customer_name, customer_phone,
+                                    items, subtotal, grand_total, qr_mode=qr_mode)
+
+
+class StockShortageError(Exception):
+    """Raised by checkout_cart when the cart asks for more than is in stock. Nothing is written."""
+
+    def __init__(self, shortages: List[Tuple[str, str, int, int]]):
+        self.shortages = shortages  # (product_id, name, requested, available)
+        super().__init__("; ".join(f"{name} ({pid}): need {req}, have {avail}"
+                                   for pid, name, req, avail in shortages))
+
+
+def checkout_cart(lines: List[dict], invoice_no: str, invoice_date: str, sold_by: str,
+                  customer_name: str, customer_phone: str, customer_id: Optional[str] = None) -> str:
+    """
+    Write one checkout atomically: one invoices row plus its sale_lines.
+    lines = cart dicts (pid, name, cat, qty, mrp, discount_type, discount_value, final_total)
+    Stock is re-read under BEGIN IMMEDIATE (no other terminal can write until
+    we commit), every short line is reported via StockShortageError, and the
+    lines / stock decrements go in as two executemany batches. Each line
+    records the product's unit_price and gst at this moment for profit reports.
+    Returns the invoice number stored (suffixed if another terminal took it).
+    """
+    requested = {}
+    for line in lines:
+        requested[line["pid"]] = requested.get(line["pid"], 0) + line["qty"]
+    pids = list(requested)
+
+    with transaction(immediate=True) as con:
+        stock, costs = {}, {}
+        for i in range(0, len(pids), 500):  # stay under SQLite's bound-variable limit
+            chunk = pids[i:i + 500]
+            rows = con.execute(f"SELECT product_id, quantity, unit_price, gst FROM products "
+                               f"WHERE product_id IN ({','.join('?' * len(chunk))})", chunk)
+            for r in rows:
+                stock[r["product_id"]] = r["quantity"]
+                costs[r["product_id"]] = (r["unit_price"], r["gst"])
+
+        names = {line["pid"]: line["name"] for line in lines}
+        shortages = [(pid, names[pid], qty, stock.get(pid, 0))
+                     for pid, qty in requested.items() if qty > stock.get(pid, 0)]
+        if shortages:
+            raise StockShortageError(shortages)
+
+        base, n = invoice_no, 1
+        while con.execute("SELECT 1 FROM invoices WHERE invoice_no=?", (invoice_no,)).fetchone():
+            n += 1
+            invoice_no = f"{base}-{n}"
+        con.execute("""INSERT INTO invoices(invoice_no, date, sold_by, customer_id, customer_name, customer_phone,
+                                            subtotal, grand_total)
+                       VALUES (?,?,?,?,?,?,?,?)""",
+                    (invoice_no, invoice_date, sold_by, customer_id, customer_name, customer_phone,
+                     sum(i["qty"] * i["mrp"] for i in lines), sum(i["final_total"] for i in lines)))
+        con.executemany("""INSERT INTO sale_lines(invoice_no, product_id, product_name, category, quantity, mrp,
+                                                  total_price, discount_type, discount_value, effective_total,
+                                                  unit_cost, gst)
+                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?)""",
+                        [(invoice_no, i["pid"], i["name"], i["cat"], i["qty"], i["mrp"], i["qty"] * i["mrp"],
+                          i["discount_type"], i["discount_value"], i["final_total"], *costs[i["pid"]])
+                         for i in lines])
+        cur = con.executemany("UPDATE products SET quantity = quantity - ? WHERE product_id = ? AND quantity >= ?",
+                              [(qty, pid, qty) for pid, qty in requested.items()])
+        if cur.rowcount != len(requested):  # cannot happen under the write lock; never commit a partial decrement
+            raise StockShortageError([(pid, names[pid], qty, stock.get(pid, 0)) for pid, qty in requested.items()])
+    return invoice_no
+
+
+def fetch_invoice(invoice_no: str):
+    """Header row + lines of one invoice (two primary-key / indexed reads), or (None, [])."""
+    con = db()
+    header = con.execute("SELECT * FROM invoices WHERE invoice_no=?", (invoice_no,)).fetchone()
+    if header is None:
+        return None, []
+    lines = con.execute("SELECT * FROM sale_lines WHERE invoice_no=? ORDER BY sale_id", (invoice_no,)).fetchall()
+    return header, lines
+
+
+# ---------- Product Lookup ----------
+
+PRODUCT_PICKER_LIMIT = 20  # entries shown in the sales screen product dropdown
+
+
+class ProductRef:
+    __slots__ = ("pid", "name", "category", "mrp", "quantity")
+
+    def __init__(self, pid: str, name: str, category: str, mrp: float, quantity: int):
+        self.pid, self.name, self.category, self.mrp, self.quantity = pid, name, category, mrp, quantity
+
+    @property
+    def label(self) -> str:
+        return f"{self.pid} - {self.name}"
 
-        except Exception as e:
-            messagebox.showerror("Error", f"❌ Failed to send mail:\n{e}")
 
+class ProductIndex:
+    """
+    In-memory product lookup for the sales screen: SKU and lower-cased name
+    in two sorted arrays searched by prefix with bisect, plus pid -> ProductRef.
+    One index per catalog version (change_count("products"), so edits made on
+    other terminals count too) is shared by every sales screen; it is built
+    on the query worker, never on the Tk thread. Quantities are only a hint: refreshed per pid after a
+    checkout or refund, and re-read from products before the sales screen
+    turns a quantity down; checkout_cart re-checks stock under its write lock.
+    """
+    _current: Optional["ProductIndex"] = None
+    _lock = threading.Lock()
+
+    def __init__(self, rows=(), version: Optional[int] = None):
+        self.version = version
+        self.by_pid = {}
+        names = []
+        for pid, name, category, mrp, quantity in rows:
+            self.by_pid[pid] = ProductRef(pid, name, category, mrp, quantity)
+            names.append((name.lower(), pid))
+        self._skus = sorted((pid.lower(), pid) for pid in self.by_pid)
+        names.sort()
+        self._names = names
+
+    @classmethod
+    def current(cls) -> "ProductIndex":
+        """The shared index, rebuilt first if the catalog changed. Runs a full scan; call it off the Tk thread."""
+        with cls._lock:
+            version = change_count("products")
+            if cls._current is None or cls._current.version != version:
+                cls._current = cls(db().execute("SELECT product_id, name, category, mrp, quantity FROM products"),
+                                   version)
+            return cls._current
+
+    @classmethod
+    def latest(cls) -> "ProductIndex":
+        """The last index built (maybe stale), or an empty one. Never touches the database."""
+        return cls._current or cls()
+
+    def add(self, ref: ProductRef):
+        """Make a product found outside the index (added since it was built) searchable."""
+        if ref.pid not in self.by_pid:
+            insort(self._skus, (ref.pid.lower(), ref.pid))
+            insort(self._names, (ref.name.lower(), ref.pid))
+        self.by_pid[ref.pid] = ref
+
+    def lookup(self, text: str, limit: int = 20) -> List[ProductRef]:
+        """SKU-prefix matches first, then name-prefix matches; at most `limit`."""
+        key = text.strip().lower()
+        out: List[ProductRef] = []
+        if not key:
+            return out
+        seen = set()
+        for arr in (self._skus, self._names):
+            i = bisect_left(arr, (key,))
+            while i < len(arr) and len(out) < limit and arr[i][0].startswith(key):
+                pid = arr[i][1]
+                if pid not in seen:
+                    seen.add(pid)
+                    out.append(self.by_pid[pid])
+                i += 1
+        return out
+
+    def first(self, limit: int = 20) -> List[ProductRef]:
+        return [self.by_pid[pid] for _name, pid in self._names[:limit]]
+
+    @classmethod
+    def stock_changed(cls, pids):
+        """Stock of `pids` was changed outside checkout (refunds); update the shared index if built."""
+        index = cls._current
+        if index is not None:
+            index.refresh_stock(pids)
+
+    def refresh_stock(self, pids):
+        pids = [pid for pid in pids if pid in self.by_pid]
+        for i in range(0, len(pids), 500):
+            chunk = pids[i:i + 500]
+            for pid, qty in db().execute(f"SELECT product_id, quantity FROM products WHERE product_id IN "
+                                         f"({','.join('?' * len(chunk))})", chunk):
+                self.by_pid[pid].quantity = qty
+
+
+# ---------- Sales Cart ----------
+
+class CartLine:
+    __slots__ = ("pid", "name", "cat", "qty", "mrp", "discount_type", "discount_value", "final_total")
+
+    def __init__(self, pid: str, name: str, cat: str, qty: int, mrp: float, discount_type: str, discount_value: float):
+        self.pid, self.name, self.cat, self.mrp = pid, name, cat, mrp
+        self.discount_type, self.discount_value = discount_type, discount_value
+        self.qty = qty
+        self.final_total = self.price(qty)
+
+    def price(self, qty: int) -> float:
+        line_total = qty * self.mrp
+        discount_amt = self.discount_value if self.discount_type == "Flat" else (line_total * self.discount_value / 100)
+        return max(line_total - discount_amt, 0.0)
+
+    def values(self) -> tuple:
+        return (self.pid, self.name, self.cat, self.qty, f"{self.mrp:.2f}",
+                self.discount_type, f"{self.discount_value}", f"{self.final_total:.2f}")
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Cart:
+    """
+    Sales cart: lines keyed by pid in insertion order, with subtotal (qty * mrp)
+    and total (after line discounts) kept up to date on every change instead
+    of re-summed. The sales screen uses the pid as the cart_tv item id.
+    """
 
-# ---------- Sales ----------
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.barcode import qr
+    def __init__(self):
+        self.lines: "OrderedDict[str, CartLine]" = OrderedDict()
+        self.subtotal = 0.0
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def get(self, pid: str) -> Optional[CartLine]:
+        return self.lines.get(pid)
+
+    def add(self, line: CartLine) -> CartLine:
+        self.lines[line.pid] = line
+        self.subtotal += line.qty * line.mrp
+        self.total += line.final_total
+        return line
+
+    def set_qty(self, pid: str, qty: int) -> CartLine:
+        line = self.lines[pid]
+        final_total = line.price(qty)
+        self.subtotal += (qty - line.qty) * line.mrp
+        self.total += final_total - line.final_total
+        line.qty, line.final_total = qty, final_total
+        return line
+
+    def remove(self, pid: str) -> Optional[CartLine]:
+        line = self.lines.pop(pid, None)
+        if line is not None:
+            if not self.lines:
+                self.subtotal = self.total = 0.0  # no float residue on an emptied cart
+            else:
+                self.subtotal -= line.qty * line.mrp
+                self.total -= line.final_total
+        return line
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.barcode import qr
+    def clear(self):
+        self.lines.clear()
+        self.subtotal = self.total = 0.0
+
+    def as_dicts(self) -> List[dict]:
+        """Lines in the dict shape checkout_cart takes."""
+        return [line.as_dict() for line in self.lines.values()]
 
 
 class SectionSales(tk.Frame):
@@ -1854,9 +3339,21 @@ class SectionSales(tk.Frame):
         self.qty = tk.StringVar(value="1")
 
         tk.Label(form, text="Product (ID - Name)", font=FONT_MD, bg=THEME["bg"]).grid(row=0, column=0, padx=8, pady=6, sticky="e")
-        self.product_cmb = ttk.Combobox(form, textvariable=self.product_pid, width=40, state="readonly")
+        # type a SKU or name prefix; the dropdown holds the best PRODUCT_PICKER_LIMIT matches
+        self.product_cmb = ttk.Combobox(form, textvariable=self.product_pid, width=40)
         self.product_cmb.grid(row=0, column=1, padx=8, pady=6, sticky="w")
         self.product_cmb.bind("<<ComboboxSelected>>", self.on_product_selected)
+        self.product_cmb.bind("<KeyRelease>", self.on_product_typed)
+        self.product_cmb.bind("<Return>", self.on_product_enter)
+
+        # --- Scan / SKU: each Enter adds one unit ("3*SKU" adds 3); made for USB barcode scanners ---
+        self.scan_var = tk.StringVar()
+        self.scan_status = tk.StringVar()
+        tk.Label(form, text="Scan / SKU", font=FONT_MD, bg=THEME["bg"]).grid(row=0, column=2, padx=8, pady=6, sticky="e")
+        self.scan_entry = tk.Entry(form, textvariable=self.scan_var, font=FONT_MD, width=20)
+        self.scan_entry.grid(row=0, column=3, padx=8, pady=6, sticky="w")
+        self.scan_entry.bind("<Return>", self.on_scan)
+        tk.Label(form, textvariable=self.scan_status, font=FONT_MD, bg=THEME["bg"], fg=THEME["dark"]).grid(row=0, column=4, columnspan=2, padx=8, pady=6, sticky="w")
 
         def add_ro(label, var, r, c):
             tk.Label(form, text=label, font=FONT_MD, bg=THEME["bg"]).grid(row=r, column=c * 2, padx=8, pady=6, sticky="e")
@@ -1925,7 +3422,7 @@ class SectionSales(tk.Frame):
         tk.Label(totals_frame, text="Grand Total:", bg=THEME["bg"], font=FONT_LG).pack(side="left", padx=6)
         tk.Label(totals_frame, textvariable=self.grand_total_var, bg=THEME["bg"], font=FONT_LG).pack(side="left", padx=6)
 
-        self.cart = []
+        self.cart = Cart()  # cart_tv item ids are the product ids
 
         # ================= SALES HISTORY =================
         bot = tk.Frame(self, bg=THEME["bg"])
@@ -1933,13 +3430,16 @@ class SectionSales(tk.Frame):
 
         tk.Label(bot, text="Sales History", bg=THEME["bg"], font=FONT_LG, fg=THEME["dark"]).pack(anchor="w", padx=8, pady=4)
 
-        cols = ("sale_id", "date", "product_name", "category", "quantity", "mrp", "discount_type", "discount_value", "effective_total", "sold_by", "customer_name")
+        cols = ("sale_id", "date", "product_name", "category", "quantity", "mrp", "discount_type", "discount_value", "effective_total", "sold_by", "customer_name", "invoice_no")
         self.tv = ttk.Treeview(bot, columns=cols, show="headings")
-        for c, w in zip(cols, [60, 90, 200, 120, 70, 70, 80, 80, 100, 100, 160]):
+        for c, w in zip(cols, [60, 90, 200, 120, 70, 70, 80, 80, 100, 100, 160, 130]):
             self.tv.heading(c, text=c.replace("_", " ").title())
             self.tv.column(c, width=w, anchor="center")
         self.tv.pack(fill="both", expand=True, pady=8)
         setup_treeview_striped(self.tv)
+        self.history_loader = QueryLoader(self.tv)
+        self.products = ProductIndex.latest()  # replaced once load_products() has the current index
+        self.products_loader = QueryLoader(self.product_cmb, self.scan_status)
 
         # Load initial data
         self.load_products()
@@ -1959,219 +3459,156 @@ class SectionSales(tk.Frame):
 
     # ---------------- Loaders ----------------
     def load_products(self):
-        con = db(); cur = con.cursor()
-        cur.execute("SELECT product_id,name,category,mrp,quantity FROM products ORDER BY name")
-        self.products = cur.fetchall(); con.close()
-        self.product_cmb["values"] = [f"{r['product_id']} - {r['name']}" for r in self.products]
+        self.products_loader.load(ProductIndex.current, self.show_products)
+
+    def show_products(self, index: ProductIndex):
+        self.products = index
+        self.product_cmb["values"] = [p.label for p in index.first(PRODUCT_PICKER_LIMIT)]
+
+    def product_matches(self, text: str) -> List[ProductRef]:
+        matches = self.products.lookup(text, PRODUCT_PICKER_LIMIT)
+        if len(matches) < PRODUCT_PICKER_LIMIT and len(text.strip()) >= 3:
+            # words inside the name ("rice" in "Basmati Rice") via the search index
+            seen = {p.pid for p in matches}
+            for r in fts_search("products", text, PRODUCT_PICKER_LIMIT):
+                p = self.products.by_pid.get(r["product_id"])
+                if p is not None and p.pid not in seen:
+                    seen.add(p.pid)
+                    matches.append(p)
+                    if len(matches) == PRODUCT_PICKER_LIMIT:
+                        break
+        return matches
+
+    def on_product_typed(self, e=None):
+        if e is not None and e.keysym in ("Return", "Up", "Down", "Escape", "Tab"):
+            return
+        text = self.product_pid.get()
+        if " - " in text:
+            return  # a picked entry, not a search
+        matches = self.product_matches(text) if text.strip() else self.products.first(PRODUCT_PICKER_LIMIT)
+        self.product_cmb["values"] = [p.label for p in matches]
+
+    def on_product_enter(self, e=None):
+        text = self.product_pid.get()
+        if " - " in text:
+            return
+        matches = self.product_matches(text)
+        if len(matches) == 1 or (matches and matches[0].pid.lower() == text.strip().lower()):
+            self.product_pid.set(matches[0].label)
+            self.on_product_selected()
+        elif matches:
+            self.product_cmb["values"] = [p.label for p in matches]
+            self.product_cmb.event_generate("<Down>")  # open the list
 
     def on_product_selected(self, e=None):
-        pid = self.product_pid.get().split(" - ")[0]
-        for r in self.products:
-            if r["product_id"] == pid:
-                self.product_name.set(r["name"])
-                self.product_cat.set(r["category"])
-                self.product_mrp.set(f"{r['mrp']:.2f}")
+        pid = self.product_pid.get().split(" - ")[0].strip()
+        p = self.products.by_pid.get(pid)
+        if p is not None:
+            self.product_name.set(p.name)
+            self.product_cat.set(p.category)
+            self.product_mrp.set(f"{p.mrp:.2f}")
 
     def load_customers(self):
         con = db(); cur = con.cursor()
         cur.execute("SELECT customer_id,name FROM customers ORDER BY name")
-        self.customers = cur.fetchall(); con.close()
+        self.customers = cur.fetchall()
         self.customer_cmb["values"] = [f"{r['customer_id']} - {r['name']}" for r in self.customers]
 
     # ---------------- Cart Operations ----------------
     def add_to_cart(self):
         if not self.product_pid.get():
             return
-        pid = self.product_pid.get().split(" - ")[0]
-        qty = int(self.qty.get() or 1)
-
-        con = db(); cur = con.cursor()
-        cur.execute("SELECT name, category, mrp, quantity FROM products WHERE product_id=?", (pid,))
-        prod = cur.fetchone(); con.close()
-        if not prod:
-            return
-
-        # check if product already in cart
-        existing_item = next((item for item in self.cart if item["pid"] == pid), None)
-
-        if existing_item:
-            new_qty = existing_item["qty"] + qty
-            if new_qty > prod["quantity"]:
-                messagebox.showerror("Stock", f"Only {prod['quantity']} units available in stock.")
-                return
-            existing_item["qty"] = new_qty
-            line_total = new_qty * float(prod["mrp"])
-
-            d_type = existing_item["discount_type"]
-            d_val = existing_item["discount_value"]
-            discount_amt = d_val if d_type == "Flat" else (line_total * d_val / 100)
-            existing_item["final_total"] = max(line_total - discount_amt, 0.0)
-
-            # update Treeview row
-            for row in self.cart_tv.get_children():
-                row_vals = self.cart_tv.item(row, "values")
-                if row_vals[0] == pid:  # update matching row
-                    self.cart_tv.item(row, values=(
-                        pid, prod["name"], prod["category"], new_qty,
-                        f"{prod['mrp']:.2f}", d_type, f"{d_val}", f"{existing_item['final_total']:.2f}"
-                    ))
-                    break
+        pid = self.product_pid.get().split(" - ")[0].strip()
+        try:
+            qty = int(self.qty.get() or 1)
+        except ValueError:
+            messagebox.showerror("Quantity", "Quantity must be a whole number."); return
+        err = self.add_pid_to_cart(pid, qty)
+        if err:
+            messagebox.showerror("Cart", err)
+
+    def on_scan(self, e=None):
+        code = self.scan_var.get().strip()
+        self.scan_var.set("")
+        if not code:
+            return "break"
+        qty = 1
+        if "*" in code:
+            n, _, sku = code.partition("*")
+            if n.strip().isdigit() and sku.strip():
+                qty, code = int(n), sku.strip()
+        err = self.add_pid_to_cart(self.resolve_sku(code), qty)
+        if err:
+            self.bell()  # no dialog: it would take focus from the scanner
+            self.scan_status.set(err)
+        return "break"
+
+    def resolve_sku(self, code: str) -> str:
+        if code in self.products.by_pid:
+            return code
+        hit = self.products.lookup(code, 1)
+        if hit and hit[0].pid.lower() == code.lower():
+            return hit[0].pid
+        # not in this index (added since it was built, or still loading): one PK lookup
+        row = db().execute("SELECT product_id, name, category, mrp, quantity FROM products WHERE product_id = ?",
+                           (code,)).fetchone()
+        if row is None:
+            return code
+        self.products.add(ProductRef(*row))
+        self.load_products()  # the catalog changed; rebuild in the background
+        return row[0]
+
+    def add_pid_to_cart(self, pid: str, qty: int) -> Optional[str]:
+        """
+        Add `qty` of `pid`, or increment its line. Stock is checked against the
+        index's quantity hint, re-read from products before refusing (it may be
+        stale after a restock or another terminal's refund); checkout_cart
+        re-checks under its write lock. Returns None once added, otherwise
+        why not (unknown pid, not enough stock) for the caller to show.
+        """
+        prod = self.products.by_pid.get(pid)
+        if prod is None:
+            return f"Not found: {pid}"
+        if qty <= 0:
+            return "Quantity must be at least 1."
+
+        line = self.cart.get(pid)
+        new_qty = qty + (line.qty if line is not None else 0)
+        if new_qty > prod.quantity:
+            self.products.refresh_stock([pid])
+            if new_qty > prod.quantity:
+                return f"Only {prod.quantity} units of {prod.name} available in stock."
+        if line is not None:
+            self.cart.set_qty(pid, new_qty)
+            self.cart_tv.item(pid, values=line.values())
         else:
-            if qty > prod["quantity"]:
-                messagebox.showerror("Stock", f"Only {prod['quantity']} units available in stock.")
-                return
-
-            mrp = float(prod["mrp"])
-            line_total = qty * mrp
-            d_type = self.prod_discount_type.get()
             try:
                 d_val = float(self.prod_discount_value.get() or 0)
-            except:
+            except ValueError:
                 d_val = 0.0
-            discount_amt = d_val if d_type == "Flat" else (line_total * d_val / 100)
-            final_total = max(line_total - discount_amt, 0.0)
-
-            self.cart.append({
-                "pid": pid, "name": prod["name"], "cat": prod["category"], "qty": qty,
-                "mrp": mrp, "discount_type": d_type, "discount_value": d_val, "final_total": final_total
-            })
-            self.cart_tv.insert("", "end", values=(
-                pid, prod["name"], prod["category"], qty,
-                f"{mrp:.2f}", d_type, f"{d_val}", f"{final_total:.2f}"
-            ))
+            line = self.cart.add(CartLine(pid, prod.name, prod.category, qty, float(prod.mrp),
+                                          self.prod_discount_type.get(), d_val))
+            self.cart_tv.insert("", "end", iid=pid, values=line.values())
+        self.cart_tv.see(pid)
 
+        self.scan_status.set(f"{prod.name} x{line.qty}")
         self.update_totals()
-
+        return None
 
     def remove_selected_from_cart(self):
         selected = self.cart_tv.selection()
         if not selected:
             return
-
-        for sel in selected:
-            values = self.cart_tv.item(sel, "values")
-            pid = values[0]
-
-            # find cart item
-            item = next((i for i in self.cart if i["pid"] == pid), None)
-            if not item:
-                continue
-
-            if item["qty"] > 1:
-                item["qty"] -= 1
-                line_total = item["qty"] * item["mrp"]
-                discount_amt = item["discount_value"] if item["discount_type"] == "Flat" else (line_total * item["discount_value"] / 100)
-                item["final_total"] = max(line_total - discount_amt, 0.0)
-
-                self.cart_tv.item(sel, values=(
-                    pid, item["name"], item["cat"], item["qty"],
-                    f"{item['mrp']:.2f}", item["discount_type"], f"{item['discount_value']}", f"{item['final_total']:.2f}"
-                ))
-            else:
-                # remove completely if qty = 1
-                self.cart.remove(item)
-                self.cart_tv.delete(sel)
-
+        for pid in selected:
+            self.cart.remove(pid)
+        self.cart_tv.delete(*selected)
         self.update_totals()
 
-
-    def remove_selected_from_cart(self):
-        sel = self.cart_tv.selection()
-        if not sel: return
-        index = self.cart_tv.index(sel[0])
-        self.cart_tv.delete(sel[0]); del self.cart[index]; self.update_totals()
-
     def clear_cart(self):
-        self.cart = []; self.cart_tv.delete(*self.cart_tv.get_children()); self.update_totals()
+        self.cart.clear(); self.cart_tv.delete(*self.cart_tv.get_children()); self.update_totals()
 
     def update_totals(self):
-        total = sum(item["final_total"] for item in self.cart)
-        self.grand_total_var.set(f"₹{total:.2f}")
-
-
-
-    # ---------------- Invoice Generator ----------------
-    def generate_invoice_pdf(self, filename, invoice_no, invoice_date,
-                             customer_name, customer_phone, items,
-                             subtotal, grand_total):
-        def safe_float(val):
-            try:
-                return float(val)
-            except Exception:
-                return 0.0
-
-        doc = SimpleDocTemplate(filename, pagesize=A4,
-                                rightMargin=30, leftMargin=30,
-                                topMargin=30, bottomMargin=20)
-        story = []
-        styles = getSampleStyleSheet()
-
-        # Header
-        story.append(Paragraph("<b>LALBAGH ENTERPRISE</b>", styles["Title"]))
-        story.append(Paragraph("77, OMRAHGANG, LALBAGH, MURSHIDABAD, WEST BENGAL "
-                               "Email: lalbaghenterprise@gmail.com | Phone:78945612300", styles["Normal"]))
-        story.append(Spacer(1, 12))
-
-        # Invoice meta
-        story.append(Paragraph(f"<b>Invoice No:</b> {invoice_no}", styles["Normal"]))
-        story.append(Paragraph(f"<b>Date:</b> {invoice_date}", styles["Normal"]))
-        story.append(Paragraph(f"<b>Customer:</b> {customer_name}", styles["Normal"]))
-        story.append(Paragraph(f"<b>Phone:</b> {customer_phone}", styles["Normal"]))
-        story.append(Spacer(1, 12))
-
-        # Items table
-        data = [["Product", "Category", "Qty", "MRP", "Discount", "Final Total (₹)"]]
-        for n, c, q, m, d_type, d_val, f in items:
-            discount_txt = f"{d_type} {d_val}" if d_val else "-"
-            data.append([n, c, q, f"{safe_float(m):.2f}", discount_txt, f"{safe_float(f):.2f}"])
-
-        table = Table(data, colWidths=[150, 100, 50, 70, 100, 100])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 12))
-
-        # Totals
-        totals_data = [["Subtotal", f"₹ {subtotal:.2f}"],
-                       ["Grand Total", f"₹ {grand_total:.2f}"]]
-        totals_table = Table(totals_data, colWidths=[300, 200])
-        totals_table.setStyle(TableStyle([
-            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-            ("FONTNAME", (-1, -1), (-1, -1), "Helvetica-Bold"),
-            ("TEXTCOLOR", (-1, -1), (-1, -1), colors.green),
-            ("FONTSIZE", (-1, -1), (-1, -1), 14),
-        ]))
-        story.append(totals_table)
-
-        # QR Code
-        qr_text = (
-            f"Invoice No: {invoice_no}\n"
-            f"Date: {invoice_date}\n"
-            f"Customer: {customer_name}\n"
-            f"Phone: {customer_phone}\n"
-            "\n--- Items ---\n" +
-            "\n".join([f"{n} ({c}) x{q} @₹{safe_float(m):.2f} - {d_type} {d_val} = ₹{safe_float(f):.2f}"
-                       for n, c, q, m, d_type, d_val, f in items]) +
-            f"\n\nSubtotal: ₹{subtotal:.2f}\nGrand Total: ₹{grand_total:.2f}"
-        )
-
-        qr_code = qr.QrCodeWidget(qr_text)
-        bounds = qr_code.getBounds()
-        size = 120
-        w, h = bounds[2] - bounds[0], bounds[3] - bounds[1]
-        d = Drawing(size, size, transform=[size / w, 0, 0, size / h, 0, 0])
-        d.add(qr_code)
-
-
-        story.append(Spacer(1, 16))
-        story.append(d)
-
-        doc.build(story)
+        self.grand_total_var.set(f"₹{self.cart.total:.2f}")
 
     # ---------------- Checkout ----------------
     def checkout(self):
@@ -2186,53 +3623,52 @@ class SectionSales(tk.Frame):
             customer_email = self.new_customer_email.get().strip()
             customer_addr  = self.new_customer_address.get().strip()
 
-            con = db(); cur = con.cursor()
             new_id = padded_id("customers", "customer_id")
-            try:
-                cur.execute("""INSERT INTO customers(customer_id,name,phone,email,address) VALUES (?,?,?,?,?)""",
-                            (new_id, customer_name, customer_phone, customer_email, customer_addr))
-                con.commit(); cust_id = new_id
-            except sqlite3.IntegrityError:
-                cur.execute("SELECT customer_id,name,phone,email,address FROM customers WHERE phone=? OR email=?",
-                            (customer_phone, customer_email))
-                r = cur.fetchone()
-                if r: cust_id, customer_name, customer_phone, customer_email, customer_addr = \
-                    r["customer_id"], r["name"], r["phone"], r["email"], r["address"]
-            con.close()
+            with transaction() as con:
+                cur = con.cursor()
+                try:
+                    cur.execute("""INSERT INTO customers(customer_id,name,phone,email,address) VALUES (?,?,?,?,?)""",
+                                (new_id, customer_name, customer_phone, customer_email, customer_addr))
+                    cust_id = new_id
+                except sqlite3.IntegrityError:
+                    cur.execute("SELECT customer_id,name,phone,email,address FROM customers WHERE phone=? OR email=?",
+                                (customer_phone, customer_email))
+                    r = cur.fetchone()
+                    if r: cust_id, customer_name, customer_phone, customer_email, customer_addr = \
+                        r["customer_id"], r["name"], r["phone"], r["email"], r["address"]
 
         elif self.customer_sel.get():
             cust_id = self.customer_sel.get().split(" - ", 1)[0]
             con = db(); cur = con.cursor()
             cur.execute("SELECT name,phone,email,address FROM customers WHERE customer_id=?", (cust_id,))
-            r = cur.fetchone(); con.close()
+            r = cur.fetchone()
             if r: customer_name, customer_phone, customer_email, customer_addr = \
                 r["name"], r["phone"], r["email"], r["address"]
 
         invoice_no = f"INV{int(dt.datetime.now().timestamp())}"; invoice_date = today_str()
-        subtotal = sum(item["qty"] * item["mrp"] for item in self.cart)
-        grand_total = sum(item["final_total"] for item in self.cart)
+        subtotal, grand_total = self.cart.subtotal, self.cart.total
 
-        con = db(); cur = con.cursor()
-        for item in self.cart:
-            cur.execute("""INSERT INTO sales(product_id, product_name, category, quantity, mrp, total_price,
-                                             discount_type, discount_value, effective_total, date, sold_by,
-                                             customer_name, customer_phone)
-                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                        (item["pid"], item["name"], item["cat"], item["qty"], item["mrp"],
-                         item["qty"] * item["mrp"], item["discount_type"], item["discount_value"],
-                         item["final_total"], invoice_date, self.username, customer_name, customer_phone))
-            cur.execute("UPDATE products SET quantity = quantity - ? WHERE product_id=?", (item["qty"], item["pid"]))
-        con.commit(); con.close()
+        try:
+            invoice_no = checkout_cart(self.cart.as_dicts(), invoice_no, invoice_date, self.username,
+                                       customer_name, customer_phone, cust_id)
+        except StockShortageError as e:
+            lines = "\n".join(f"{name} ({pid}): in cart {req}, in stock {avail}"
+                              for pid, name, req, avail in e.shortages)
+            messagebox.showerror("Stock", f"Checkout cancelled, not enough stock:\n{lines}")
+            self.products.refresh_stock([pid for pid, *_ in e.shortages])
+            return
+
+        self.products.refresh_stock(list(self.cart.lines))
 
         filename = filedialog.asksaveasfilename(defaultextension=".pdf", initialfile=f"{invoice_no}.pdf",
                                                 filetypes=[("PDF files", "*.pdf")])
         if filename:
-            self.generate_invoice_pdf(
+            # rendered in the background; the header status shows when it is written
+            self.winfo_toplevel().invoices.submit(
                 filename, invoice_no, invoice_date, customer_name, customer_phone,
-                [(i["name"], i["cat"], i["qty"], i["mrp"], i["discount_type"], i["discount_value"], i["final_total"]) for i in self.cart],
+                [(i.name, i.cat, i.qty, i.mrp, i.discount_type, i.discount_value, i.final_total) for i in self.cart],
                 subtotal, grand_total
             )
-            messagebox.showinfo("Invoice", f"Invoice saved:\n{filename}")
 
         self.clear_cart(); self.refresh(); self.load_customers()
         for v in (self.new_customer_name, self.new_customer_phone, self.new_customer_email, self.new_customer_address):
@@ -2240,14 +3676,17 @@ class SectionSales(tk.Frame):
 
     # ---------------- Refresh History ----------------
     def refresh(self):
-        con = db(); cur = con.cursor()
-        cur.execute("""SELECT sale_id, date, product_name, category, quantity, mrp, discount_type,
-                              discount_value, effective_total, sold_by, customer_name
-                       FROM sales ORDER BY sale_id DESC LIMIT 20""")
-        rows = [(r["sale_id"], r["date"], r["product_name"], r["category"], r["quantity"], r["mrp"],
-                 r["discount_type"], r["discount_value"], r["effective_total"], r["sold_by"], r["customer_name"])
-                for r in cur.fetchall()]; con.close()
-        insert_rows_striped(self.tv, rows)
+        self.history_loader.load(self.recent_sales, lambda rows: insert_rows_striped(self.tv, rows))
+
+    @staticmethod
+    def recent_sales() -> List[tuple]:
+        cur = db().execute("""SELECT sale_id, date, product_name, category, quantity, mrp, discount_type,
+                                     discount_value, effective_total, sold_by, customer_name, invoice_no
+                              FROM sales ORDER BY sale_id DESC LIMIT 20""")
+        return [(r["sale_id"], r["date"], r["product_name"], r["category"], r["quantity"], r["mrp"],
+                 r["discount_type"], r["discount_value"], r["effective_total"], r["sold_by"], r["customer_name"],
+                 r["invoice_no"])
+                for r in cur.fetchall()]
 
     def show_returns(self):
         win = tk.Toplevel(self)
@@ -2280,7 +3719,6 @@ class SectionSales(tk.Frame):
                         WHERE sale_id = ?
                         """, (sale_id.get(),))
             rows = cur.fetchall()
-            con.close()
 
             if not rows:
                 messagebox.showerror("Error", "Sale not found")
@@ -2327,7 +3765,6 @@ class SectionSales(tk.Frame):
                         LIMIT 50
                     """)
         rows = cur.fetchall()
-        con.close()
 
         if rows:
             formatted = [
@@ -2358,23 +3795,21 @@ class SectionSales(tk.Frame):
                 return
             any_refund = False
 
-            con = db()
-            cur = con.cursor()
             today = dt.datetime.now().strftime("%Y-%m-%d")
 
-            for sid, pid, name, qty, mrp, r_qty, r_amt in refund_data:
-                if r_qty > 0:
-                    any_refund = True
-                    # Save in returns table
-                    cur.execute("""
-                                INSERT INTO returns (sale_id, product_id, quantity, refund_amount, date, reason)
-                                VALUES (?, ?, ?, ?, ?, ?)
-                                """, (sid, pid, r_qty, r_amt, today, reason.get()))
-                    # Update stock back
-                    cur.execute("UPDATE products SET quantity = quantity + ? WHERE product_id = ?", (r_qty, pid))
-
-            con.commit()
-            con.close()
+            with transaction() as con:
+                cur = con.cursor()
+                for sid, pid, name, qty, mrp, r_qty, r_amt in refund_data:
+                    if r_qty > 0:
+                        any_refund = True
+                        # Save in returns table
+                        cur.execute("""
+                                    INSERT INTO returns (sale_id, product_id, quantity, refund_amount, date, reason)
+                                    VALUES (?, ?, ?, ?, ?, ?)
+                                    """, (sid, pid, r_qty, r_amt, today, reason.get()))
+                        # Update stock back
+                        cur.execute("UPDATE products SET quantity = quantity + ? WHERE product_id = ?", (r_qty, pid))
+            ProductIndex.stock_changed([pid for _sid, pid, _n, _q, _m, r_qty, _a in refund_data if r_qty > 0])
 
             if any_refund:
                 messagebox.showinfo("Success", "Refund processed successfully")
@@ -2394,13 +3829,13 @@ class SectionSales(tk.Frame):
         win.configure(bg=THEME["bg"])
 
         # --- Sale search ---
-        tk.Label(win, text="Enter Sale ID:", font=FONT_MD, bg=THEME["bg"]).pack(pady=6)
+        tk.Label(win, text="Enter Sale ID or Invoice No:", font=FONT_MD, bg=THEME["bg"]).pack(pady=6)
         sale_id_var = tk.StringVar()
-        tk.Entry(win, textvariable=sale_id_var, font=FONT_MD, width=15).pack()
+        tk.Entry(win, textvariable=sale_id_var, font=FONT_MD, width=20).pack()
 
-        cols = ("product_id", "product_name", "quantity", "effective_total")
+        cols = ("sale_id", "product_id", "product_name", "quantity", "effective_total")
         tv = ttk.Treeview(win, columns=cols, show="headings", height=8)
-        for c, w in zip(cols, [100, 200, 100, 120]):
+        for c, w in zip(cols, [80, 100, 200, 100, 120]):
             tv.heading(c, text=c.title())
             tv.column(c, width=w, anchor="center")
         tv.pack(fill="x", padx=10, pady=10)
@@ -2410,16 +3845,19 @@ class SectionSales(tk.Frame):
             sid = sale_id_var.get().strip()
             if not sid:
                 return
-            con = db();
-            cur = con.cursor()
-            cur.execute("""SELECT sale_id, product_id, product_name, quantity, effective_total
-                           FROM sales
-                           WHERE sale_id = ?""", (sid,))
-            rows = cur.fetchall()
-            con.close()
+            if sid.isdigit():
+                con = db()
+                cur = con.cursor()
+                cur.execute("""SELECT sale_id, product_id, product_name, quantity, effective_total
+                               FROM sale_lines
+                               WHERE sale_id = ?""", (sid,))
+                rows = cur.fetchall()
+            else:
+                _header, rows = fetch_invoice(sid)
             tv.delete(*tv.get_children())
             for r in rows:
-                tv.insert("", "end", values=(r["product_id"], r["product_name"], r["quantity"], r["effective_total"]))
+                tv.insert("", "end", values=(r["sale_id"], r["product_id"], r["product_name"], r["quantity"],
+                                             r["effective_total"]))
 
         tk.Button(win, text="Load Sale", font=FONT_MD,
                   bg=THEME["primary"], fg="white", command=load_sale).pack(pady=6)
@@ -2443,8 +3881,7 @@ class SectionSales(tk.Frame):
                 messagebox.showwarning("Refund", "Select a product to refund.")
                 return
             vals = tv.item(sel[0], "values")
-            pid = vals[0]
-            sid = sale_id_var.get().strip()
+            sid, pid = vals[0], vals[1]
             try:
                 qty = int(refund_qty_var.get().strip())
             except:
@@ -2463,101 +3900,72 @@ class SectionSales(tk.Frame):
             messagebox.showwarning("Refund", "Refund reason is required.")
             return
 
-        con = db();
-        cur = con.cursor()
         try:
-            # --- Fetch sale record ---
-            cur.execute("""SELECT quantity, effective_total
-                           FROM sales
-                           WHERE sale_id = ?
-                             AND product_id = ?""", (sale_id, product_id))
-            row = cur.fetchone()
-            if not row:
-                messagebox.showerror("Refund", "Sale not found.")
-                return
-
-            sold_qty, eff_total = row["quantity"], row["effective_total"]
-
-            # --- Already refunded qty ---
-            cur.execute("""SELECT IFNULL(SUM(quantity), 0) AS refunded
-                           FROM returns
-                           WHERE sale_id = ?
-                             AND product_id = ?""", (sale_id, product_id))
-            already_refunded = cur.fetchone()["refunded"]
-
-            # --- Validate qty ---
-            if refund_qty <= 0:
-                messagebox.showerror("Refund", "Refund qty must be > 0.")
-                return
-            if refund_qty + already_refunded > sold_qty:
-                messagebox.showerror(
-                    "Refund",
-                    f"Cannot refund {refund_qty}. Already refunded {already_refunded} of {sold_qty}."
-                )
-                return
-
-            # --- Refund amount per unit ---
-            unit_price = eff_total / sold_qty
-            refund_amt = round(unit_price * refund_qty, 2)
-
-            # --- Transaction ---
-            cur.execute("""INSERT INTO returns
-                               (sale_id, product_id, quantity, refund_amount, date, reason)
-                           VALUES (?, ?, ?, ?, ?, ?)""",
-                        (sale_id, product_id, refund_qty, refund_amt, today_str(), reason))
-            cur.execute("UPDATE products SET quantity = quantity + ? WHERE product_id=?",
-                        (refund_qty, product_id))
-            con.commit()
-
-            messagebox.showinfo("Refund", f"Refund processed: ₹{refund_amt:.2f}")
+            # checked and written under one write lock, so two refunds of the same
+            # line cannot both pass the "already refunded" check
+            with transaction(immediate=True) as con:
+                err, refund_amt = self._record_refund(con.cursor(), sale_id, product_id, refund_qty, reason)
         except Exception as e:
-            con.rollback()
             messagebox.showerror("Refund", f"Error: {e}")
-        finally:
-            con.close()
+            return
+        if err:
+            messagebox.showerror("Refund", err)
+            return
+        ProductIndex.stock_changed([product_id])
+        messagebox.showinfo("Refund", f"Refund processed: ₹{refund_amt:.2f}")
+
+    @staticmethod
+    def _record_refund(cur: sqlite3.Cursor, sale_id, product_id, refund_qty, reason):
+        """Insert the return and restock; (error message, None) if it is not allowed."""
+        # --- Fetch sale record ---
+        cur.execute("""SELECT quantity, effective_total
+                       FROM sale_lines
+                       WHERE sale_id = ?
+                         AND product_id = ?""", (sale_id, product_id))
+        row = cur.fetchone()
+        if not row:
+            return "Sale not found.", None
+
+        sold_qty, eff_total = row["quantity"], row["effective_total"]
+
+        # --- Already refunded qty ---
+        cur.execute("""SELECT IFNULL(SUM(quantity), 0) AS refunded
+                       FROM returns
+                       WHERE sale_id = ?
+                         AND product_id = ?""", (sale_id, product_id))
+        already_refunded = cur.fetchone()["refunded"]
+
+        # --- Validate qty ---
+        if refund_qty <= 0:
+            return "Refund qty must be > 0.", None
+        if refund_qty + already_refunded > sold_qty:
+            return f"Cannot refund {refund_qty}. Already refunded {already_refunded} of {sold_qty}.", None
+
+        # --- Refund amount per unit ---
+        unit_price = eff_total / sold_qty
+        refund_amt = round(unit_price * refund_qty, 2)
+
+        cur.execute("""INSERT INTO returns
+                           (sale_id, product_id, quantity, refund_amount, date, reason)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (sale_id, product_id, refund_qty, refund_amt, today_str(), reason))
+        cur.execute("UPDATE products SET quantity = quantity + ? WHERE product_id=?",
+                    (refund_qty, product_id))
+        return None, refund_amt
 
 # ---------- REPORTS DASHBOARD ----------
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import datetime as dt
-import openpyxl
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-import matplotlib.pyplot as plt
-import os
-from tkcalendar import DateEntry
-import tkinter as tk
-from tkinter import messagebox, filedialog
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import datetime as dt
-
 
 # ---------- HELPERS ----------
-def export_treeview_to_excel(tree, filename):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    # headers
-    ws.append([tree.heading(col)["text"] for col in tree["columns"]])
-    # rows
-    for row_id in tree.get_children():
-        ws.append(tree.item(row_id)["values"])
-    # footer timestamp
-    ws.append([])
-    ws.append([f"Exported On: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
-    wb.save(filename)
-
-
 def export_treeview_to_pdf(tree, filename, title="Report"):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+
     doc = SimpleDocTemplate(filename, pagesize=A4)
     data = []
     data.append([tree.heading(col)["text"] for col in tree["columns"]])
-    for row_id in tree.get_children():
-        data.append(tree.item(row_id)["values"])
+    data.extend(list(vals) for vals in table_rows(tree))
 
     table = Table(data, repeatRows=1)
     table.setStyle(TableStyle([
@@ -2606,6 +4014,12 @@ class SectionReports(tk.Frame):
                                    font=FONT_LG, bg=THEME["danger"], fg="white", width=30, relief="groove")
         self.kpi_profit.grid(row=0, column=2, padx=8, pady=8)
 
+        self.kpi_period = tk.StringVar(value=KPI_PERIODS["month"])
+        period_cmb = ttk.Combobox(kpi_frame, textvariable=self.kpi_period, values=list(KPI_PERIODS.values()),
+                                  state="readonly", width=14)
+        period_cmb.grid(row=0, column=3, padx=8, pady=8)
+        period_cmb.bind("<<ComboboxSelected>>", lambda e: self.refresh_summary())
+
         # --- CHART BUTTONS ---
         chart_frame = tk.Frame(self, bg=THEME["bg"])
         chart_frame.pack(fill="both", expand=True, padx=12, pady=12)
@@ -2655,6 +4069,8 @@ class SectionReports(tk.Frame):
 
         tk.Button(filter_frame, text="Apply", font=FONT_MD, bg=THEME["primary"], fg="white",
                   command=self.refresh_sales).pack(side="left", padx=6)
+        self.loading = tk.StringVar()
+        tk.Label(filter_frame, textvariable=self.loading, bg=THEME["bg"], font=FONT_MD).pack(side="left", padx=6)
 
         btn_frame = tk.Frame(history_frame, bg=THEME["bg"])
         btn_frame.pack(fill="x", padx=8, pady=4, anchor="e")
@@ -2672,6 +4088,10 @@ class SectionReports(tk.Frame):
             self.sales_tv.column(c, width=w, anchor="center")
         self.sales_tv.pack(fill="both", expand=True, pady=8)
         setup_treeview_striped(self.sales_tv)
+        self.sales_table = VirtualTable(self.sales_tv)
+        self.kpi_loader = QueryLoader(kpi_frame)
+        self.sales_loader = QueryLoader(self.sales_tv, self.loading)
+        self.trend_loader = QueryLoader(chart_frame)
 
         # Load data
         self.refresh_summary()
@@ -2679,32 +4099,19 @@ class SectionReports(tk.Frame):
 
     # --- KPI REFRESH ---
     def refresh_summary(self):
-        con = db();
-        cur = con.cursor()
-        cur.execute("SELECT IFNULL(SUM(effective_total),0) FROM sales WHERE strftime('%m',date)=strftime('%m','now')")
-        total_sales = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM customers")
-        total_customers = cur.fetchone()[0]
-
-        cur.execute("""SELECT IFNULL(SUM(s.effective_total - (p.unit_price * s.quantity)), 0)
-                       FROM sales s
-                                JOIN products p ON s.product_id = p.product_id""")
-        profit = cur.fetchone()[0]
-        con.close()
+        period = next(k for k, v in KPI_PERIODS.items() if v == self.kpi_period.get())
+        self.kpi_loader.load(lambda: sales_kpis(period) + (
+            db().execute("SELECT COUNT(*) FROM customers").fetchone()[0],), self.show_summary)
+
+    def show_summary(self, kpis):
+        total_sales, profit, total_customers = kpis
         self.kpi_sales.config(text=f"Total Sales: ₹{total_sales:.2f}")
         self.kpi_customers.config(text=f"Total Customers: {total_customers}")
         self.kpi_profit.config(text=f"Profit Margin: ₹{profit:.2f}")
 
     # --- CHARTS EMBEDDED IN TKINTER ---
     # --- CHARTS EMBEDDED IN TKINTER (WITH EXPORT) ---
-    import tkinter as tk
-    from tkinter import filedialog, messagebox
-    from matplotlib.figure import Figure
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    import datetime as dt
     import locale
-    from matplotlib.ticker import FuncFormatter
-    from matplotlib.ticker import FuncFormatter
 
     # Set Indian numbering locale (safe fallback)
     try:
@@ -2713,16 +4120,17 @@ class SectionReports(tk.Frame):
         locale.setlocale(locale.LC_ALL, '')
 
     def show_sales_trend(self):
-        con = db()
-        cur = con.cursor()
-        cur.execute("""
-            SELECT strftime('%Y-%m', date) as month, SUM(effective_total)
-            FROM sales
+        self.trend_loader.load(lambda: db().execute("""
+            SELECT substr(date, 1, 7) as month, SUM(revenue)
+            FROM sales_daily
             GROUP BY month
             ORDER BY month
-        """)
-        rows = cur.fetchall()
-        con.close()
+        """).fetchall(), self.open_sales_trend)
+
+    def open_sales_trend(self, rows):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.ticker import FuncFormatter
 
         if not rows:
             messagebox.showwarning("No Data", "No sales data available to display.")
@@ -2801,14 +4209,11 @@ class SectionReports(tk.Frame):
         tk.Button(btn_frame, text="Export PNG", command=lambda: export_chart("png")).pack(side="left", padx=5)
         tk.Button(btn_frame, text="Export JPEG", command=lambda: export_chart("jpeg")).pack(side="left", padx=5)
 
-    from tkcalendar import DateEntry
-    import tkinter as tk
-    from tkinter import messagebox, filedialog
-    from matplotlib.figure import Figure
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    import datetime as dt
-
     def show_top_products(self):
+        from tkcalendar import DateEntry
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         win = tk.Toplevel(self)
         win.title("Top 5 Products")
         win.geometry("750x550")
@@ -2831,19 +4236,20 @@ class SectionReports(tk.Frame):
         fig = Figure(figsize=(6.5, 4.5), dpi=100)
         ax1 = fig.add_subplot(111)
 
+        loader = QueryLoader(win)
+
         def load_chart():
-            con = db()
-            cur = con.cursor()
-            cur.execute("""
-                SELECT product_name, SUM(quantity) AS qty
-                FROM sales
+            loader.load(lambda f, t: db().execute("""
+                SELECT MAX(product_name), SUM(qty) AS qty
+                FROM sales_daily
                 WHERE date BETWEEN ? AND ?
-                GROUP BY product_id, product_name
+                GROUP BY product_id
                 ORDER BY qty DESC
                 LIMIT 5
-            """, (from_date.get(), to_date.get()))
-            rows = cur.fetchall()
-            con.close()
+            """, (f, t)).fetchall(), draw_chart,
+                        from_date.get(), to_date.get())
+
+        def draw_chart(rows):
 
             if not rows:
                 messagebox.showinfo("No Data", "No sales found for this date range.")
@@ -2896,6 +4302,9 @@ class SectionReports(tk.Frame):
         load_chart()
 
     def show_supplier_comparison(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         win = tk.Toplevel(self)
         win.title("Supplier vs Supplier")
         win.geometry("750x550")
@@ -2912,18 +4321,19 @@ class SectionReports(tk.Frame):
         fig = Figure(figsize=(6.5, 4.5), dpi=100)
         ax = fig.add_subplot(111)
 
+        loader = QueryLoader(win)
+
         def load_chart():
-            con = db()
-            cur = con.cursor()
-            cur.execute("""SELECT s.company, SUM(sl.effective_total) as total_sales
-                           FROM sales sl
+            loader.load(lambda f, t: db().execute("""SELECT s.company, SUM(sl.revenue) as total_sales
+                           FROM sales_daily sl
                                     JOIN products p ON sl.product_id = p.product_id
                                     JOIN suppliers s ON p.supplier_id = s.supplier_id
                            WHERE sl.date BETWEEN ? AND ?
                            GROUP BY s.supplier_id
-                           ORDER BY total_sales DESC""", (from_date.get(), to_date.get()))
-            rows = cur.fetchall()
-            con.close()
+                           ORDER BY total_sales DESC""", (f, t)).fetchall(), draw_chart,
+                        from_date.get(), to_date.get())
+
+        def draw_chart(rows):
 
             suppliers = [r[0] for r in rows]
             totals = [r[1] for r in rows]
@@ -2989,34 +4399,30 @@ class SectionReports(tk.Frame):
             tv.column(c, anchor="center", width=120)
         tv.pack(fill="both", expand=True, padx=10, pady=10)
         setup_treeview_striped(tv)
+        table = VirtualTable(tv)
+
+        def fmt(r):
+            grand_total = r["effective_total"];
+            profit = r["profit"]
+            profit_pct = (profit / grand_total * 100) if grand_total else 0
+            return (r["date"], r["product_name"], f"{r['unit_price']:.2f}", r["quantity"],
+                    f"{grand_total:.2f}", f"{profit:.2f}", f"{profit_pct:.2f}%")
+
+        loader = QueryLoader(win)
 
         def load_data():
             f, t = from_date.get().strip(), to_date.get().strip()
-            con = db();
-            cur = con.cursor()
-            cur.execute("""
-                        SELECT s.date,
+            table.load_source(QuerySource("""
+                        SELECT s.sale_id,
+                               s.date,
                                s.product_name,
-                               p.unit_price,
+                               IFNULL(s.unit_cost, 0) AS unit_price,
                                s.quantity,
                                s.effective_total,
-                               (s.effective_total - (p.unit_price * s.quantity)) AS profit
+                               (s.effective_total - IFNULL(s.unit_cost, 0) * s.quantity) AS profit
                         FROM sales s
-                                 JOIN products p ON p.product_id = s.product_id
                         WHERE s.date BETWEEN ? AND ?
-                        ORDER BY s.date
-                        """, (f, t))
-            rows = cur.fetchall();
-            con.close()
-
-            tv.delete(*tv.get_children())
-            for r in rows:
-                grand_total = r["effective_total"];
-                profit = r["profit"]
-                profit_pct = (profit / grand_total * 100) if grand_total else 0
-                tv.insert("", "end", values=(r["date"], r["product_name"],
-                                             f"{r['unit_price']:.2f}", r["quantity"],
-                                             f"{grand_total:.2f}", f"{profit:.2f}", f"{profit_pct:.2f}%"))
+                        """, (f, t), key=("date", "sale_id"), fmt=fmt), loader)
 
         btn_frame = tk.Frame(win, bg=THEME["bg"]);
         btn_frame.pack(pady=8)
@@ -3031,6 +4437,12 @@ class SectionReports(tk.Frame):
 
 
     def export_profit_pdf(self, tv, f, t):
+        import matplotlib.pyplot as plt
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet
+
         export_date = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         save_path = filedialog.asksaveasfilename(defaultextension=".pdf",
                                                  initialfile="profit_margin.pdf",
@@ -3042,8 +4454,7 @@ class SectionReports(tk.Frame):
         total_profit = total_sales = 0.0
         profit_rows = []
 
-        for child in tv.get_children():
-            vals = tv.item(child, "values")
+        for vals in table_rows(tv):
             data.append(list(vals))
             try:
                 grand_total = float(vals[4]);
@@ -3117,16 +4528,12 @@ class SectionReports(tk.Frame):
     # --- SALES HISTORY ---
     def refresh_sales(self):
         f1, f2 = self.f_from.get().strip(), self.f_to.get().strip()
-        con = db();
-        cur = con.cursor()
-        cur.execute(
+        self.sales_table.load_source(QuerySource(
             """SELECT sale_id, date, product_name, category, quantity, mrp, effective_total, sold_by, customer_name, customer_phone
-               FROM sales WHERE date BETWEEN ? AND ? ORDER BY sale_id DESC""", (f1, f2))
-        rows = [(r["sale_id"], r["date"], r["product_name"], r["category"],
-                 r["quantity"], f"{r['mrp']:.2f}", f"{r['effective_total']:.2f}",
-                 r["sold_by"], r["customer_name"], r["customer_phone"]) for r in cur.fetchall()]
-        con.close()
-        insert_rows_striped(self.sales_tv, rows)
+               FROM sales WHERE date BETWEEN ? AND ?""", (f1, f2), key=("date", "sale_id"), desc=True,
+            fmt=lambda r: (r["sale_id"], r["date"], r["product_name"], r["category"],
+                           r["quantity"], f"{r['mrp']:.2f}", f"{r['effective_total']:.2f}",
+                           r["sold_by"], r["customer_name"], r["customer_phone"])), self.sales_loader)
 
     def export_sales_excel(self):
         save_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
@@ -3142,6 +4549,9 @@ class SectionReports(tk.Frame):
             messagebox.showinfo("Export", f"Sales exported to PDF:\n{save_path}")
 
     def show_product_sales_share(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         win = tk.Toplevel(self)
         win.title("Product Sales Share (Pie Chart)")
         win.geometry("750x600")
@@ -3160,18 +4570,19 @@ class SectionReports(tk.Frame):
         ax = fig.add_subplot(111)
         fig.subplots_adjust(bottom=0.18)  # leave space at bottom
 
+        loader = QueryLoader(win)
+
         def load_chart():
-            con = db()
-            cur = con.cursor()
-            cur.execute("""
-                        SELECT product_name, SUM(effective_total) as total_sales
-                        FROM sales
+            loader.load(lambda f, t: db().execute("""
+                        SELECT MAX(product_name), SUM(revenue) as total_sales
+                        FROM sales_daily
                         WHERE date BETWEEN ? AND ?
                         GROUP BY product_id
                         ORDER BY total_sales DESC
-                        """, (from_date.get(), to_date.get()))
-            rows = cur.fetchall()
-            con.close()
+                        """, (f, t)).fetchall(), draw_chart,
+                        from_date.get(), to_date.get())
+
+        def draw_chart(rows):
 
             labels = [r[0] for r in rows]
             totals = [r[1] for r in rows]
@@ -3227,6 +4638,9 @@ class SectionReports(tk.Frame):
         # Load first view
         load_chart()
     def show_daily_sales_trend(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         win = tk.Toplevel(self)
         win.title("Daily Sales Trend")
         win.geometry("800x600")
@@ -3245,18 +4659,19 @@ class SectionReports(tk.Frame):
         ax = fig.add_subplot(111)
         fig.subplots_adjust(bottom=0.18)
 
+        loader = QueryLoader(win)
+
         def load_chart():
-            con = db()
-            cur = con.cursor()
-            cur.execute("""
-                        SELECT date, SUM(effective_total) as total_sales
-                        FROM sales
+            loader.load(lambda f, t: db().execute("""
+                        SELECT date, SUM(revenue) as total_sales
+                        FROM sales_daily
                         WHERE date BETWEEN ? AND ?
                         GROUP BY date
                         ORDER BY date
-                        """, (from_date.get(), to_date.get()))
-            rows = cur.fetchall()
-            con.close()
+                        """, (f, t)).fetchall(), draw_chart,
+                        from_date.get(), to_date.get())
+
+        def draw_chart(rows):
 
             dates = [r[0] for r in rows]
             totals = [r[1] for r in rows]
@@ -3314,6 +4729,8 @@ class SectionReports(tk.Frame):
         # Load first view
         load_chart()
     def export_all_reports(self):
+        import matplotlib.pyplot as plt
+
         save_path = filedialog.asksaveasfilename(
             defaultextension=".pdf",
             filetypes=[("PDF", "*.pdf")],
@@ -3336,8 +4753,8 @@ class SectionReports(tk.Frame):
 
         # --- Monthly Sales Trend ---
         cur.execute("""
-                    SELECT substr(date,1,7) AS month, SUM(effective_total) as total
-                    FROM sales
+                    SELECT substr(date,1,7) AS month, SUM(revenue) as total
+                    FROM sales_daily
                     GROUP BY month ORDER BY month
                     """)
         rows = cur.fetchall()
@@ -3355,8 +4772,8 @@ class SectionReports(tk.Frame):
 
         # --- Top 5 Products ---
         cur.execute("""
-                    SELECT product_name, SUM(quantity) as qty, SUM(effective_total) as sales
-                    FROM sales GROUP BY product_id
+                    SELECT MAX(product_name), SUM(qty) as qty, SUM(revenue) as sales
+                    FROM sales_daily GROUP BY product_id
                     ORDER BY sales DESC LIMIT 5
                     """)
         rows = cur.fetchall()
@@ -3378,8 +4795,8 @@ class SectionReports(tk.Frame):
 
         # --- Supplier vs Supplier ---
         cur.execute("""
-                    SELECT supplier_id, SUM(effective_total) as total
-                    FROM sales JOIN products p ON sales.product_id=p.product_id
+                    SELECT supplier_id, SUM(revenue) as total
+                    FROM sales_daily JOIN products p ON sales_daily.product_id=p.product_id
                     GROUP BY supplier_id ORDER BY total DESC
                     """)
         rows = cur.fetchall()
@@ -3397,8 +4814,8 @@ class SectionReports(tk.Frame):
 
         # --- Product Sales Share (Pie) ---
         cur.execute("""
-                    SELECT product_name, SUM(effective_total) as total
-                    FROM sales WHERE date BETWEEN ? AND ?
+                    SELECT MAX(product_name), SUM(revenue) as total
+                    FROM sales_daily WHERE date BETWEEN ? AND ?
                     GROUP BY product_id ORDER BY total DESC
                     """, (old, today))
         rows = cur.fetchall()
@@ -3414,8 +4831,8 @@ class SectionReports(tk.Frame):
 
         # --- Daily Sales Trend ---
         cur.execute("""
-                    SELECT date, SUM(effective_total) as total
-                    FROM sales WHERE date BETWEEN ? AND ?
+                    SELECT date, SUM(revenue) as total
+                    FROM sales_daily WHERE date BETWEEN ? AND ?
                     GROUP BY date ORDER BY date
                     """, (old, today))
         rows = cur.fetchall()
@@ -3432,7 +4849,6 @@ class SectionReports(tk.Frame):
         add_chart(fig)
 
         pdf.close()
-        con.close()
         messagebox.showinfo("Export", f"All reports exported:\n{save_path}")
     def show_profit_analysis(self):
         win = tk.Toplevel(self)
@@ -3463,6 +4879,8 @@ class SectionReports(tk.Frame):
             tree.heading(c, text=c)
             tree.column(c, anchor="center", width=130)
         tree.pack(fill="both", expand=True, pady=10)
+        setup_treeview_striped(tree)
+        table = VirtualTable(tree)
 
         # --- Summary label ---
         summary_lbl = tk.Label(win, text="",
@@ -3472,35 +4890,32 @@ class SectionReports(tk.Frame):
 
         report_data = []  # store for exports
 
+        loader = QueryLoader(win)
+
         def load_report():
             nonlocal report_data
-            for row in tree.get_children():
-                tree.delete(row)
+            table.set_rows([])
             report_data = []
 
-            con = db()
-            cur = con.cursor()
-
             if mode.get() == "Daily":
-                group_field = "s.date"
+                group_field = "date"
             else:
-                group_field = "substr(s.date,1,7)"  # YYYY-MM
+                group_field = "substr(date,1,7)"  # YYYY-MM
 
             query = f"""
                 SELECT {group_field} as period,
-                       SUM(s.effective_total) AS total_sales,
-                       SUM(s.effective_total - (p.unit_price * s.quantity)) AS profit_value,
-                       SUM(s.quantity) as total_qty
-                FROM sales s
-                JOIN products p ON p.product_id = s.product_id
-                WHERE s.date BETWEEN ? AND ?
+                       SUM(revenue) AS total_sales,
+                       SUM(revenue - cost) AS profit_value,
+                       SUM(qty) as total_qty
+                FROM sales_daily
+                WHERE date BETWEEN ? AND ?
                 GROUP BY period
                 ORDER BY period
             """
-            cur.execute(query, (from_date.get(), to_date.get()))
-            rows = cur.fetchall()
-            con.close()
+            loader.load(lambda f, t: db().execute(query, (f, t)).fetchall(), show_report,
+                        from_date.get(), to_date.get())
 
+        def show_report(rows):
             if not rows:
                 summary_lbl.config(text="No profit data in this range.")
                 return
@@ -3508,6 +4923,7 @@ class SectionReports(tk.Frame):
             total_profit = sum(r[2] for r in rows)
             total_sales = sum(r[1] for r in rows)
             prev_profit = None
+            display_rows = []
             highest_period, lowest_period = None, None
             highest_val, lowest_val = float("-inf"), float("inf")
 
@@ -3524,7 +4940,7 @@ class SectionReports(tk.Frame):
                 if profit < lowest_val:
                     lowest_val, lowest_period = profit, period
 
-                tree.insert("", "end", values=(
+                display_rows.append((
                     period,
                     f"₹{sales:,.2f}",
                     f"₹{profit:,.2f}",
@@ -3536,6 +4952,7 @@ class SectionReports(tk.Frame):
 
                 report_data.append((period, sales, profit, pct_total, growth, avg_unit_price, profit_margin))
 
+            table.set_rows(display_rows)
             avg_profit = total_profit / len(rows)
             overall_margin = (total_profit / total_sales * 100) if total_sales else 0
 
@@ -3631,11 +5048,414 @@ class SectionReports(tk.Frame):
         load_report()
 
 
+# ---------- Batch Invoice Reprint ----------
+
+def _iter_reprint_jobs(out_dir: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                       invoice_nos: Optional[List[str]] = None):
+    """
+    Yield one render_invoice_pdf argument tuple per invoice. Headers and lines
+    come from a single ordered join that is streamed and grouped, so a long
+    date range is never held in memory at once.
+    """
+    sql = """SELECT i.invoice_no, i.date, i.customer_name, i.customer_phone, i.subtotal, i.grand_total,
+                    l.product_name, l.category, l.quantity, l.mrp, l.discount_type, l.discount_value,
+                    l.effective_total
+             FROM invoices i JOIN sale_lines l ON l.invoice_no = i.invoice_no"""
+    if invoice_nos:
+        chunks = [invoice_nos[i:i + 500] for i in range(0, len(invoice_nos), 500)]
+    else:
+        chunks = [None]
+
+    con = db()
+    qr_mode = invoice_qr_mode()
+    for chunk in chunks:
+        if chunk is not None:
+            q = sql + f" WHERE i.invoice_no IN ({','.join('?' * len(chunk))})"
+            params: tuple = tuple(chunk)
+        else:
+            q = sql + " WHERE i.date BETWEEN ? AND ?"
+            params = (date_from or "0000-00-00", date_to or "9999-12-31")
+        cur = con.execute(q + " ORDER BY i.date, i.invoice_no, l.sale_id", params)
+
+        current, items = None, []
+        for r in cur:
+            if current is not None and r["invoice_no"] != current["invoice_no"]:
+                yield _reprint_job(out_dir, current, items, qr_mode)
+                items = []
+            current = r
+            items.append((r["product_name"], r["category"], r["quantity"], r["mrp"],
+                          r["discount_type"], r["discount_value"], r["effective_total"]))
+        if current is not None:
+            yield _reprint_job(out_dir, current, items, qr_mode)
+
+
+def _reprint_job(out_dir: str, header, items, qr_mode: str) -> tuple:
+    filename = os.path.join(out_dir, f"{header['invoice_no']}.pdf")
+    return (filename, header["invoice_no"], header["date"], header["customer_name"] or "",
+            header["customer_phone"] or "", items, header["subtotal"] or 0.0, header["grand_total"] or 0.0,
+            qr_mode)
+
+
+def _render_invoice_job(job: tuple) -> str:
+    """Process-pool entry point (must stay top level so it pickles)."""
+    render_invoice_pdf(*job)
+    return job[1]
+
+
+def reprint_invoices(out_dir: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     invoice_nos: Optional[List[str]] = None, workers: Optional[int] = None) -> int:
+    """
+    Render every invoice in [date_from, date_to] (or the given invoice numbers)
+    into out_dir, spread over `workers` processes (default: all cores).
+    The parent does the DB reads; workers only build PDFs. Returns the count.
+    """
+    if invoice_nos and (date_from or date_to):
+        raise ValueError("give invoice numbers or a date range, not both")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    jobs = _iter_reprint_jobs(out_dir, date_from, date_to, invoice_nos)
+    max_in_flight = workers * 4  # keeps the pool busy without queueing the whole range
+
+    done = failed = 0
+    t0 = time.perf_counter()
+
+    def progress():
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        sys.stdout.write(f"\rRendered {done} invoice(s), {failed} failed, {rate:.1f} invoices/sec")
+        sys.stdout.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for job in jobs:
+            in_flight.add(pool.submit(_render_invoice_job, job))
+            if len(in_flight) < max_in_flight:
+                continue
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                if fut.exception() is None:
+                    done += 1
+                else:
+                    failed += 1
+                    print(f"\nReprint failed: {fut.exception()}")
+            progress()
+        for fut in in_flight:
+            try:
+                fut.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"\nReprint failed: {e}")
+            progress()
+
+    elapsed = time.perf_counter() - t0
+    print(f"\nDone: {done} invoice(s) in {elapsed:.2f} s "
+          f"({done / elapsed if elapsed else 0:.1f} invoices/sec, {workers} worker(s)) -> {out_dir}")
+    return done
+
+
+# ---------- Benchmarks ----------
+
+def benchmark_report_indexes(rows: int = 1_000_000, repeat: int = 5):
+    """
+    Time the report queries on a synthetic database of `rows` sales in the
+    original flat layout, then again after running MIGRATIONS (indexes,
+    invoices / sale_lines, ...). Uses a temporary file, never inventory14.db.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="inv_bench_")
+    path = os.path.join(tmp_dir, "bench.db")
+    con = sqlite3.connect(path)
+    con.row_factory = sqlite3.Row
+    for name, value in STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE].items():
+        con.execute(f"PRAGMA {name}={value}")
+    create_schema(con.cursor())
+    create_legacy_sales(con.cursor())
+
+    rnd = random.Random(14)
+    n_products, n_suppliers, days = 2000, 50, 3 * 365
+    start = dt.date.today() - dt.timedelta(days=days)
+    print(f"Building {rows:,} sales rows in {path} ...")
+    con.executemany("INSERT INTO suppliers VALUES(?,?,?,?,?,?)",
+                    ((str(i).zfill(3), f"S{i}", f"Company {i}", f"9{i:09d}", f"s{i}@gmail.com", "")
+                     for i in range(1, n_suppliers + 1)))
+    con.executemany("INSERT INTO products(product_id,name,category,supplier_id,quantity,gst,unit_price,mrp,"
+                    "reorder_level) VALUES(?,?,?,?,?,?,?,?,?)",
+                    ((str(i).zfill(4), f"Product {i}", f"Cat {i % 40}", str(i % n_suppliers + 1).zfill(3),
+                      rnd.randint(0, 500), 18, 100.0, 118.0, 20) for i in range(1, n_products + 1)))
+
+    def sale_rows():
+        for i in range(rows):
+            pid = rnd.randint(1, n_products)
+            qty = rnd.randint(1, 5)
+            d = (start + dt.timedelta(days=i * days // rows)).isoformat()
+            yield (str(pid).zfill(4), f"Product {pid}", f"Cat {pid % 40}", qty, 118.0, qty * 118.0,
+                   "Flat", 0, qty * 118.0, d, "admin", "Walk-in", "")
+
+    con.executemany("INSERT INTO sales(product_id, product_name, category, quantity, mrp, total_price, "
+                    "discount_type, discount_value, effective_total, date, sold_by, customer_name, "
+                    "customer_phone) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", sale_rows())
+    con.executemany("INSERT INTO returns(sale_id, product_id, quantity, refund_amount, date, reason) "
+                    "VALUES (?,?,?,?,?,?)",
+                    ((sid, str(rnd.randint(1, n_products)).zfill(4), 1, 118.0, today_str(), "bench")
+                     for sid in rnd.sample(range(1, rows + 1), min(rows // 50, 20000))))
+    con.commit()
+
+    week = ((dt.date.today() - dt.timedelta(days=7)).isoformat(), today_str())
+    month = ((dt.date.today() - dt.timedelta(days=30)).isoformat(), today_str())
+    queries = [
+        ("Sales history (7 days)",
+         "SELECT * FROM sales WHERE date BETWEEN ? AND ? ORDER BY sale_id DESC", week),
+        ("Top 5 products (30 days)",
+         "SELECT product_name, SUM(quantity) qty FROM sales WHERE date BETWEEN ? AND ? "
+         "GROUP BY product_id, product_name ORDER BY qty DESC LIMIT 5", month),
+        ("Daily trend (30 days)",
+         "SELECT date, SUM(effective_total) FROM sales WHERE date BETWEEN ? AND ? GROUP BY date", month),
+        ("Product history (30 days)",
+         "SELECT SUM(quantity) FROM sales WHERE product_id=? AND date BETWEEN ? AND ?", ("0042",) + month),
+        ("Refund lookup",
+         "SELECT IFNULL(SUM(quantity),0) FROM returns WHERE sale_id=? AND product_id=?", (rows // 2, "0042")),
+        ("Low stock count",
+         "SELECT COUNT(*) FROM products WHERE quantity < reorder_level", ()),
+        ("Supplier products",
+         "SELECT COUNT(*) FROM products WHERE supplier_id=?", ("007",)),
+    ]
+
+    # what the report charts read now; measured after the migrations and shown
+    # next to the flat-table queries they replace
+    rollups = [
+        ("Top 5 products (rollup)",
+         "SELECT MAX(product_name), SUM(qty) qty FROM sales_daily WHERE date BETWEEN ? AND ? "
+         "GROUP BY product_id ORDER BY qty DESC LIMIT 5", month),
+        ("Daily trend (rollup)",
+         "SELECT date, SUM(revenue) FROM sales_daily WHERE date BETWEEN ? AND ? GROUP BY date", month),
+    ]
+
+    def measure(queries):
+        out = []
+        for _title, sql, params in queries:
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                con.execute(sql, params).fetchall()
+                best = min(best, time.perf_counter() - t0)
+            out.append(best * 1000)
+        return out
+
+    before = measure(queries)
+    t0 = time.perf_counter()
+    run_migrations(con)
+    con.execute("ANALYZE")
+    build = time.perf_counter() - t0
+    after = measure(queries)
+    rolled = measure(rollups)
+    con.close()
+
+    print(f"Migrations: {build:.2f} s")
+    print(f"{'Query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for (title, _sql, _params), b, a in zip(queries, before, after):
+        print(f"{title:<28}{b:>12.2f}{a:>12.2f}{b / a if a else 0:>9.1f}x")
+    # "before" for a rollup row is the flat-table query it replaces
+    for (title, _sql, _params), i, a in zip(rollups, (1, 2), rolled):
+        b = before[i]
+        print(f"{title:<28}{b:>12.2f}{a:>12.2f}{b / a if a else 0:>9.1f}x")
+    for f in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, f))
+    os.rmdir(tmp_dir)
+
+
+def benchmark_invoice_render(count: int = 50, lines: int = 8):
+    """
+    Render `count` synthetic invoices of `lines` lines each two ways and
+    print ms/invoice: the old per-call build (fresh style sheet and styles
+    every time) and the cached InvoiceTemplate.
+    """
+    items = [(f"Product {i}", f"Cat {i % 7}", 1 + i % 4, 118.0, "Flat" if i % 3 else "None", 5 if i % 3 else 0,
+              118.0 * (1 + i % 4) - (5 if i % 3 else 0)) for i in range(lines)]
+    subtotal = sum(q * m for _n, _c, q, m, _t, _v, _f in items)
+    grand_total = sum(f for *_rest, f in items)
+    tmp_dir = tempfile.mkdtemp(prefix="inv_pdf_bench_")
+    cached = InvoiceTemplate.cached()
+    paths = [
+        ("template per call", lambda *a: InvoiceTemplate().render(*a)),
+        ("cached template", cached.render),
+    ]
+    print(f"{count} invoices x {lines} lines")
+    base = None
+    for title, build in paths:
+        invoice_qr_drawing.cache_clear()
+        t0 = time.perf_counter()
+        for i in range(count):
+            build(os.path.join(tmp_dir, f"{i}.pdf"), f"INV{i:06d}", today_str(), "Walk-in", "9876543210",
+                  items, subtotal, grand_total)
+        ms = (time.perf_counter() - t0) * 1000 / count
+        base = base or ms
+        print(f"{title:<32}{ms:>10.2f} ms/invoice{base / ms:>8.1f}x")
+    for mode in INVOICE_QR_MODES:
+        invoice_qr_drawing.cache_clear()
+        t0 = time.perf_counter()
+        for i in range(count):
+            cached.qr_drawing(f"INV{i:06d}", today_str(), "Walk-in", "9876543210", items, subtotal, grand_total,
+                              mode)
+        print(f"{'(QR encoding, ' + mode + ')':<32}{(time.perf_counter() - t0) * 1000 / count:>10.2f} ms/invoice")
+    for f in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, f))
+    os.rmdir(tmp_dir)
+
+
+# Modules the app used to import at startup; --bench-startup imports them up
+# front to reproduce the old eager layout next to the lazy one.
+EAGER_STARTUP_MODULES = (
+    "PIL.Image", "PIL.ImageTk", "pandas", "matplotlib.pyplot", "matplotlib.figure", "matplotlib.ticker",
+    "matplotlib.backends.backend_tkagg", "reportlab.platypus", "reportlab.pdfgen.canvas",
+    "reportlab.graphics.barcode.qr", "reportlab.graphics.renderPDF", "openpyxl", "tkcalendar", "smtplib",
+    "email.mime.multipart",
+)
+
+
+# Run in a fresh interpreter by --bench-startup: import this file, open a
+# database in the working directory and build InventoryApp (which shows
+# LoginFrame) with the window withdrawn, then list the heavy packages loaded.
+_STARTUP_PROBE = """
+import importlib.util, sys, tkinter
+{eager}
+spec = importlib.util.spec_from_file_location("inventory_app", {path!r})
+mod = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mod)
+mod.IMAGE_CACHE_DIR = {cache_dir!r}
+mod.init_db()
+try:
+    app = mod.InventoryApp()
+except tkinter.TclError:
+    print("NO-DISPLAY")  # timed up to the import and migrations only
+    sys.exit(0)
+app.withdraw()
+app.update_idletasks()
+print("LOADED " + ",".join(sorted({{m.split(".")[0] for m in sys.modules}} & {stacks!r})))
+app.destroy()
+"""
+
+
+def _import_profile(code: str, cwd: Optional[str] = None) -> Tuple[float, float, dict, str]:
+    """
+    Run `code` in a fresh interpreter under -X importtime and return
+    (wall ms, import ms, {top-level package: cumulative import ms}, stdout).
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=True, cwd=cwd)
+    wall = (time.perf_counter() - t0) * 1000
+    packages = {}
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package", nesting indented
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _self_us, cumulative, name = line[len("import time:"):].split("|")
+        if name[1:2] == " ":
+            continue  # nested import, already counted in its parent's cumulative
+        root = name.strip().split(".")[0]
+        packages[root] = packages.get(root, 0.0) + int(cumulative) / 1000
+    return wall, sum(packages.values()), packages, proc.stdout
+
+
+def benchmark_startup(repeat: int = 5):
+    """
+    Time start-up up to a built (withdrawn) LoginFrame in fresh interpreters:
+    lazy imports with the login artwork cache warm and cold, against the old
+    eagerly imported stacks. Best of `repeat` runs each, on a throwaway
+    database and image cache. Without a display the runs stop after
+    init_db(). Prints the heavy packages each run loaded and the heaviest
+    imports of the warm run.
+    """
+    stacks = {m.split(".")[0] for m in EAGER_STARTUP_MODULES} - {"email", "smtplib"}
+    tmp_dir = tempfile.mkdtemp(prefix="inv_startup_bench_")
+    warm_cache = os.path.join(tmp_dir, "image_cache")
+
+    def probe(eager: bool = False, cache_dir: str = warm_cache) -> str:
+        return _STARTUP_PROBE.format(eager="; ".join(f"import {m}" for m in EAGER_STARTUP_MODULES) if eager else "",
+                                     path=os.path.abspath(__file__), cache_dir=cache_dir, stacks=stacks)
+
+    cold_runs = iter(range(repeat))
+    runs = [
+        ("interpreter only", lambda: "pass"),
+        ("lazy, artwork cached", probe),
+        ("lazy, artwork cache cold", lambda: probe(cache_dir=os.path.join(tmp_dir, f"cold{next(cold_runs)}"))),
+        ("eager imports (before)", lambda: probe(eager=True)),
+    ]
+    _import_profile(probe(), tmp_dir)  # create the database and fill the warm cache
+    print(f"Start-up to LoginFrame, best of {repeat} runs (-X importtime)")
+    print(f"{'':<28}{'wall ms':>10}{'import ms':>12}  heavy packages loaded")
+    profiles = {}
+    for title, code in runs:
+        best = min((_import_profile(code(), tmp_dir) for _ in range(repeat)), key=lambda r: r[0])
+        profiles[title] = best
+        out = best[3]
+        loaded = ("(no display: import + init_db only)" if "NO-DISPLAY" in out else
+                  out.split("LOADED ", 1)[1].strip() or "none" if "LOADED " in out else "")
+        print(f"{title:<28}{best[0]:>10.1f}{best[1]:>12.1f}  {loaded}")
+    lazy, before = profiles["lazy, artwork cached"], profiles["eager imports (before)"]
+    print(f"saved {before[0] - lazy[0]:.1f} ms wall, {before[1] - lazy[1]:.1f} ms of imports "
+          f"({before[0] / lazy[0]:.1f}x faster to the login window)")
+    print("heaviest imports at startup now:")
+    for name, ms in sorted(lazy[2].items(), key=lambda kv: -kv[1])[:8]:
+        print(f"  {name:<24}{ms:>8.1f} ms")
+    for root, dirs, files in os.walk(tmp_dir, topdown=False):
+        for f in files:
+            os.remove(os.path.join(root, f))
+        for d in dirs:
+            os.rmdir(os.path.join(root, d))
+    os.rmdir(tmp_dir)
+
+
 # ---------- Run App ----------
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    parser.add_argument("--bench-indexes", type=int, nargs="?", const=1_000_000, metavar="ROWS",
+                        help="benchmark report queries before/after the index migration and exit")
+    parser.add_argument("--bench-invoice", type=int, nargs="?", const=50, metavar="COUNT",
+                        help="time invoice PDF rendering (template per call vs cached template) and exit")
+    parser.add_argument("--bench-startup", type=int, nargs="?", const=5, metavar="REPEAT",
+                        help="time startup imports (lazy vs the old eager layout) under -X importtime and exit")
+    parser.add_argument("--reprint", metavar="OUT_DIR",
+                        help="re-render invoice PDFs into OUT_DIR without opening the app")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="first invoice date for --reprint")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="last invoice date for --reprint")
+    parser.add_argument("--invoices", nargs="+", metavar="INVOICE_NO",
+                        help="reprint only these invoices (instead of --from/--to)")
+    parser.add_argument("--workers", type=int, help="processes for --reprint (default: all cores)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="VACUUM the database, rebuild the search indexes and exit")
+    args = parser.parse_args(argv)
+    if args.invoices and (args.date_from or args.date_to):
+        parser.error("--invoices cannot be combined with --from/--to")
+
+    if args.vacuum:
+        init_db()
+        vacuum_database()
+        return
+
+    if args.reprint:
+        init_db()
+        reprint_invoices(args.reprint, args.date_from, args.date_to, args.invoices, args.workers)
+        return
+
+    if args.bench_startup:
+        benchmark_startup(args.bench_startup)
+        return
+
+    if args.bench_invoice:
+        benchmark_invoice_render(args.bench_invoice)
+        return
+
+    if args.bench_indexes:
+        benchmark_report_indexes(args.bench_indexes)
+        return
+
     init_db()
     app = InventoryApp()
 
     app.mainloop()
 
+
+if __name__ == "__main__":
+    main()
+
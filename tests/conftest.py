@@ -0,0 +1,48 @@
+import importlib.util
+import os
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "INVENTORY 14.py")
+
+
+@pytest.fixture(scope="session")
+def inv():
+    """The app module ("INVENTORY 14.py" is not importable by name)."""
+    spec = importlib.util.spec_from_file_location("inventory14", APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _use_database(inv, path):
+    inv.POOL.close_all()
+    inv.POOL.path = str(path)
+    inv._search_index_ready.clear()
+    inv.ProductIndex._current = None
+
+
+@pytest.fixture
+def blank_db(inv, tmp_path, monkeypatch):
+    """Point the pool at an empty database file; init_db() has not run."""
+    monkeypatch.delenv("INVENTORY_DB_PROFILE", raising=False)
+    _use_database(inv, tmp_path / "inventory14.db")
+    yield inv
+    inv.POOL.close_all()
+
+
+@pytest.fixture
+def app_db(blank_db):
+    """A new database after init_db()."""
+    blank_db.init_db()
+    return blank_db
+
+
+@pytest.fixture
+def product(app_db):
+    def add(pid, qty=10, unit_price=80.0, mrp=100.0, name=None):
+        with app_db.transaction() as con:
+            con.execute("INSERT INTO products(product_id, name, category, supplier_id, quantity, gst, unit_price, "
+                        "mrp, reorder_level) VALUES (?,?,?,?,?,?,?,?,?)",
+                        (pid, name or f"Product {pid}", "Grocery", "001", qty, 18, unit_price, mrp, 5))
+    return add
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def scratch(app_db):
+    with app_db.transaction() as con:
+        con.execute("CREATE TABLE scratch (k TEXT)")
+    return app_db
+
+
+def _keys(inv):
+    return sorted(r[0] for r in inv.db().execute("SELECT k FROM scratch"))
+
+
+def test_transaction_commits(scratch):
+    with scratch.transaction() as con:
+        con.execute("INSERT INTO scratch VALUES ('a')")
+    assert _keys(scratch) == ["a"]
+    assert not scratch.db().in_transaction
+
+
+def test_transaction_rolls_back_on_error(scratch):
+    with pytest.raises(ValueError):
+        with scratch.transaction() as con:
+            con.execute("INSERT INTO scratch VALUES ('a')")
+            raise ValueError
+    assert _keys(scratch) == []
+    assert not scratch.db().in_transaction
+
+
+def test_nested_failure_undoes_only_the_inner_block(scratch):
+    with scratch.transaction() as con:
+        con.execute("INSERT INTO scratch VALUES ('outer')")
+        with pytest.raises(ValueError):
+            with scratch.transaction() as inner:
+                inner.execute("INSERT INTO scratch VALUES ('inner')")
+                raise ValueError
+        with scratch.transaction() as inner:
+            inner.execute("INSERT INTO scratch VALUES ('second')")
+    assert _keys(scratch) == ["outer", "second"]
+
+
+def test_outer_failure_undoes_committed_inner_block(scratch):
+    with pytest.raises(ValueError):
+        with scratch.transaction() as con:
+            with scratch.transaction() as inner:
+                inner.execute("INSERT INTO scratch VALUES ('inner')")
+            con.execute("INSERT INTO scratch VALUES ('outer')")
+            raise ValueError
+    assert _keys(scratch) == []
+
+
+def test_connection_per_thread(app_db):
+    seen = []
+    t = threading.Thread(target=lambda: seen.append(app_db.db()))
+    t.start()
+    t.join()
+    assert seen[0] is not app_db.db()
+    assert app_db.db() is app_db.db()
+
+
+def test_close_all_hands_out_fresh_connections(app_db):
+    before = app_db.db()
+    app_db.POOL.close_all()
+    after = app_db.db()
+    assert after is not before
+    assert after.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_default_storage_profile(app_db):
+    assert app_db.get_setting("storage_profile") == app_db.DEFAULT_STORAGE_PROFILE
+    assert app_db.db().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_storage_profile_applies_to_open_connections(app_db):
+    assert app_db.apply_storage_profile("durable") == "durable"
+    assert app_db.db().execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    assert app_db.get_setting("storage_profile") == "durable"
+
+
+def test_unknown_storage_profile_falls_back(app_db):
+    assert app_db.apply_storage_profile("turbo") == app_db.DEFAULT_STORAGE_PROFILE
+    assert app_db.get_setting("storage_profile") == app_db.DEFAULT_STORAGE_PROFILE
+    assert app_db.get_setting("storage_profile_fallback") == "turbo"
+    app_db.apply_storage_profile("durable")
+    assert app_db.get_setting("storage_profile_fallback") is None
@@ -0,0 +1,50 @@
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+class FakeTree:
+    """The parts of a ttk.Treeview export_treeview_to_excel reads."""
+
+    def __init__(self, columns, rows):
+        self.columns, self.rows = columns, rows
+
+    def __getitem__(self, key):
+        assert key == "columns"
+        return self.columns
+
+    def heading(self, col):
+        return {"text": col.title()}
+
+    def get_children(self):
+        return range(len(self.rows))
+
+    def item(self, child, option):
+        assert option == "values"
+        return self.rows[child]
+
+
+@pytest.mark.parametrize("text, matches", [
+    ("118.00", True), ("-5.50", True), ("12.50%", True), ("18%", True), ("-2%", True),
+    ("0042", False), ("9876543210", False), ("1.2.3", False), ("18%%", False), ("%", False), ("abc", False),
+    ("", False),
+])
+def test_decimal_text(inv, text, matches):
+    assert bool(inv._DECIMAL_TEXT.fullmatch(text)) is matches
+
+
+def test_excel_cells_typed(inv, tmp_path):
+    tree = FakeTree(("product_id", "phone", "mrp", "gst", "name"),
+                    [("0042", "9876543210", "118.00", "12.50%", "Rice"),
+                     ("0043", "", "-5.50", "18%", "Oil")])
+    path = tmp_path / "out.xlsx"
+    inv.export_treeview_to_excel(tree, str(path), sheet_name="Products")
+
+    ws = openpyxl.load_workbook(path)["Products"]
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0] == ("Product_Id", "Phone", "Mrp", "Gst", "Name")
+    assert rows[1] == ("0042", "9876543210", 118.0, 0.125, "Rice")
+    assert rows[2][:4] == ("0043", None, -5.5, 0.18)
+    assert ws["C2"].number_format == "0.00"
+    assert (ws["D2"].number_format, ws["D3"].number_format) == ("0.00%", "0%")
+    assert rows[-1][0].startswith("Exported On: ")
@@ -0,0 +1,38 @@
+import threading
+
+
+def _add_customer(inv, cid):
+    with inv.transaction() as con:
+        con.execute("INSERT INTO customers(customer_id, name, phone, email) VALUES (?,?,?,?)",
+                    (cid, "Ravi", f"9000000{cid}", f"r{cid}@gmail.com"))
+
+
+def test_padded_id_counts_up(app_db):
+    assert [app_db.padded_id("customers", "customer_id") for _ in range(3)] == ["001", "002", "003"]
+    assert app_db.padded_id("products", "product_id", width=4) == "0001"
+
+
+def test_hand_typed_id_moves_the_sequence(app_db):
+    _add_customer(app_db, "040")
+    assert app_db.padded_id("customers", "customer_id") == "041"
+
+
+def test_lower_hand_typed_id_does_not_rewind(app_db):
+    _add_customer(app_db, "050")
+    _add_customer(app_db, "007")
+    assert app_db.padded_id("customers", "customer_id") == "051"
+
+
+def test_threads_never_share_an_id(app_db):
+    got = []
+
+    def take():
+        for _ in range(20):
+            got.append(app_db.padded_id("suppliers", "supplier_id"))
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(got) == [str(i).zfill(3) for i in range(1, 81)]
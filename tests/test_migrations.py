@@ -0,0 +1,147 @@
+import sqlite3
+
+import pytest
+
+
+def _baseline(inv, con):
+    """A database as the build before MIGRATIONS left it (flat sales table, user_version 0), with some history."""
+    cur = con.cursor()
+    inv.create_schema(cur)
+    inv.create_legacy_sales(cur)
+    cur.execute("INSERT INTO suppliers VALUES('001','S1','Company 1','9000000001','s1@gmail.com','')")
+    cur.execute("INSERT INTO products(product_id, name, category, supplier_id, quantity, gst, unit_price, mrp, "
+                "reorder_level) VALUES ('0007','Rice','Grocery','001',50,5,40.0,50.0,5)")
+    cur.execute("INSERT INTO customers(customer_id, name, phone, email) VALUES ('012','Asha','9876543210','a@gmail.com')")
+    # two lines of what was one checkout, then a second same-day sale to the same customer
+    for qty in (2, 1, 3):
+        cur.execute("INSERT INTO sales(product_id, product_name, category, quantity, mrp, total_price, "
+                    "discount_type, discount_value, effective_total, date, sold_by, customer_name, customer_phone) "
+                    "VALUES ('0007','Rice','Grocery',?,50.0,?,'Flat',0,?,'2024-04-01','admin','Asha','9876543210')",
+                    (qty, qty * 50.0, qty * 50.0))
+    cur.execute("INSERT INTO returns(sale_id, product_id, quantity, refund_amount, date, reason) "
+                "VALUES (2,'0007',1,50.0,'2024-04-03','damaged')")
+    con.commit()
+
+
+@pytest.fixture
+def migrated(blank_db):
+    con = blank_db.db()
+    _baseline(blank_db, con)
+    con.execute("PRAGMA foreign_keys=ON")
+    blank_db.init_db()
+    return blank_db, con
+
+
+def _plan(con, sql, params=()):
+    return " ".join(r[-1] for r in con.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def test_runs_every_migration(migrated):
+    inv, con = migrated
+    assert con.execute("PRAGMA user_version").fetchone()[0] == inv.MIGRATIONS[-1][0]
+    assert con.execute("PRAGMA foreign_keys").fetchone()[0] == 1  # restored after the run
+
+
+def test_report_queries_use_indexes(migrated):
+    _inv, con = migrated
+    assert "idx_invoices_date_no" in _plan(con, "SELECT SUM(effective_total) FROM sales WHERE date BETWEEN ? AND ?",
+                                        ("2024-04-01", "2024-04-30"))
+    assert "idx_sale_lines_product_invoice" in _plan(con, "SELECT SUM(quantity) FROM sales WHERE product_id=? "
+                                                   "AND date BETWEEN ? AND ?", ("0007", "2024-04-01", "2024-04-30"))
+    assert "idx_returns_sale_product" in _plan(con, "SELECT IFNULL(SUM(quantity),0) FROM returns "
+                                                     "WHERE sale_id=? AND product_id=?", (2, "0007"))
+    assert "idx_products_supplier" in _plan(con, "SELECT COUNT(*) FROM products WHERE supplier_id=?", ("001",))
+
+
+def test_each_legacy_row_gets_its_own_invoice(migrated):
+    _inv, con = migrated
+    lines = con.execute("SELECT sale_id, invoice_no FROM sale_lines ORDER BY sale_id").fetchall()
+    assert [tuple(r) for r in lines] == [(1, "LEGACY-000001"), (2, "LEGACY-000002"), (3, "LEGACY-000003")]
+    totals = con.execute("SELECT invoice_no, subtotal, grand_total FROM invoices ORDER BY invoice_no").fetchall()
+    assert [tuple(r) for r in totals] == [("LEGACY-000001", 100.0, 100.0), ("LEGACY-000002", 50.0, 50.0),
+                                          ("LEGACY-000003", 150.0, 150.0)]
+    assert con.execute("SELECT type FROM sqlite_master WHERE name='sales'").fetchone()[0] == "view"
+
+
+def test_returns_still_point_at_their_line(migrated):
+    _inv, con = migrated
+    row = con.execute("SELECT l.sale_id, l.quantity FROM returns r JOIN sale_lines l ON l.sale_id = r.sale_id"
+                      ).fetchone()
+    assert tuple(row) == (2, 1)
+
+
+def test_migrations_are_idempotent(migrated):
+    inv, con = migrated
+    con.execute("PRAGMA user_version=0")
+    inv.run_migrations(con)
+    assert con.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 3
+    assert con.execute("SELECT COUNT(*) FROM sale_lines").fetchone()[0] == 3
+
+
+def test_id_sequences_seeded_from_existing_ids(migrated):
+    _inv, con = migrated
+    seq = dict(con.execute("SELECT name, value FROM id_sequences").fetchall())
+    assert seq["products"] == 7
+    assert seq["customers"] == 12
+
+
+def test_new_database(app_db):
+    con = app_db.db()
+    assert con.execute("PRAGMA user_version").fetchone()[0] == app_db.MIGRATIONS[-1][0]
+    assert con.execute("SELECT type FROM sqlite_master WHERE name='sales'").fetchone()[0] == "view"
+
+
+def test_search_index_built_and_recorded(migrated):
+    inv, _con = migrated
+    if inv.get_setting("search_index") != "fts5":
+        assert inv.get_setting("search_index").startswith("like (SQLite ")
+        pytest.skip("this SQLite has no FTS5 trigram tokenizer")
+    where, params = inv.search_filter("customers", "Ash")
+    assert "customers_fts" in where
+    assert [r[0] for r in inv.db().execute(f"SELECT customer_id FROM customers WHERE {where}", params)] == ["012"]
+    assert inv.search_filter("customers", "As")[0].startswith("(name LIKE ?")  # shorter than a trigram
+
+
+def test_sales_daily_rollup_matches_history(migrated):
+    _inv, con = migrated
+    row = con.execute("SELECT qty, revenue, cost FROM sales_daily WHERE date='2024-04-01' AND product_id='0007'"
+                      ).fetchone()
+    assert tuple(row) == (6, 300.0, 240.0)
+    row = con.execute("SELECT refund_qty, refund_amount FROM sales_daily WHERE date='2024-04-03'").fetchone()
+    assert tuple(row) == (1, 50.0)
+
+
+def test_cost_at_sale_backfilled(migrated):
+    _inv, con = migrated
+    rows = con.execute("SELECT DISTINCT unit_cost, gst FROM sale_lines").fetchall()
+    assert [tuple(r) for r in rows] == [(40.0, 5.0)]
+
+
+def test_cost_backfill_rebuilds_rollup(blank_db, monkeypatch):
+    inv, con = blank_db, blank_db.db()
+    _baseline(inv, con)
+    with monkeypatch.context() as m:
+        m.setattr(inv, "MIGRATIONS", [s for s in inv.MIGRATIONS if s[0] <= 5])
+        inv.run_migrations(con)
+    con.execute("UPDATE products SET unit_price = 45.0 WHERE product_id = '0007'")  # price change before upgrading
+    con.commit()
+    inv.run_migrations(con)
+    assert con.execute("SELECT cost FROM sales_daily WHERE date='2024-04-01'").fetchone()[0] == \
+           con.execute("SELECT SUM(quantity * unit_cost) FROM sale_lines").fetchone()[0] == 270.0
+
+
+def test_returns_reference_sale_lines(migrated):
+    _inv, con = migrated
+    assert {r["table"] for r in con.execute("PRAGMA foreign_key_list(returns)")} == {"sale_lines", "products"}
+    assert con.execute("PRAGMA foreign_key_check").fetchall() == []
+    # foreign keys are on (see migrated): the insert used to fail with "foreign key mismatch"
+    con.execute("INSERT INTO returns(sale_id, product_id, quantity, refund_amount, date, reason) "
+                "VALUES (3,'0007',1,50.0,'2024-04-05','damaged')")
+    with pytest.raises(sqlite3.IntegrityError):
+        con.execute("INSERT INTO returns(sale_id, product_id, quantity, refund_amount, date, reason) "
+                    "VALUES (99,'0007',1,50.0,'2024-04-05','damaged')")
+    con.commit()
+    assert con.execute("SELECT MAX(return_id) FROM returns").fetchone()[0] == 2
+    # the rebuilt table kept its index and the rollup trigger
+    assert con.execute("SELECT refund_qty FROM sales_daily WHERE date='2024-04-05'").fetchone()[0] == 1
+    assert con.execute("SELECT 1 FROM sqlite_master WHERE name='idx_returns_sale_product'").fetchone()
@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture
+def catalog(app_db, product):
+    with app_db.transaction() as con:
+        con.execute("INSERT INTO suppliers VALUES('001','S1','Company 1','9000000001','s1@gmail.com','')")
+    for i in (1, 2, 10, 11, 100):
+        product(f"{i:04d}")
+    product("9")  # short hand-typed id still sorts by number
+    return app_db
+
+
+def _ids(page):
+    return [values[0] for _key, values in page]
+
+
+def test_products_page_by_number(catalog):
+    src = catalog.SectionProducts.search_source("")
+    first = src.first(3)
+    assert _ids(first) == ["0001", "0002", "9"]
+    after = src.after(first[-1][0], 3)
+    assert _ids(after) == ["0010", "0011", "0100"]
+    assert _ids(src.before(after[0][0], 2)) == ["0002", "9"]
+    assert src.after(after[-1][0], 3) == []
+
+
+def test_products_page_seeks_the_sort_index(catalog):
+    src = catalog.SectionProducts.search_source("")
+    where, params = src._seek((10, "0010"), ">")
+    plan = " ".join(r[-1] for r in catalog.db().execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM ({src.sql}) {where} ORDER BY {src._order(False)} LIMIT 50",
+        src.params + params))
+    assert "idx_products_sort" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_products_search_is_driven_by_the_indexes(catalog):
+    if not catalog.has_search_index("products"):
+        pytest.skip("this SQLite has no FTS5 trigram tokenizer")
+    with catalog.transaction() as con:
+        con.execute("INSERT INTO suppliers VALUES('002','S2','Basmati Traders','9000000002','s2@gmail.com','')")
+        con.execute("UPDATE products SET supplier_id='002' WHERE product_id='0100'")
+    src = catalog.SectionProducts.search_source("0010")  # name "Product 0010" or supplier "Basmati Traders"
+    assert _ids(src.first(10)) == ["0010"]
+    assert _ids(catalog.SectionProducts.search_source("basmati").first(10)) == ["0100"]
+    plan = " ".join(r[-1] for r in catalog.db().execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM ({src.sql}) ORDER BY {src._order(False)} LIMIT ?", src.params + (50,)))
+    assert "SEARCH p USING INTEGER PRIMARY KEY" in plan  # rowids from the lookups, not a walk over products
+    assert "products_fts" in plan and "idx_products_supplier" in plan
@@ -0,0 +1,188 @@
+import pytest
+
+
+def _line(pid="0001", qty=2, mrp=100.0, discount_type="None", discount_value=0.0, final_total=None):
+    return {"pid": pid, "name": f"Product {pid}", "cat": "Grocery", "qty": qty, "mrp": mrp,
+            "discount_type": discount_type, "discount_value": discount_value,
+            "final_total": qty * mrp if final_total is None else final_total}
+
+
+def _stock(inv):
+    return dict(inv.db().execute("SELECT product_id, quantity FROM products").fetchall())
+
+
+@pytest.fixture
+def shelf(app_db, product):
+    product("0001", qty=10)
+    product("0002", qty=10, mrp=40.0)
+    return app_db
+
+
+def test_checkout_writes_one_invoice(shelf):
+    invoice_no = shelf.checkout_cart([_line("0001", qty=2, discount_type="Flat", discount_value=15, final_total=185.0),
+                                      _line("0002", qty=3, mrp=40.0)],
+                                     "INV100", "2024-04-01", "admin", "Asha", "9876543210", customer_id="012")
+    assert invoice_no == "INV100"
+    header, lines = shelf.fetch_invoice(invoice_no)
+    assert (header["date"], header["customer_id"], header["subtotal"], header["grand_total"]) == \
+           ("2024-04-01", "012", 320.0, 305.0)
+    assert [(l["product_id"], l["quantity"], l["effective_total"]) for l in lines] == \
+           [("0001", 2, 185.0), ("0002", 3, 120.0)]
+    assert _stock(shelf) == {"0001": 8, "0002": 7}
+
+
+def test_taken_invoice_number_gets_a_suffix(shelf):
+    first = shelf.checkout_cart([_line("0001", qty=1)], "INV100", "2024-04-01", "admin", "Asha", "")
+    second = shelf.checkout_cart([_line("0001", qty=1)], "INV100", "2024-04-01", "admin", "Asha", "")
+    assert (first, second) == ("INV100", "INV100-2")
+
+
+def test_checkout_short_stock_writes_nothing(shelf):
+    with pytest.raises(shelf.StockShortageError) as exc:
+        shelf.checkout_cart([_line("0001", qty=1), _line("0002", qty=11, mrp=40.0)],
+                            "INV101", "2024-04-01", "admin", "Asha", "9876543210")
+    assert exc.value.shortages == [("0002", "Product 0002", 11, 10)]
+    assert shelf.fetch_invoice("INV101") == (None, [])
+    assert _stock(shelf) == {"0001": 10, "0002": 10}
+
+
+def test_checkout_counts_repeated_product_once(shelf):
+    with pytest.raises(shelf.StockShortageError) as exc:
+        shelf.checkout_cart([_line("0001", qty=6), _line("0001", qty=5)], "INV102", "2024-04-01", "admin", "Asha", "")
+    assert exc.value.shortages == [("0001", "Product 0001", 11, 10)]
+
+
+def _qr_items(lines):
+    return [(l["name"], l["cat"], l["qty"], l["mrp"], l["discount_type"], l["discount_value"], l["final_total"])
+            for l in lines]
+
+
+@pytest.fixture
+def invoice(shelf):
+    lines = [_line("0001", qty=2, discount_type="Flat", discount_value=15, final_total=185.0),
+             _line("0002", qty=3, mrp=40.0)]
+    invoice_no = shelf.checkout_cart(lines, "INV100", "2024-04-01", "admin", "Asha", "9876543210")
+    payload = shelf.invoice_qr_payload(invoice_no, "2024-04-01", "Asha", "9876543210", _qr_items(lines),
+                                       320.0, 305.0)
+    return shelf, invoice_no, payload
+
+
+def test_compact_qr_verifies(invoice):
+    inv, invoice_no, payload = invoice
+    assert payload.startswith(f"LE1|{invoice_no}|2024-04-01|305.00|")
+    assert inv.verify_invoice_qr(payload)
+
+
+def test_qr_rejects_tampering(invoice):
+    inv, invoice_no, payload = invoice
+    prefix, digest = payload.rsplit("|", 1)
+    assert not inv.verify_invoice_qr(prefix.replace("305.00", "304.00") + "|" + digest)
+    assert not inv.verify_invoice_qr(prefix + "|000000000000")
+    assert not inv.verify_invoice_qr(payload.replace(invoice_no, "INV999"))
+    with inv.transaction() as con:
+        con.execute("UPDATE sale_lines SET quantity = 1 WHERE invoice_no=? AND product_id='0002'", (invoice_no,))
+    assert not inv.verify_invoice_qr(payload)
+
+
+def test_full_qr_falls_back_to_compact_when_too_long(inv):
+    items = _qr_items([_line(f"{i:04d}", qty=1, mrp=10.0) for i in range(60)])
+    full = inv.invoice_qr_payload("INV1", "2024-04-01", "Asha", "", items[:2], 20.0, 20.0, mode="full")
+    assert full.startswith("Invoice No: INV1")
+    assert inv.invoice_qr_payload("INV1", "2024-04-01", "Asha", "", items, 600.0, 600.0,
+                                  mode="full").startswith("LE1|INV1|")
+
+
+def test_product_index_lookup(app_db, product):
+    product("0001", name="Rice")
+    product("0012", name="Red Chilli")
+    product("0100", name="Oil")
+    index = app_db.ProductIndex.current()
+    assert [p.pid for p in index.lookup("0")] == ["0001", "0012", "0100"]
+    assert [p.pid for p in index.lookup("r")] == ["0012", "0001"]  # names, case-insensitive
+    assert [p.pid for p in index.lookup(" 0100 ")] == ["0100"]
+    assert index.lookup("x") == []
+    assert app_db.ProductIndex.current() is index
+
+
+def _cart_line(inv, pid="0001", qty=2, mrp=100.0, discount_type="None", discount_value=0.0):
+    return inv.CartLine(pid, f"Product {pid}", "Grocery", qty, mrp, discount_type, discount_value)
+
+
+def test_cart_line_discounts(inv):
+    assert _cart_line(inv, qty=2).final_total == 200.0
+    assert _cart_line(inv, qty=2, discount_type="Flat", discount_value=30).final_total == 170.0
+    assert _cart_line(inv, qty=2, discount_type="Percent", discount_value=10).final_total == 180.0
+    assert _cart_line(inv, qty=1, discount_type="Flat", discount_value=500).final_total == 0.0
+
+
+def test_cart_totals_follow_every_change(inv):
+    cart = inv.Cart()
+    cart.add(_cart_line(inv, "0001", qty=2, mrp=100.0, discount_type="Percent", discount_value=10))
+    cart.add(_cart_line(inv, "0002", qty=1, mrp=50.0, discount_type="Flat", discount_value=5))
+    assert (len(cart), cart.subtotal, cart.total) == (2, 250.0, 225.0)
+
+    cart.set_qty("0001", 3)
+    assert (cart.subtotal, cart.total) == (350.0, 315.0)
+    assert cart.get("0001").final_total == 270.0
+
+    cart.remove("0002")
+    assert (cart.subtotal, cart.total) == (300.0, 270.0)
+    assert [line.pid for line in cart] == ["0001"]
+
+
+def test_emptied_cart_has_no_float_residue(inv):
+    cart = inv.Cart()
+    for i in range(10):
+        cart.add(_cart_line(inv, f"{i:04d}", qty=1, mrp=0.1))
+    for i in range(10):
+        cart.remove(f"{i:04d}")
+    assert (cart.subtotal, cart.total) == (0.0, 0.0)
+    assert cart.remove("0001") is None
+
+
+def test_cart_checks_out(shelf):
+    cart = shelf.Cart()
+    cart.add(_cart_line(shelf, "0001", qty=2, discount_type="Flat", discount_value=15))
+    cart.add(_cart_line(shelf, "0002", qty=3, mrp=40.0))
+    assert cart.as_dicts()[0] == _line("0001", qty=2, discount_type="Flat", discount_value=15, final_total=185.0)
+    invoice_no = shelf.checkout_cart(cart.as_dicts(), "INV100", "2024-04-01", "admin", "Asha", "9876543210")
+    header, _lines = shelf.fetch_invoice(invoice_no)
+    assert (header["subtotal"], header["grand_total"]) == (cart.subtotal, cart.total)
+
+
+def test_checkout_updates_sales_daily(shelf):
+    for invoice_no in ("INV100", "INV101"):
+        shelf.checkout_cart([_line("0001", qty=2, discount_type="Flat", discount_value=15, final_total=185.0)],
+                            invoice_no, "2024-04-01", "admin", "Asha", "")
+    row = shelf.db().execute("SELECT qty, revenue, cost FROM sales_daily WHERE date='2024-04-01' AND product_id='0001'"
+                             ).fetchone()
+    assert tuple(row) == (4, 370.0, 320.0)
+
+
+def test_price_change_keeps_past_cost(shelf):
+    shelf.checkout_cart([_line("0001", qty=2)], "INV100", "2024-04-01", "admin", "Asha", "")
+    with shelf.transaction() as con:
+        con.execute("UPDATE products SET unit_price = 95.0 WHERE product_id = '0001'")
+    row = shelf.db().execute("SELECT unit_cost, gst FROM sale_lines WHERE invoice_no = 'INV100'").fetchone()
+    assert tuple(row) == (80.0, 18.0)
+    assert shelf.db().execute("SELECT cost FROM sales_daily WHERE product_id = '0001'").fetchone()[0] == 160.0
+
+
+def test_refund_with_foreign_keys_on(invoice):
+    inv, invoice_no, _payload = invoice
+    _header, lines = inv.fetch_invoice(invoice_no)
+    con = inv.db()
+    con.execute("PRAGMA foreign_keys=ON")
+    with inv.transaction(immediate=True) as con:
+        err, amount = inv.SectionSales._record_refund(con.cursor(), lines[1]["sale_id"], "0002", 1, "damaged")
+    assert (err, amount) == (None, 40.0)
+    assert con.execute("PRAGMA foreign_key_check(returns)").fetchall() == []
+
+
+def test_reprint_takes_invoices_or_a_range(inv, tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        inv.main(["--reprint", str(tmp_path / "out"), "--invoices", "INV100", "--to", "2024-04-30"])
+    assert "--invoices cannot be combined with --from/--to" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        inv.reprint_invoices(str(tmp_path / "out"), date_from="2024-04-01", invoice_nos=["INV100"])
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,90 @@
+import threading
+import time
+
+
+class FakeRoot:
+    """Stands in for the Tk root: after() callbacks run from run(), on the test thread."""
+
+    def __init__(self):
+        self.calls = []
+        self.reported = []
+
+    def after(self, ms, fn):
+        self.calls.append(fn)
+
+    def run(self, timeout=5.0):
+        end = time.monotonic() + timeout
+        while self.calls and time.monotonic() < end:
+            time.sleep(0.01)
+            self.calls.pop(0)()
+
+    def report_callback_exception(self, exc, val, tb):
+        self.reported.append(exc)
+
+
+def test_callbacks_run_on_the_polling_thread(inv):
+    root = FakeRoot()
+    ex = inv.UiExecutor(root, max_workers=2)
+    got = []
+    ex.submit(threading.get_ident, on_done=lambda worker: got.append((worker, threading.get_ident())))
+    ex.submit(lambda: 1 / 0, on_error=lambda err: got.append(type(err)))
+    assert ex.pending == 2
+    root.run()
+    ex.shutdown()
+    assert ZeroDivisionError in got
+    (worker, caller), = [g for g in got if isinstance(g, tuple)]
+    assert worker != caller == threading.get_ident()
+    assert ex.pending == 0
+
+
+def test_polling_stops_when_idle(inv):
+    root = FakeRoot()
+    ex = inv.UiExecutor(root)
+    ex.submit(lambda: time.sleep(0.05))
+    root.run()
+    assert root.calls == [] and ex.pending == 0
+    ex.submit(lambda: None)  # a new task starts polling again
+    assert len(root.calls) == 1
+    root.run()
+    ex.shutdown()
+
+
+def test_failing_callback_is_reported_and_polling_goes_on(inv):
+    root = FakeRoot()
+    ex = inv.UiExecutor(root)
+    got = []
+    ex.submit(lambda: None, on_done=lambda _: 1 / 0)
+    ex.submit(lambda: 1 / 0)  # no on_error
+    ex.submit(lambda: time.sleep(0.05), on_done=got.append)
+    root.run()
+    ex.shutdown()
+    assert root.reported == [ZeroDivisionError, ZeroDivisionError]
+    assert got == [None] and ex.pending == 0
+
+
+class Status:
+    """Records what InvoiceRenderQueue writes to its StringVar."""
+
+    def __init__(self):
+        self.values = []
+
+    def set(self, value):
+        self.values.append(value)
+
+
+def test_invoice_queue_counts_down(inv, monkeypatch):
+    gate = threading.Event()
+    monkeypatch.setattr(inv, "render_invoice_pdf", lambda *a, **kw: gate.wait(5))
+    monkeypatch.setattr(inv, "invoice_qr_mode", lambda: "compact")
+    root = FakeRoot()
+    renders = object.__new__(inv.InvoiceRenderQueue)  # no Tk: status is a plain recorder
+    renders.root, renders.status, renders._exec = root, Status(), inv.UiExecutor(root, max_workers=1)
+    for n in (1, 2, 3):
+        renders.submit(f"/tmp/INV{n}.pdf", f"INV{n}")
+    gate.set()
+    root.run()
+    renders.shutdown()
+    assert renders.status.values == ["Rendering 1 invoice(s)…", "Rendering 2 invoice(s)…", "Rendering 3 invoice(s)…",
+                                     "Rendering 2 invoice(s)…", "Rendering 1 invoice(s)…",
+                                     "Invoice INV3 saved: INV3.pdf"]
+    assert renders.pending == 0